@@ -0,0 +1,274 @@
+import asyncio
+import math
+import threading
+import time
+import argparse
+from urllib.parse import urlparse
+
+import aiohttp
+
+import tabelog_parser
+from fetcher import DEFAULT_HEADERS
+from rate_limiter import RETRY_STATUS, RetryableError, get_controller, parse_retry_after
+from metrics import STAGE_METRIC, get_metrics
+from getlist import (log, get_db, get_urls, save_count, build_shop_data, list_page_url, record_page_links,
+                     insert_or_update_shop)
+
+MAX_PAGE = 60  # tabelog 一览最多 60 页
+
+
+class HostBudget:
+    """每个 host 的礼貌预算：同时最多 per_host 个请求，请求间隔由 RateController 的令牌桶决定"""
+
+    def __init__(self, per_host, rate, url):
+        self.sem = asyncio.Semaphore(per_host)
+        self.rate = rate
+        self.url = url
+
+    async def __aenter__(self):
+        await self.sem.acquire()
+        await asyncio.sleep(self.rate.reserve(self.url))
+
+    async def __aexit__(self, *exc):
+        self.sem.release()
+
+
+class CrawlStats:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.pages = 0
+        self.shops = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        return (f"📊 {elapsed:.0f}s 页面 {self.pages} ({self.pages / elapsed:.2f} pages/sec)，"
+                f"店铺 {self.shops} ({self.shops / elapsed:.2f} shops/sec)，"
+                f"跳过 {self.skipped}，错误 {self.errors}")
+
+
+class AsyncCrawler:
+    """
+    asyncio 版采集：一览页和详情页并发下载。
+    写库（同步 SQLite，批量 commit 时会等 fsync）都用 asyncio.to_thread 放到线程里，不阻塞事件循环上的其他请求。
+    - concurrency: 全局同时进行的请求数上限
+    - per_host: 每个 host 的并发上限；请求速率由 RateController（AIMD 令牌桶）按服务器反应调整
+    get_count / get_list / get_detail_info 的语义（件数、60 页上限、跳过已收集）保持不变。
+    """
+
+    def __init__(self, concurrency=16, per_host=4, timeout=15, report_interval=30, rate=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.rate = rate or get_controller()
+        self.timeout = timeout
+        self.report_interval = report_interval
+        self.stats = CrawlStats()
+        self.session = None
+        self.global_sem = None
+        self.hosts = {}
+        # 写库在线程里并发跑，一页的 catlog 插入 + 已收集判断要连在一起做（同 driver_pool）
+        self.db_lock = threading.Lock()
+
+    def _host_budget(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = HostBudget(self.per_host, self.rate, url)
+        return self.hosts[host]
+
+    async def _fetch_once(self, url, stage=None):
+        """
+        请求一次：成功返回 HTML，不可重试的失败返回 None，可重试的失败抛 RetryableError/TimeoutError。
+        stage 的耗时只算拿到并发 / 限速许可之后的这次请求，不含排队等待。
+        """
+        async with self.global_sem, self._host_budget(url):
+            start = time.monotonic()
+            try:
+                async with self.session.get(url) as r:
+                    if r.status in RETRY_STATUS:
+                        raise RetryableError(f"HTTP {r.status}", r.status, parse_retry_after(r.headers.get("Retry-After")))
+                    if r.status != 200:
+                        log(f"⚠️ HTTP {r.status}：{url}")
+                        self.rate.record(url, status=r.status)
+                        return None
+                    html = await r.text(encoding="utf-8", errors="replace")
+            except asyncio.TimeoutError as e:
+                raise TimeoutError(str(e))
+            finally:
+                if stage:
+                    get_metrics().observe(STAGE_METRIC, time.monotonic() - start, stage=stage)
+            self.rate.record(url, latency=time.monotonic() - start)
+            return html
+
+    async def fetch(self, url, stage=None):
+        attempt = 0
+        while True:
+            try:
+                html = await self._fetch_once(url, stage)
+                break
+            except RetryableError as e:
+                self.rate.record(url, status=e.status, retry_after=e.retry_after)
+                error = e
+            except TimeoutError as e:
+                self.rate.record(url, timeout=True)
+                error = e
+            except aiohttp.ClientError as e:
+                log(f"❌ HTTP 获取失败：{url} {type(e).__name__} - {e}")
+                self.stats.errors += 1
+                return None
+
+            if attempt >= self.rate.max_retries:
+                log(f"❌ HTTP 获取失败：{url} {type(error).__name__} - {error}")
+                self.stats.errors += 1
+                return None
+            await asyncio.sleep(self.rate.retry_delay(attempt))
+            attempt += 1
+
+        if html is None:
+            self.stats.errors += 1
+            return None
+        self.stats.pages += 1
+        return html
+
+    async def get_count(self, url_info):
+        total = tabelog_parser.parse_page_count(await self.fetch(url_info["url"]))
+        if total is None:
+            log(f'{url_info["url"]} cannot get')
+            return 0
+        await asyncio.to_thread(save_count, url_info, total)
+        return total
+
+    async def get_shop(self, rst, url, area, genre):
+        link = rst["link"]
+        metrics = get_metrics()
+        html = await self.fetch(link + "#title-rstdata", "detail_fetch")
+        with metrics.timer("detail_parse"):
+            detail = tabelog_parser.parse_detail_page(html)
+        if detail is None:
+            log(f"❌ {link} 详情解析失败（可能需要 JS）")
+            self.stats.errors += 1
+            metrics.inc("tabelog_errors_total", type="DetailParse")
+            return
+
+        shop_data = build_shop_data(rst, detail, area, genre)
+        await asyncio.to_thread(insert_or_update_shop, shop_data, url)
+        self.stats.shops += 1
+
+    async def get_page(self, url, page, area, genre, newest_first=False):
+        """处理一页，返回 (本页卡片, 新链接集合)；解析失败返回 None"""
+        exurl = list_page_url(url, page, newest_first)
+        metrics = get_metrics()
+        metrics.inc("tabelog_pages_total")
+        html = await self.fetch(exurl, "page_fetch")
+        with metrics.timer("cassette_parse"):
+            shops = tabelog_parser.parse_list_page(html, exurl)
+        if shops is None:
+            log(f"❌ 第 {page} 页解析失败：{exurl}")
+            return None
+        log(f"🔍 第 {page} 页共找到 {len(shops)} 个店铺：{exurl}")
+
+        links = [rst["link"] for rst in shops if rst["link"]]
+        new_links = set(await asyncio.to_thread(self._record_page_links, links, url, area, genre))
+        self.stats.skipped += len(links) - len(new_links)
+        await asyncio.gather(*(self.get_shop(rst, url, area, genre) for rst in shops if rst["link"] in new_links))
+        return shops, new_links
+
+    def _record_page_links(self, links, url, area, genre):
+        with self.db_lock:
+            return record_page_links(links, url, area, genre)
+
+    async def get_list(self, url, total, area, genre):
+        # 之前完整翻完过的一览按新着顺逐页翻，遇到整页都已收集就停
+        newest_first = await asyncio.to_thread(get_db().is_list_complete, url)
+
+        # 第 1 页决定每页件数，再按件数算出剩余页数（最多 60 页）
+        result = await self.get_page(url, 1, area, genre, newest_first)
+        if result is None:
+            return
+        first, new_links = result
+        if not first:
+            return
+        pages = min(MAX_PAGE, math.ceil(total / len(first)))
+
+        if newest_first:
+            page = 1
+            while new_links and page < pages:
+                page += 1
+                result = await self.get_page(url, page, area, genre, newest_first)
+                if result is None:
+                    return
+                _, new_links = result
+            if not new_links:
+                log(f"⏹️ {url} 第 {page} 页店铺全部已收集（新着顺），停止翻页")
+        else:
+            # 剩余页一起并发；有页面失败时不标记为完整
+            results = await asyncio.gather(*(self.get_page(url, page, area, genre) for page in range(2, pages + 1)))
+            if any(result is None for result in results):
+                return
+
+        await asyncio.to_thread(get_db().mark_list_complete, url)
+
+    async def crawl_url(self, url_info):
+        total = await self.get_count(url_info)
+        need, result0, result1, result2 = await asyncio.to_thread(get_db().is_need_get_shop, url_info["url"])
+
+        if need and total > 0:
+            log(f'⬇️ 开始收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+            await self.get_list(url_info["url"], total, url_info["area_code"], url_info["genre"])
+        else:
+            log(f'⚠️ 跳过收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+
+    async def _worker(self, queue):
+        while True:
+            url_info = await queue.get()
+            try:
+                await self.crawl_url(url_info)
+            except Exception as e:
+                log(f'❌ {url_info["url"]} 采集异常：{type(e).__name__} - {e}')
+                self.stats.errors += 1
+            finally:
+                queue.task_done()
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            log(self.stats.report())
+            log(f"🚦 当前速率（req/s）：{self.rate.rates()}")
+
+    async def run(self, urls):
+        self.global_sem = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+
+        # url_info 用队列分发，避免一次性为整个 area×genre 矩阵创建 task
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, timeout=timeout, connector=connector) as session:
+            self.session = session
+            workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+            reporter = asyncio.create_task(self._reporter())
+            for url_info in urls:
+                await queue.put(url_info)
+            await queue.join()
+            for task in workers + [reporter]:
+                task.cancel()
+            await asyncio.gather(*workers, reporter, return_exceptions=True)
+
+        log(self.stats.report())
+
+
+def run(urls, concurrency=16, per_host=4):
+    crawler = AsyncCrawler(concurrency=concurrency, per_host=per_host)
+    asyncio.run(crawler.run(urls))
+    return crawler.stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="tabelog shops 并发采集（asyncio）")
+    parser.add_argument("--concurrency", type=int, default=16, help="全局并发请求数上限")
+    parser.add_argument("--per-host", type=int, default=4, help="每个 host 的并发请求数上限")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(get_urls(), args.concurrency, args.per_host)
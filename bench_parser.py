@@ -0,0 +1,310 @@
+import os
+import re
+import gc
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = "bench_fixtures"          # 录制的页面：bench_fixtures/{list,detail,area,genre}/*.html
+BASELINE_PATH = "bench_baseline.json"
+KINDS = ("list", "detail", "area", "genre")
+BASE_URL = "https://tabelog.com/"       # lxml 解析时补全相对链接用
+REPEAT = 5                              # 每个函数跑几轮，取最快的一轮
+THRESHOLD = 0.25                        # 比基准慢 / 多用内存超过 25% 算退化
+
+
+def fixture_kind(url):
+    """http_cache 的 page_type 把地区 / ジャンル一览都算作 index，这里再分开"""
+    if "/matome/area_lst" in url:
+        return "area"
+    if "/cat_lst" in url:
+        return "genre"
+    if "/rstLst/" in url:
+        return "list"
+    return "detail"
+
+
+def record_fixtures(limit, fixture_dir=FIXTURE_DIR, cache_path=None):
+    """从 http_cache.db 导出每种页面最多 limit 个作为基准测试的语料，返回 {kind: 件数}"""
+    from http_cache import CACHE_PATH, ResponseCache
+
+    cache = ResponseCache(cache_path or CACHE_PATH)
+    counts = dict.fromkeys(KINDS, 0)
+    try:
+        for (url,) in cache.conn.execute("SELECT url FROM response_cache ORDER BY fetched_at DESC").fetchall():
+            kind = fixture_kind(url)
+            if counts[kind] >= limit:
+                continue
+            _write_fixture(fixture_dir, kind, url, cache.get(url).body)
+            counts[kind] += 1
+    finally:
+        cache.close()
+    return counts
+
+
+def _write_fixture(fixture_dir, kind, url, html):
+    name = re.sub(r"[^0-9A-Za-z_-]+", "_", url.split("://", 1)[-1]).strip("_")
+    os.makedirs(os.path.join(fixture_dir, kind), exist_ok=True)
+    with open(os.path.join(fixture_dir, kind, f"{name}.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+
+
+def synthesize_fixtures(limit, fixture_dir=FIXTURE_DIR, seed=0):
+    """
+    没有 http_cache.db 时用 mock_tabelog.MockSite 生成语料（仓库里提交的 bench_fixtures 就是这样来的），
+    一览 / 详情各最多 limit 个，地区 / ジャンル一览各 1 个，返回 {kind: 件数}
+    """
+    from mock_tabelog import MockSite
+
+    site = MockSite(seed=seed)
+    pages = [("area", "matome/area_lst/", site.area_page()), ("genre", "cat_lst/", site.genre_page())]
+    combos = sorted(combo for combo, n in site.counts.items() if n)[:limit]
+    for a4, genre in combos:
+        pref, a3 = site.areas[a4]
+        pages.append(("list", f"{pref}/{a3}/{a4}/rstLst/{genre}/", site.list_page([pref, a3, a4], genre, 1)))
+        shop_id = site.shop_id(a4, genre, 0)
+        pages.append(("detail", f"{pref}/{a3}/{a4}/{shop_id}/", site.detail_page(shop_id)))
+
+    counts = dict.fromkeys(KINDS, 0)
+    for kind, path, html in pages:
+        _write_fixture(fixture_dir, kind, BASE_URL + path, html)
+        counts[kind] += 1
+    return counts
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR):
+    """{kind: [(相对路径, html), ...]}"""
+    fixtures = {}
+    for kind in KINDS:
+        folder = os.path.join(fixture_dir, kind)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.endswith(".html"):
+                with open(os.path.join(folder, name), encoding="utf-8") as f:
+                    fixtures.setdefault(kind, []).append((f"{kind}/{name}", f.read()))
+    return fixtures
+
+
+def measure(func, inputs, repeat=REPEAT):
+    """func 依次处理 inputs，跑 repeat 轮取最快一轮的秒数；另跑一轮用 tracemalloc 取峰值内存"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for item in inputs:
+            func(item)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    for item in inputs:
+        func(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "pages": len(inputs),
+        "seconds": round(best, 6),
+        "ms_per_page": round(best / len(inputs) * 1000, 4),
+        "pages_per_sec": round(len(inputs) / best, 1) if best else None,
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def lxml_cases(fixtures):
+    """不开浏览器的解析（tabelog_parser）：[(名称, 页面类型, func, inputs), ...]"""
+    import tabelog_parser as p
+
+    htmls = {kind: [html for _, html in pages] for kind, pages in fixtures.items()}
+    cases = []
+    if "list" in htmls:
+        cases += [
+            ("load_html", "list", partial(p.load_html, base_url=BASE_URL), htmls["list"]),
+            ("parse_list_page", "list", partial(p.parse_list_page, base_url=BASE_URL), htmls["list"]),
+            ("parse_page_count", "list", p.parse_page_count, htmls["list"]),
+        ]
+    if "detail" in htmls:
+        docs = [p.load_html(html) for html in htmls["detail"]]
+        docs = [doc for doc in docs if doc is not None]
+        cases += [
+            ("parse_detail_page", "detail", p.parse_detail_page, htmls["detail"]),
+            ("parse_address", "detail", p.parse_address, docs),
+            ("parse_detail_table", "detail", p.parse_detail_table, docs),
+        ]
+    if "area" in htmls:
+        cases.append(("parse_area_page", "area", partial(p.parse_area_page, base_url=BASE_URL), htmls["area"]))
+    if "genre" in htmls:
+        cases.append(("parse_genre_page", "genre", partial(p.parse_genre_page, base_url=BASE_URL), htmls["genre"]))
+    return cases
+
+
+def serve_fixtures(fixture_dir=FIXTURE_DIR):
+    """在 127.0.0.1 的随机端口上提供 fixture 文件，返回 (server, base_url)"""
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Handler, directory=fixture_dir))
+    threading.Thread(target=server.serve_forever, name="bench-fixtures", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def selenium_cases(driver, fixtures, base_url):
+    """
+    Selenium 路径（getlist / getarea / getcatlog 里的提取函数）。
+    页面先打开好，只计提取的耗时；*_each 是逐个元素取，*_batch 是一次 execute_script（SELENIUM_BATCH）。
+    get_areas / get_genres 自带打开页面，整体计时。
+    """
+    import getlist
+    import getarea
+    import getcatlog
+    from rate_limiter import TokenBucket, get_controller
+    from urllib.parse import urlparse
+
+    # 本地文件服务器不需要限速
+    controller = get_controller()
+    controller.buckets[urlparse(base_url).netloc] = TokenBucket(controller.clock, rate=1000, burst=1000, max_rate=1000)
+
+    def opened(path, selector, func):
+        def prepare():
+            driver.get(base_url + path)
+            getlist.wait_for(driver, selector)
+        return prepare, partial(func, driver)
+
+    def cassettes_each(drv):
+        links = drv.execute_script(getlist.JS_CASSETTE_LINKS) or []
+        return getlist.extract_cassettes_each(drv, links)
+
+    def detail_each(drv):
+        getlist.parse_japanese_address(drv)
+        return getlist.extract_shop_detail_table(drv)
+
+    cases = []
+    for path, _ in fixtures.get("list", []):
+        cases.append(("extract_cassettes_each", "list", *opened(path, "div.list-controll", cassettes_each)))
+        cases.append(("extract_cassettes_batch", "list", *opened(path, "div.list-controll",
+                                                                 getlist.extract_cassettes_batch)))
+    for path, _ in fixtures.get("detail", []):
+        cases.append(("detail_each", "detail", *opened(path, "#rst-data-head", detail_each)))
+        cases.append(("detail_batch", "detail", *opened(path, "#rst-data-head", getlist.extract_shop_detail)))
+    for path, _ in fixtures.get("area", []):
+        cases.append(("get_areas", "area", lambda: None, partial(getarea.get_areas, driver, base_url + path)))
+    for path, _ in fixtures.get("genre", []):
+        cases.append(("get_genres", "genre", lambda: None, partial(getcatlog.get_genres, driver, base_url + path)))
+    return cases
+
+
+def measure_selenium(cases):
+    """浏览器里每个页面只跑一次（打开页面的时间不算），按函数汇总"""
+    results = {}
+    for name, kind, prepare, run in cases:
+        prepare()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        row = results.setdefault(name, {"kind": kind, "pages": 0, "seconds": 0.0})
+        row["pages"] += 1
+        row["seconds"] += elapsed
+    for row in results.values():
+        row["seconds"] = round(row["seconds"], 6)
+        row["ms_per_page"] = round(row["seconds"] / row["pages"] * 1000, 4)
+        row["pages_per_sec"] = round(row["pages"] / row["seconds"], 2) if row["seconds"] else None
+    return results
+
+
+def run_benchmarks(fixture_dir=FIXTURE_DIR, repeat=REPEAT, selenium=False):
+    fixtures = load_fixtures(fixture_dir)
+    if not fixtures:
+        return {}
+    results = {}
+    for name, kind, func, inputs in lxml_cases(fixtures):
+        if inputs:
+            results[name] = {"kind": kind, **measure(func, inputs, repeat)}
+
+    if selenium:
+        from getlist import create_driver
+
+        server, base_url = serve_fixtures(fixture_dir)
+        driver = create_driver()
+        try:
+            results.update(measure_selenium(selenium_cases(driver, fixtures, base_url)))
+        finally:
+            driver.quit()
+            server.shutdown()
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """和基准比较，返回退化的项目 [(函数, 指标, 基准值, 本次值), ...]；基准里没有的函数不比较"""
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for key in ("ms_per_page", "peak_kb"):
+            if base.get(key) and row.get(key) is not None and row[key] > base[key] * (1 + threshold):
+                regressions.append((name, key, base[key], row[key]))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    baseline = baseline or {}
+    lines = [f"{'函数':<28}{'类型':<8}{'页数':>6}{'ms/页':>10}{'页/秒':>10}{'峰值KB':>10}{'基准ms/页':>12}"]
+    for name, row in sorted(results.items(), key=lambda item: (item[1]["kind"], item[0])):
+        base = baseline.get(name, {}).get("ms_per_page")
+        peak = row.get("peak_kb")
+        lines.append(
+            f"{name:<28}{row['kind']:<8}{row['pages']:>6}{row['ms_per_page']:>10.3f}{row['pages_per_sec'] or 0:>10}"
+            f"{peak if peak is not None else '-':>10}{base if base is not None else '-':>12}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用录制的 HTML 离线测量解析代码的速度和内存")
+    parser.add_argument("--record", type=int, metavar="N", help="从 http_cache.db 每种页面导出最多 N 个作为语料")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="用 mock_tabelog 生成语料（一览 / 详情各 N 个）")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--selenium", action="store_true", help="同时用本地文件服务器 + Chrome 测 Selenium 提取路径")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基准")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="比基准慢多少（比例）算退化，默认 0.25")
+    args = parser.parse_args()
+
+    if args.record:
+        counts = record_fixtures(args.record, args.fixtures)
+        print("📼 已导出：" + "，".join(f"{kind} {n} 个" for kind, n in counts.items()))
+
+    if args.synthetic:
+        counts = synthesize_fixtures(args.synthetic, args.fixtures)
+        print("🧪 已生成：" + "，".join(f"{kind} {n} 个" for kind, n in counts.items()))
+
+    results = run_benchmarks(args.fixtures, args.repeat, args.selenium)
+    if not results:
+        print(f"⚠️ {args.fixtures} 里没有页面，先用 --record N 从 http_cache.db 导出（或 --synthetic N 生成）")
+        sys.exit(1)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_results(results, baseline))
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"💾 基准已保存：{args.baseline}")
+    elif baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, key, before, after in regressions:
+            print(f"❌ {name} {key}：{before} → {after}（+{(after / before - 1) * 100:.0f}%）")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ 没有超过 {args.threshold:.0%} 的退化")
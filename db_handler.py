@@ -1,36 +1,258 @@
 import sqlite3
 import os
+import logging
 import threading
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
+from shop_index import ShopUrlIndex, format_report
+from normalize import NORMALIZED_COLUMNS, normalize_shop, parse_payment_methods, split_genres
+import rollup
+import hierarchy
+
+logger = logging.getLogger("tabelog.db")
+
+# 连接级 PRAGMA：WAL 让分析脚本读库时不阻塞采集写入
+PRAGMAS = (
+    "journal_mode = WAL",
+    "synchronous = NORMAL",       # WAL 下 NORMAL 已足够安全，fsync 次数大幅减少
+    "cache_size = -65536",        # 64MB page cache
+    "mmap_size = 268435456",      # 256MB mmap
+    "temp_store = MEMORY",
+    "busy_timeout = 5000",
+)
+
+# (表名, 索引名, 列)：表存在时才建索引（area/genre 由 getarea/getcatlog 创建）
+# shop_catlog(link) 不用另建：UNIQUE(link, area, genre) 的自动索引已经以 link 开头
+INDEXES = (
+    ("genre", "idx_genre_parent_code", "parent_code"),
+    ("area", "idx_area_deleted_level_priority", "is_deleted, level, priority"),
+    ("shops", "idx_shops_area_genre", "area, genre"),
+    # export.py 的增量导出按 (update_time, id) 翻页
+    ("shops", "idx_shops_update_time_id", "update_time, id"),
+    ("shop_list_summary", "idx_shop_list_summary_update_time_id", "update_time, id"),
+    ("shop_catlog", "idx_shop_catlog_area_genre_id", "area_id, genre_id"),
+    ("shop_catlog", "idx_shop_catlog_shop_id", "shop_id"),
+)
+
+# (表名, 列名, 类型)：旧库缺少的列用 ALTER TABLE 补上
+COLUMNS = (
+    # 最后一次完整翻完一览时的 total_count；非 NULL 表示这个一览至少完整采集过一次
+    ("shop_list_summary", "complete_total", "INTEGER"),
+    # shop_catlog 的整数外键（shops.id / area.id / genre.id），文本列保留作唯一键
+    ("shop_catlog", "shop_id", "INTEGER"),
+    ("shop_catlog", "area_id", "INTEGER"),
+    ("shop_catlog", "genre_id", "INTEGER"),
+) + tuple(
+    # 入库时由 normalize.normalize_shop 从原始文本解析出的数值列
+    ("shops", column, col_type) for column, col_type in NORMALIZED_COLUMNS
+)
+
+
+# 评分 / 口コミ数的时间序列：值变化时由触发器追加一条样本。
+# (shop_id, ts) 为主键的 WITHOUT ROWID 表，按店铺 + 时间范围查询直接走主键，不需要额外索引；
+# ts 为 UNIX 秒，score/reviews 存 REAL/INTEGER（取不到数值的存 NULL）。
+METRICS_HISTORY_TABLE = """
+    CREATE TABLE IF NOT EXISTS shop_metrics_history (
+        shop_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        score REAL,
+        reviews INTEGER,
+        PRIMARY KEY (shop_id, ts)
+    ) WITHOUT ROWID
+"""
+
+# shops.score / reviews 是 TEXT（如 "3.58"、"1,234"、"-"），转成数值
+_SCORE_SQL = "CASE WHEN {0}.score GLOB '[0-9]*' THEN CAST({0}.score AS REAL) END"
+_REVIEWS_SQL = "CASE WHEN {0}.reviews GLOB '[0-9]*' THEN CAST(REPLACE({0}.reviews, ',', '') AS INTEGER) END"
+# 同一秒内多次变化只保留最后的值。触发器里的 OR REPLACE 会被外层 upsert 的冲突策略覆盖，所以用 ON CONFLICT
+_SAMPLE_SQL = f"""
+    INSERT INTO shop_metrics_history (shop_id, ts, score, reviews)
+    SELECT NEW.id, CAST(strftime('%s', 'now') AS INTEGER), {_SCORE_SQL.format("NEW")}, {_REVIEWS_SQL.format("NEW")}
+    WHERE 1
+    ON CONFLICT(shop_id, ts) DO UPDATE SET score = excluded.score, reviews = excluded.reviews;
+"""
+
+METRICS_HISTORY_TRIGGERS = (
+    "DROP TRIGGER IF EXISTS trg_shops_metrics_insert",
+    "DROP TRIGGER IF EXISTS trg_shops_metrics_update",
+    f"""
+    CREATE TRIGGER trg_shops_metrics_insert AFTER INSERT ON shops
+    BEGIN {_SAMPLE_SQL} END
+    """,
+    f"""
+    CREATE TRIGGER trg_shops_metrics_update AFTER UPDATE OF score, reviews ON shops
+    WHEN NEW.score IS NOT OLD.score OR NEW.reviews IS NOT OLD.reviews
+    BEGIN {_SAMPLE_SQL} END
+    """,
+)
+
+# 历史表第一次创建时，用现有 shops 的值作为每家店的第一条样本（update_time 是本地时间）
+METRICS_HISTORY_BACKFILL = f"""
+    INSERT OR IGNORE INTO shop_metrics_history (shop_id, ts, score, reviews)
+    SELECT s.id, CAST(strftime('%s', COALESCE(s.update_time, 'now'), 'utc') AS INTEGER),
+           {_SCORE_SQL.format("s")}, {_REVIEWS_SQL.format("s")}
+    FROM shops s
+"""
+
+METRICS = ("score", "reviews")
+
+# 店铺 ↔ ジャンル / 支払い方法 的多对多关联表，入库时由 sync_shop_relations 维护。
+# 主键 (shop_id, x_id) + 反向索引 (x_id, shop_id)，两个方向的筛选都是索引查找。
+RELATION_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS payment_method (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS shop_genre (
+        shop_id INTEGER NOT NULL,
+        genre_id INTEGER NOT NULL,
+        PRIMARY KEY (shop_id, genre_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_shop_genre_genre ON shop_genre(genre_id, shop_id)",
+    """
+    CREATE TABLE IF NOT EXISTS shop_payment (
+        shop_id INTEGER NOT NULL,
+        payment_id INTEGER NOT NULL,
+        PRIMARY KEY (shop_id, payment_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_shop_payment_payment ON shop_payment(payment_id, shop_id)",
+)
+
+
+def apply_pragmas(conn):
+    for pragma in PRAGMAS:
+        conn.execute(f"PRAGMA {pragma}")
+
+
+def migrate_schema(conn):
+    """补建缺少的列和索引，可以重复执行"""
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for table, column, col_type in COLUMNS:
+        if table in existing:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+    for table, index, columns in INDEXES:
+        if table in existing:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}({columns})")
+    if "shops" in existing:
+        if "shop_metrics_history" not in existing:
+            conn.execute(METRICS_HISTORY_TABLE)
+            conn.execute(METRICS_HISTORY_BACKFILL)
+        for trigger in METRICS_HISTORY_TRIGGERS:
+            conn.execute(trigger)
+        for ddl in RELATION_TABLES:
+            conn.execute(ddl)
+        rollup.install(conn)
+    for table in hierarchy.TABLES:
+        if table in existing and f"{table}_closure" not in existing:
+            hierarchy.rebuild_closure(conn, table)
+    conn.commit()
+
 
 class TabelogDB:
-    def __init__(self, db_path="tabelog.db"):
+    # 本进程内已经检查过表结构的数据库文件，避免每次实例化都查 sqlite_master
+    _initialized_paths = set()
+
+    def __init__(self, db_path="tabelog.db", batch_size=None, flush_interval=None, url_index=None):
+        """
+        batch_size / flush_interval 不指定时，每次写入立即 commit（原来的行为）。
+        指定后进入 session 模式：复用同一个连接，写入累计 batch_size 行
+        或距上次 commit 超过 flush_interval 秒时才 commit 一次。
+        url_index="set"/"bloom" 时启动时把 shops.url 载入内存索引，is_exit_shop 先查索引。
+        """
         self.db_path = db_path
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()
         self.conn = None
         self.cursor = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.last_commit = time.monotonic()
+        self._flusher = None
+        self._closed = threading.Event()
+        self._ref_ids = {}
 
         is_new_db = not os.path.exists(self.db_path)
 
         self._connect()
 
+        if self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, name="tabelog-db-flusher", daemon=True)
+            self._flusher.start()
+
+        key = os.path.abspath(self.db_path)
+        if is_new_db or key not in TabelogDB._initialized_paths:
+            TabelogDB._initialized_paths.add(key)
+            self._ensure_schema(is_new_db)
+
+        self.url_index = None
+        if url_index:
+            self.url_index = ShopUrlIndex.load(self.conn, url_index)
+            logger.info("📇 已载入店铺 url 索引: %s", format_report(self.url_index.memory_report()))
+
+    def _ensure_schema(self, is_new_db):
         if is_new_db:
-            print("📁 数据库文件不存在，首次创建:", self.db_path)
+            logger.info("📁 数据库文件不存在，首次创建: %s", self.db_path)
         #else:
             #print("✅ 已加载数据库文件:", self.db_path)
 
         if not self._table_exists("shops"):
-            print("📦 表不存在，正在创建 shops 表...")
+            logger.info("📦 表不存在，正在创建 shops 表...")
             self._create_shops_table()
 
         if not self._table_exists("shop_list_summary"):
-            print("📦 表不存在，正在创建 shop_list_summary 表...")
+            logger.info("📦 表不存在，正在创建 shop_list_summary 表...")
             self._create_shop_list_summary_table()
             
         if not self._table_exists("shop_catlog"):
-            print("📦 表不存在，正在创建 shop_catlog 表...")
+            logger.info("📦 表不存在，正在创建 shop_catlog 表...")
             self._create_shop_catlog_table()
 
+        migrate_schema(self.conn)
+
+    @property
+    def session_mode(self):
+        return bool(self.batch_size or self.flush_interval)
+
+    def _commit(self, rows=1):
+        """写入后调用：普通模式立即 commit；session 模式按行数/时间批量 commit"""
+        if not self.session_mode:
+            self.conn.commit()
+            return
+
+        self.pending += rows
+        if self.batch_size and self.pending >= self.batch_size:
+            self.flush()
+        elif self.flush_interval and time.monotonic() - self.last_commit >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.conn is None:
+                return
+            if self.conn.in_transaction:
+                self.conn.commit()
+            self.pending = 0
+            self.last_commit = time.monotonic()
+
+    def _flush_loop(self):
+        # 空闲时也按 flush_interval 把未提交的写入落盘
+        while not self._closed.wait(self.flush_interval):
+            if self.pending:
+                self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def _create_shop_list_summary_table(self):
         self.cursor.execute('''
             CREATE TABLE IF NOT EXISTS shop_list_summary (
@@ -42,6 +264,7 @@ class TabelogDB:
                 get_count INTEGER DEFAULT 0,
                 skip_count INTEGER DEFAULT 0,
                 total_count INTEGER,
+                complete_total INTEGER,
                 is_deleted INTEGER DEFAULT 0,
                 create_time TEXT DEFAULT CURRENT_TIMESTAMP,
                 update_time TEXT DEFAULT CURRENT_TIMESTAMP
@@ -65,25 +288,56 @@ class TabelogDB:
 
         self.conn.commit()
         
+    INSERT_SHOP_CATLOG_SQL = """
+        INSERT INTO shop_catlog (link, area, genre, area_id, genre_id, shop_id)
+        VALUES (?, ?, ?, ?, ?, (SELECT id FROM shops WHERE url = ?))
+        ON CONFLICT(link, area, genre) DO NOTHING;
+    """
+
+    def ref_ids(self, table, column="code"):
+        """area / genre 的 {code: id}（column="name" 时 {name: id}），表不存在时为空；每个实例只查一次"""
+        key = (table, column)
+        if key not in self._ref_ids:
+            ids = {}
+            if self._table_exists(table):
+                self.cursor.execute(f"SELECT {column}, id FROM {table} WHERE is_deleted = 0")
+                ids = {row[0]: row[1] for row in self.cursor.fetchall()}
+            self._ref_ids[key] = ids
+        return self._ref_ids[key]
+
+    def _catlog_params(self, link, area, genre):
+        return (link, area, genre, self.ref_ids("area").get(area), self.ref_ids("genre").get(genre), link)
+
     def insert_shop_catlog(self,link, area, genre):
 
-        sql = """
-        INSERT INTO shop_catlog (link, area, genre)
-        VALUES (?, ?, ?)
-        ON CONFLICT(link, area, genre) DO NOTHING;
-        """
-        self.cursor.execute(sql, (link, area, genre))
-        self.conn.commit()
-        changes = self.conn.total_changes
+        with self.lock:
+            self.cursor.execute(self.INSERT_SHOP_CATLOG_SQL, self._catlog_params(link, area, genre))
+            # total_changes 是连接累计值，复用连接时要看本条语句的 rowcount
+            changes = self.cursor.rowcount
+            self._commit()
 
-        if changes:
+        if changes > 0:
             return True
         else:
             return False        
         
+    def insert_shop_catlogs(self, rows):
+        """批量写入 shop_catlog，rows: [(link, area, genre), ...]，已存在的忽略；返回新插入件数"""
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self.lock:
+            before = self.conn.total_changes
+            self.cursor.executemany(self.INSERT_SHOP_CATLOG_SQL,
+                                    [self._catlog_params(link, area, genre) for link, area, genre in rows])
+            inserted = self.conn.total_changes - before
+            self._commit(len(rows))
+        return inserted
+
     def _connect(self):
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
         self.conn.row_factory = sqlite3.Row
+        apply_pragmas(self.conn)
         self.cursor = self.conn.cursor()
 
     def _table_exists(self, table_name: str) -> bool:
@@ -151,7 +405,18 @@ class TabelogDB:
     def select_genres(self):
         cur = self.conn.cursor()
 
-        cur.execute("""
+        if hierarchy.has_closure(self.conn, "genre"):
+            # 叶子ジャンル：闭包表里自己到自己那一行带 is_leaf，不用相关子查询
+            cur.execute("""
+                        SELECT g.name, g.code, g.level, g.parent_code
+                        FROM genre_closure AS c
+                        JOIN genre AS g ON g.code = c.descendant
+                        WHERE c.depth = 0 AND c.is_leaf = 1
+                        AND g.is_deleted = 0
+                        ORDER BY g.code ASC
+                    """)
+        else:
+            cur.execute("""
                     SELECT name, code, level, parent_code
                     FROM genre AS g
                     WHERE NOT EXISTS (
@@ -176,8 +441,9 @@ class TabelogDB:
         return genres    
 
     def is_need_get_shop(self, url):
-        self.cursor.execute("SELECT get_count,skip_count,total_count FROM shop_list_summary WHERE url = ? AND is_deleted = 0", (url,))
-        result = self.cursor.fetchone()
+        with self.lock:
+            self.cursor.execute("SELECT get_count,skip_count,total_count FROM shop_list_summary WHERE url = ? AND is_deleted = 0", (url,))
+            result = self.cursor.fetchone()
         if result:
              if result[0]+result[1] >= result[2]:
                 return False,result[0],result[1],result[2]
@@ -192,125 +458,358 @@ class TabelogDB:
                 update_time = DATETIME('now', 'localtime')
             WHERE url = ? AND is_deleted = 0
         '''
-        self.cursor.execute(sql, (url,))
-        self.conn.commit()
+        with self.lock:
+            self.cursor.execute(sql, (url,))
+            self._commit()
         
-    def countskip_to_shop_list_summary(self,url):
+    def countskip_to_shop_list_summary(self,url,n=1):
         sql = '''
             UPDATE shop_list_summary
-            SET skip_count = skip_count + 1,
+            SET skip_count = skip_count + ?,
                 update_time = DATETIME('now', 'localtime')
             WHERE url = ? AND is_deleted = 0
         '''
-        self.cursor.execute(sql, (url,))
-        self.conn.commit()
+        with self.lock:
+            self.cursor.execute(sql, (n, url))
+            self._commit()
 
-    def upsert_shop_list_summary(self, url, parent_area_code, area, genre, total_count):
-        # 先检查是否已存在该 URL
-        self.cursor.execute("SELECT id FROM shop_list_summary WHERE url = ? AND is_deleted = 0", (url,))
-        result = self.cursor.fetchone()
+    def is_list_complete(self, url):
+        """这个一览是否曾经完整翻完过（之后只会有新增店铺）"""
+        with self.lock:
+            self.cursor.execute("SELECT complete_total FROM shop_list_summary WHERE url = ? AND is_deleted = 0", (url,))
+            row = self.cursor.fetchone()
+        return row is not None and row[0] is not None
+
+    def mark_list_complete(self, url):
+        sql = '''
+            UPDATE shop_list_summary
+            SET complete_total = total_count,
+                update_time = DATETIME('now', 'localtime')
+            WHERE url = ? AND is_deleted = 0
+        '''
+        with self.lock:
+            self.cursor.execute(sql, (url,))
+            self._commit()
 
+    def upsert_shop_list_summaries(self, rows):
+        """
+        批量写入一览件数。rows: [(url, parent_area_code, area, genre, total_count), ...]
+        已存在且未删除的 url 只更新 total_count / update_time。
+        """
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        params = [(url, parent_area_code, area, genre, total_count, now, now)
+                  for url, parent_area_code, area, genre, total_count in rows]
+        if not params:
+            return 0
 
-        if result:
-            # 存在：执行 UPDATE
-            sql = '''
-                UPDATE shop_list_summary
-                SET total_count = ?, update_time = ?
-                WHERE url = ? AND is_deleted = 0
-            '''
-            self.cursor.execute(sql, (total_count, now, url))
-        else:
-            # 不存在：执行 INSERT
-            sql = '''
-                INSERT INTO shop_list_summary
-                (url, parent_area_code, area, genre, total_count, create_time, update_time)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            '''
-            self.cursor.execute(sql, (url, parent_area_code, area, genre, total_count, now, now))
+        sql = '''
+            INSERT INTO shop_list_summary
+            (url, parent_area_code, area, genre, total_count, create_time, update_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                total_count = excluded.total_count,
+                update_time = excluded.update_time
+            WHERE shop_list_summary.is_deleted = 0
+        '''
+        with self.lock:
+            self.cursor.executemany(sql, params)
+            self._commit(len(params))
+        return len(params)
 
-        self.conn.commit()
+    def upsert_shop_list_summary(self, url, parent_area_code, area, genre, total_count):
+        self.upsert_shop_list_summaries([(url, parent_area_code, area, genre, total_count)])
+
+    def known_shop_urls(self, urls):
+        """批量判断哪些 url 已经在 shops 里，返回已存在的 url 集合"""
+        urls = {url for url in urls if url}
+        if self.url_index is not None:
+            candidates = {url for url in urls if url in self.url_index}
+            if self.url_index.exact:
+                return candidates
+            # bloom 命中的再回查数据库
+            urls = candidates
+
+        known = set()
+        urls = list(urls)
+        with self.lock:
+            # SQLite 默认最多 999 个参数，分块查询
+            for i in range(0, len(urls), 900):
+                chunk = urls[i:i + 900]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(f"SELECT url FROM shops WHERE url IN ({placeholders})", chunk)
+                known.update(row[0] for row in self.cursor.fetchall())
+        return known
+
+    def shops_to_refresh(self, shops, max_age_days=None):
+        """
+        增量更新用：shops 是一览页卡片（link/score/reviews），返回需要重新取详情的 link 集合——
+        已在 shops 表里，且一览上的评分 / 口コミ数和库里不同，或 update_time 早于 max_age_days 天前。
+        """
+        cards = {rst["link"]: rst for rst in shops if rst.get("link")}
+        cutoff = None
+        if max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+
+        stale = set()
+        urls = list(cards)
+        with self.lock:
+            for i in range(0, len(urls), 900):
+                chunk = urls[i:i + 900]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(
+                    f"SELECT url, score, reviews, update_time FROM shops WHERE url IN ({placeholders})", chunk)
+                for url, score, reviews, update_time in self.cursor.fetchall():
+                    rst = cards[url]
+                    if (str(score or "").strip() != str(rst.get("score", "")).strip()
+                            or str(reviews or "").strip() != str(rst.get("reviews", "")).strip()
+                            or (cutoff is not None and (update_time or "") < cutoff)):
+                        stale.add(url)
+        return stale
 
     def is_exit_shop(self, shop_url):
+        if self.url_index is not None:
+            if shop_url not in self.url_index:
+                return False
+            if self.url_index.exact:
+                return True
+            # bloom 命中可能是误判，回查数据库
+
         result = False
-        self.cursor.execute("SELECT id FROM shops WHERE url = ?", (shop_url,))
-        row = self.cursor.fetchone()
+        with self.lock:
+            self.cursor.execute("SELECT id FROM shops WHERE url = ?", (shop_url,))
+            row = self.cursor.fetchone()
         if row:
             result = True
         
         return result
 
-    def insert_or_update_shop(self, shop_data: dict):
-        with self.lock:
-            self.cursor.execute("SELECT id FROM shops WHERE url = ?", (shop_data.get("url", ""),))
-            row = self.cursor.fetchone()
+    SHOP_COLUMNS = (
+        ("name", "name"), ("url", "url"), ("score", "score"), ("reviews", "reviews"),
+        ("prefecture", "prefecture"), ("city", "city"), ("town", "town"), ("detail", "detail"),
+        ("full_address", "full"), ("phone", "phone"), ("category", "category"), ("budget", "budget"),
+        ("payment", "payment"), ("seats", "seats"), ("open_date", "open_date"), ("area", "area"), ("genre", "genre"),
+    ) + tuple((column, column) for column, _ in NORMALIZED_COLUMNS)
+
+    UPSERT_SHOP_SQL = """
+        INSERT INTO shops (
+            name, url, score, reviews, prefecture, city, town,
+            detail, full_address, phone,
+            category, budget, payment, seats, open_date,area,genre,
+            score_value, review_count, seat_count,
+            dinner_budget_min, dinner_budget_max, lunch_budget_min, lunch_budget_max,
+            opened_on, payment_flags,
+            is_deleted, create_time, update_time
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            name=excluded.name, score=excluded.score, reviews=excluded.reviews,
+            prefecture=excluded.prefecture, city=excluded.city, town=excluded.town,
+            detail=excluded.detail, full_address=excluded.full_address, phone=excluded.phone,
+            category=excluded.category, budget=excluded.budget, payment=excluded.payment,
+            seats=excluded.seats, open_date=excluded.open_date, area=excluded.area, genre=excluded.genre,
+            score_value=excluded.score_value, review_count=excluded.review_count, seat_count=excluded.seat_count,
+            dinner_budget_min=excluded.dinner_budget_min, dinner_budget_max=excluded.dinner_budget_max,
+            lunch_budget_min=excluded.lunch_budget_min, lunch_budget_max=excluded.lunch_budget_max,
+            opened_on=excluded.opened_on, payment_flags=excluded.payment_flags,
+            is_deleted=0, update_time=excluded.update_time
+    """
+
+    # --refresh 重新取详情时：同一家店会出现在多个一览里，area / genre 保留已有的值，只更新详情和评分
+    REFRESH_SHOP_SQL = UPSERT_SHOP_SQL.replace(" area=excluded.area, genre=excluded.genre,", "")
+
+    def upsert_shops(self, shops, refresh=False):
+        """
+        批量写入店铺：url 已存在则更新（保留 create_time），否则插入。
+        shops 是 shop_data dict 的 list，整批一条 executemany；数值列在这里解析一次。
+        refresh=True 时已存在的店铺不改 area / genre，shop_genre 也按库里的 genre 重建。
+        """
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        params = []
+        for shop_data in shops:
+            row = {**shop_data, **normalize_shop(shop_data)}
+            params.append(tuple(row.get(key, "") for _, key in self.SHOP_COLUMNS) + (now, now))
+        if not params:
+            return 0
 
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            if row:
-                # 已存在，更新
-                self.cursor.execute("""
-                    UPDATE shops
-                    SET name=?, score=?, reviews=?, prefecture=?, city=?, town=?, detail=?,full_address=?, phone=?,
-                        category=?, budget=?,payment=?, seats=?, open_date=?, area=?, genre=?,
-                        is_deleted=0, update_time=?
-                    WHERE url=?
-                """, (
-                    shop_data.get("name", ""),
-                    shop_data.get("score", ""),
-                    shop_data.get("reviews", ""),
-                    shop_data.get("prefecture", ""),
-                    shop_data.get("city", ""),
-                    shop_data.get("town", ""),
-                    shop_data.get("detail", ""),
-                    shop_data.get("full", ""),
-                    shop_data.get("phone", ""),
-                    shop_data.get("category", ""),
-                    shop_data.get("budget", ""),
-                    shop_data.get("payment", ""),
-                    shop_data.get("seats", ""),
-                    shop_data.get("open_date", ""),
-                    shop_data.get("area", ""),
-                    shop_data.get("genre", ""),
-                    now,
-                    shop_data.get("url", "")
-                ))
-                print(f"🔄 更新店铺: {shop_data.get('name')}")
-            else:
-                # 不存在，插入
-                self.cursor.execute("""
-                    INSERT INTO shops (
-                        name, url, score, reviews, prefecture, city, town,
-                        detail, full_address, phone,
-                        category, budget, payment, seats, open_date,area,genre,
-                        is_deleted, create_time, update_time
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
-                """, (
-                    shop_data.get("name", ""),
-                    shop_data.get("url", ""),
-                    shop_data.get("score", ""),
-                    shop_data.get("reviews", ""),
-                    shop_data.get("prefecture", ""),
-                    shop_data.get("city", ""),
-                    shop_data.get("town", ""),
-                    shop_data.get("detail", ""),
-                    shop_data.get("full", ""),
-                    shop_data.get("phone", ""),
-                    shop_data.get("category", ""),
-                    shop_data.get("budget", ""),
-                    shop_data.get("payment", ""),
-                    shop_data.get("seats", ""),
-                    shop_data.get("open_date", ""),                    
-                    shop_data.get("area", ""),
-                    shop_data.get("genre", ""),
-                    now, now
-                ))
-                print(f"➕ 插入店铺: {shop_data.get('name')}")
-                
+        with self.lock:
+            self.cursor.executemany(self.REFRESH_SHOP_SQL if refresh else self.UPSERT_SHOP_SQL, params)
+            urls = [shop_data.get("url", "") for shop_data in shops]
+            ids = self._shop_ids(urls)
+            if refresh:
+                # shops.genre 保留了第一次采集时的值，shop_genre 也按它重建，不用这次刷新走的一览
+                genres = self._shop_column(urls, "genre")
+                shops = [{**shop_data, "genre": genres.get(shop_data.get("url"), shop_data.get("genre"))}
+                         for shop_data in shops]
+            self.sync_shop_relations([(ids[shop_data["url"]], shop_data) for shop_data in shops
+                                      if shop_data.get("url") in ids])
+            self._commit(len(params))
+            if self.url_index is not None:
+                self.url_index.update(shop_data.get("url", "") for shop_data in shops)
+        return len(params)
+
+    def _shop_ids(self, urls):
+        """{url: shops.id}"""
+        return self._shop_column(urls, "id")
+
+    def _shop_column(self, urls, column):
+        """{url: shops.<column>}"""
+        urls = list({url for url in urls if url})
+        values = {}
+        for i in range(0, len(urls), 900):
+            chunk = urls[i:i + 900]
+            placeholders = ",".join("?" * len(chunk))
+            self.cursor.execute(f"SELECT url, {column} FROM shops WHERE url IN ({placeholders})", chunk)
+            values.update((row[0], row[1]) for row in self.cursor.fetchall())
+        return values
+
+    def _payment_ids(self, names):
+        """支払い方法名 → payment_method.id，新名字先插入"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        self.cursor.executemany("INSERT OR IGNORE INTO payment_method (name) VALUES (?)", [(n,) for n in names])
+        placeholders = ",".join("?" * len(names))
+        self.cursor.execute(f"SELECT name, id FROM payment_method WHERE name IN ({placeholders})", names)
+        return {row[0]: row[1] for row in self.cursor.fetchall()}
+
+    def sync_shop_relations(self, rows):
+        """
+        rows: [(shop_id, shop_data), ...]。重建这些店铺的 shop_genre / shop_payment，
+        并补上 shop_catlog.shop_id。ジャンル取采集时的 genre code 和 category 里能对上 genre.name 的部分。
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        genre_by_code = self.ref_ids("genre")
+        genre_by_name = self.ref_ids("genre", "name")
+
+        genre_rows, payment_rows = [], []
+        methods = {shop_id: parse_payment_methods(shop_data.get("payment")) for shop_id, shop_data in rows}
+        payment_ids = self._payment_ids(name for names in methods.values() for name in names)
+        for shop_id, shop_data in rows:
+            genre_ids = {genre_by_code.get(shop_data.get("genre"))}
+            genre_ids.update(genre_by_name.get(name) for name in split_genres(shop_data.get("category")))
+            genre_rows.extend((shop_id, genre_id) for genre_id in genre_ids if genre_id is not None)
+            payment_rows.extend((shop_id, payment_ids[name]) for name in methods[shop_id])
 
+        with self.lock:
+            shop_ids = [(shop_id,) for shop_id, _ in rows]
+            self.cursor.executemany("DELETE FROM shop_genre WHERE shop_id = ?", shop_ids)
+            self.cursor.executemany("DELETE FROM shop_payment WHERE shop_id = ?", shop_ids)
+            self.cursor.executemany("INSERT OR IGNORE INTO shop_genre (shop_id, genre_id) VALUES (?, ?)", genre_rows)
+            self.cursor.executemany("INSERT OR IGNORE INTO shop_payment (shop_id, payment_id) VALUES (?, ?)",
+                                    payment_rows)
+            self.cursor.executemany("UPDATE shop_catlog SET shop_id = ? WHERE link = ? AND shop_id IS NULL",
+                                    [(shop_id, shop_data["url"]) for shop_id, shop_data in rows
+                                     if shop_data.get("url")])
+
+    def backfill_catlog_ids(self):
+        """旧数据：用文本列补上 shop_catlog 的 shop_id / area_id / genre_id，返回更新行数"""
+        with self.lock:
+            before = self.conn.total_changes
+            self.cursor.execute("""
+                UPDATE shop_catlog SET shop_id = (SELECT id FROM shops WHERE url = shop_catlog.link)
+                WHERE shop_id IS NULL
+            """)
+            for table in ("area", "genre"):
+                if self._table_exists(table):
+                    self.cursor.execute(f"""
+                        UPDATE shop_catlog SET {table}_id = (SELECT id FROM {table} WHERE code = shop_catlog.{table})
+                        WHERE {table}_id IS NULL
+                    """)
             self.conn.commit()
+            return self.conn.total_changes - before
+
+    def find_shops(self, area=None, genre=None, payment=None, limit=100):
+        """
+        按地区 code / ジャンル code / 支払い方法名筛选店铺（都可省略），
+        例：find_shops("A1301", "ramen", "QRコード決済")。各条件都走索引，不做 LIKE 扫描。
+        """
+        joins, where, params = [], ["s.is_deleted = 0"], []
+        if genre is not None:
+            joins.append("JOIN shop_genre sg ON sg.shop_id = s.id")
+            where.append("sg.genre_id = (SELECT id FROM genre WHERE code = ?)")
+            params.append(genre)
+        if payment is not None:
+            joins.append("JOIN shop_payment sp ON sp.shop_id = s.id")
+            where.append("sp.payment_id = (SELECT id FROM payment_method WHERE name = ?)")
+            params.append(payment)
+        if area is not None:
+            where.append("s.area = ?")
+            params.append(area)
+        sql = f"""
+            SELECT s.id, s.name, s.url, s.score_value, s.review_count FROM shops s
+            {" ".join(joins)}
+            WHERE {" AND ".join(where)}
+            ORDER BY s.score_value DESC
+            LIMIT ?
+        """
+        with self.lock:
+            self.cursor.execute(sql, params + [limit])
+            return self.cursor.fetchall()
+
+    def insert_or_update_shop(self, shop_data: dict, refresh=False):
+        self.upsert_shops([shop_data], refresh)
+        logger.debug("💾 保存店铺: %s", shop_data.get('name'))
+
+    def rollup_summary(self, by="area", level=1, **filters):
+        """area × genre 聚合表的查询，见 rollup.summary"""
+        with self.lock:
+            return rollup.summary(self.conn, by, level, **filters)
+
+    def top_movers(self, area, days=30, metric="score", limit=20):
+        """
+        area 里最近 days 天 score / reviews 变化最大的店铺，
+        返回 [(name, url, 之前的值, 现在的值, 变化量), ...]，按变化量绝对值降序。
+        之前的值取 days 天前最后一条样本，期间新出现的店铺不计入。
+        shops 走 (area, genre) 索引，历史样本走 (shop_id, ts) 主键，不做全表扫描。
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric 只能是 {METRICS}")
+        since = int(time.time() - days * 24 * 3600)
+        sql = f"""
+            SELECT name, url, before, after, ROUND(after - before, 2) AS delta FROM (
+                SELECT s.name, s.url,
+                    (SELECT h.{metric} FROM shop_metrics_history h
+                     WHERE h.shop_id = s.id AND h.ts <= :since ORDER BY h.ts DESC LIMIT 1) AS before,
+                    (SELECT h.{metric} FROM shop_metrics_history h
+                     WHERE h.shop_id = s.id ORDER BY h.ts DESC LIMIT 1) AS after
+                FROM shops s
+                WHERE s.area = :area AND s.is_deleted = 0
+                AND EXISTS (SELECT 1 FROM shop_metrics_history h WHERE h.shop_id = s.id AND h.ts > :since)
+            )
+            WHERE before IS NOT NULL AND after IS NOT NULL AND after != before
+            ORDER BY ABS(after - before) DESC
+            LIMIT :limit
+        """
+        with self.lock:
+            self.cursor.execute(sql, {"area": area, "since": since, "limit": limit})
+            return self.cursor.fetchall()
 
     def close(self):
+        self._closed.set()
         if self.conn:
+            self.flush()
             self.conn.close()
+            self.conn = None
             #print("✅ 已关闭数据库")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="schema 迁移 / 评分变化查询")
+    parser.add_argument("--top-movers", metavar="AREA", help="输出该地区最近 --days 天评分（或口コミ数）变化最大的店铺")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--metric", choices=METRICS, default="score")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    # 手动执行一次 schema 迁移（WAL + 索引），并更新统计信息
+    db = TabelogDB()
+    if args.top_movers:
+        for name, url, before, after, delta in db.top_movers(args.top_movers, args.days, args.metric, args.limit):
+            print(f"{delta:+g}\t{before} → {after}\t{name}\t{url}")
+    else:
+        db.conn.execute("ANALYZE")
+        print("✅ schema 迁移完成")
+    db.close()
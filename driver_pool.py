@@ -0,0 +1,214 @@
+import itertools
+import queue
+import threading
+import time
+import argparse
+
+from selenium.common.exceptions import WebDriverException
+
+from getlist import (log, get_db, get_urls, create_driver, get_count, list_page_url, load_list_page_selenium,
+                     extract_cassettes_selenium, get_detail_info_in_tab, build_shop_data, record_page_links,
+                     insert_or_update_shop, SELENIUM_BATCH)
+
+MAX_PAGE = 60  # tabelog 一览最多 60 页
+
+# 任务优先级：详情页先做，避免队列里堆积过多详情任务
+PRIORITY_DETAIL = 0
+PRIORITY_PAGE = 1
+PRIORITY_COUNT = 2
+
+MAX_ATTEMPTS = 2  # 任务失败（driver 崩溃、页面超时等）时最多重试一次
+
+
+class DriverWorker(threading.Thread):
+    """
+    一个长期存活的 headless Chrome worker。
+    处理 recycle_after 个页面后、或 driver 崩溃时重启 Chrome。
+    """
+
+    def __init__(self, pool, worker_id):
+        super().__init__(name=f"driver-worker-{worker_id}", daemon=True)
+        self.pool = pool
+        self.worker_id = worker_id
+        self.driver = None
+        self.pages = 0
+
+    def _ensure_driver(self):
+        if self.driver is None:
+            self.driver = self.pool.factory()
+            self.pages = 0
+
+    def _quit_driver(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+            self.driver = None
+
+    def recycle(self, reason):
+        log(f"♻️ worker {self.worker_id} 重启 Chrome：{reason}")
+        self._quit_driver()
+
+    def run(self):
+        while True:
+            _, _, task = self.pool.tasks.get()
+            try:
+                if task is None:
+                    break
+                self._ensure_driver()
+                try:
+                    self.pool.handle(self.driver, task)
+                except Exception as e:
+                    # 页面超时（driver_get / wait_for 的 TimeoutError）等任何异常都重试，
+                    # 否则这个一览剩下的页就丢了；driver 本身出问题时顺便重启 Chrome
+                    if isinstance(e, WebDriverException):
+                        self.recycle(f"{type(e).__name__} - {e}")
+                    task["attempts"] = task.get("attempts", 0) + 1
+                    if task["attempts"] < MAX_ATTEMPTS:
+                        log(f"🔁 任务重试：{task['kind']} {task.get('url')}（{type(e).__name__} - {e}）")
+                        self.pool.put(task)
+                    else:
+                        log(f"❌ 任务放弃：{task['kind']} {task.get('url')}（{type(e).__name__} - {e}）")
+                    continue
+
+                self.pages += 1
+                if self.pages >= self.pool.recycle_after:
+                    self.recycle(f"已处理 {self.pages} 个页面")
+            except Exception as e:
+                log(f"❌ worker {self.worker_id} 任务异常：{type(e).__name__} - {e}")
+            finally:
+                self.pool.tasks.task_done()
+
+        self._quit_driver()
+
+
+class DriverPool:
+    """
+    N 个 Chrome worker 共享一个工作队列。
+    任务分三种：count（取件数）、page（一览页的某一页）、detail（店铺详情页）。
+    一览页处理完后把新店铺的 detail 任务和下一页的 page 任务放回队列。
+    """
+
+    def __init__(self, size=4, recycle_after=200, factory=create_driver):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.factory = factory
+        self.tasks = queue.PriorityQueue()
+        self.seq = itertools.count()
+        # 一页的 catlog 插入 + 已收集判断要连在一起做
+        self.db_lock = threading.Lock()
+        self.workers = []
+        self.shops = 0
+
+    def put(self, task, priority=None):
+        if priority is None:
+            priority = {"detail": PRIORITY_DETAIL, "page": PRIORITY_PAGE, "count": PRIORITY_COUNT}[task["kind"]]
+        self.tasks.put((priority, next(self.seq), task))
+
+    def submit(self, url_info):
+        self.put({"kind": "count", "url": url_info["url"], "url_info": url_info})
+
+    def handle(self, driver, task):
+        if task["kind"] == "count":
+            self._handle_count(driver, task)
+        elif task["kind"] == "page":
+            self._handle_page(driver, task)
+        else:
+            self._handle_detail(driver, task)
+
+    def _handle_count(self, driver, task):
+        url_info = task["url_info"]
+        total = get_count(driver, url_info)
+        need, result0, result1, result2 = get_db().is_need_get_shop(url_info["url"])
+
+        if need and total > 0:
+            log(f'⬇️ 开始收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+            self.put({"kind": "page", "url": url_info["url"], "url_info": url_info, "page": 1, "remaining": total,
+                      "newest_first": get_db().is_list_complete(url_info["url"])})
+        else:
+            log(f'⚠️ 跳过收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+
+    def _handle_page(self, driver, task):
+        url_info = task["url_info"]
+        url = url_info["url"]
+        page = task["page"]
+        newest_first = task["newest_first"]
+        exurl = list_page_url(url, page, newest_first)
+
+        log(f"🔍 正在处理第 {page} 页：{exurl}")
+        shops = None
+        if SELENIUM_BATCH:
+            # 打开页面后一次 execute_script 取出全部卡片，新链接直接从里面挑
+            shops = load_list_page_selenium(driver, exurl, batch=True)
+            links = [rst["link"] for rst in shops]
+        else:
+            links = load_list_page_selenium(driver, exurl)
+        log(f"本页共找到 {len(links)} 个店铺")
+
+        with self.db_lock:
+            new_links = set(record_page_links(links, url, url_info["area_code"], url_info["genre"]))
+
+        if newest_first and links and not new_links:
+            log(f"⏹️ 本页店铺全部已收集（新着顺），停止翻页：{url}")
+            get_db().mark_list_complete(url)
+            return
+
+        if new_links:
+            if shops is not None:
+                shops = [rst for rst in shops if rst["link"] in new_links]
+            else:
+                shops = extract_cassettes_selenium(driver, links, new_links)
+            for rst in shops:
+                self.put({"kind": "detail", "url": rst["link"], "list_url": url, "rst": rst,
+                          "area": url_info["area_code"], "genre": url_info["genre"]})
+
+        remaining = task["remaining"] - len(links)
+        if links and remaining > 0 and page < MAX_PAGE:
+            self.put({**task, "page": page + 1, "remaining": remaining, "attempts": 0})
+        else:
+            get_db().mark_list_complete(url)
+
+    def _handle_detail(self, driver, task):
+        detail = get_detail_info_in_tab(driver, task["url"] + "#title-rstdata")
+        shop_data = build_shop_data(task["rst"], detail, task["area"], task["genre"])
+        with self.db_lock:
+            insert_or_update_shop(shop_data, task["list_url"])
+            self.shops += 1
+
+    def start(self):
+        for i in range(self.size):
+            worker = DriverWorker(self, i + 1)
+            worker.start()
+            self.workers.append(worker)
+
+    def join(self):
+        """等待队列做完，然后让所有 worker 退出"""
+        self.tasks.join()
+        for _ in self.workers:
+            self.tasks.put((float("inf"), next(self.seq), None))
+        for worker in self.workers:
+            worker.join()
+
+
+def run(urls, size=4, recycle_after=200):
+    start = time.monotonic()
+    pool = DriverPool(size=size, recycle_after=recycle_after)
+    for url_info in urls:
+        pool.submit(url_info)
+    pool.start()
+    pool.join()
+    log(f"🎉 完成，{size} 个 Chrome worker 共采集 {pool.shops} 家店铺，用时 {time.monotonic() - start:.0f}s")
+    return pool.shops
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="tabelog shops 采集（Selenium driver pool）")
+    parser.add_argument("--workers", type=int, default=4, help="Chrome worker 数")
+    parser.add_argument("--recycle-after", type=int, default=200, help="每个 Chrome 处理多少页面后重启")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(get_urls(), args.workers, args.recycle_after)
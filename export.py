@@ -0,0 +1,267 @@
+import os
+import csv
+import time
+import sqlite3
+import argparse
+
+from db_handler import INDEXES, apply_pragmas
+
+DB_PATH = "tabelog.db"
+EXPORT_DIR = "export"
+CHUNK_SIZE = 50000          # 每次从 SQLite 取的行数，内存占用与它成正比，与表的总行数无关
+TABLES = ("shops", "area", "genre", "shop_list_summary")
+FORMATS = ("parquet", "csv", "xlsx")
+XLSX_MAX_ROWS = 1048575     # Excel 一个 sheet 的行数上限（去掉表头）
+
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
+    apply_pragmas(conn)
+    # 只补建增量导出用的 (update_time, id) 索引；导出不跑 migrate_schema（不装触发器、聚合表、闭包表）
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for table, index, columns in INDEXES:
+        if table in TABLES and table in existing and columns == "update_time, id":
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}({columns})")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS export_state (
+            table_name TEXT,
+            format TEXT,
+            last_update_time TEXT,
+            last_ids TEXT,
+            rows INTEGER,
+            path TEXT,
+            exported_at TEXT,
+            PRIMARY KEY (table_name, format)
+        )
+    """)
+    if "last_ids" not in {row[1] for row in conn.execute("PRAGMA table_info(export_state)")}:
+        conn.execute("ALTER TABLE export_state ADD COLUMN last_ids TEXT")
+    conn.commit()
+    return conn
+
+
+def table_columns(conn, table):
+    """[(列名, 声明类型), ...]"""
+    return [(row[1], (row[2] or "").upper()) for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def last_export(conn, table, fmt):
+    """上次导出的水位：(update_time 的最大值, 这一秒里已经导出的 id 集合)，没有导出过返回 (None, set())"""
+    row = conn.execute("SELECT last_update_time, last_ids FROM export_state WHERE table_name = ? AND format = ?",
+                       (table, fmt)).fetchone()
+    if not row:
+        return None, set()
+    return row[0], {int(i) for i in (row[1] or "").split(",") if i}
+
+
+def iter_chunks(conn, table, since=None, chunk_size=CHUNK_SIZE, seen_ids=()):
+    """
+    按 chunk_size 行一块地读出表。
+    since 指定时只读 update_time >= since 的行，按 (update_time, id) 的 keyset 分页（走 (update_time, id) 索引，
+    不用临时 B-tree 排序整个增量）。update_time 只精确到秒，所以 since 这一秒要重读，
+    其中 seen_ids（上次已导出的 id）跳过。
+    """
+    if since is None:
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+        return
+
+    cursor = conn.execute(f"SELECT * FROM {table} LIMIT 0")
+    names = [d[0] for d in cursor.description]
+    update_index, id_index = names.index("update_time"), names.index("id")
+    key = (since, -1)
+    while True:
+        rows = conn.execute(f"""
+            SELECT * FROM {table}
+            WHERE (update_time, id) > (?, ?)
+            ORDER BY update_time, id
+            LIMIT ?
+        """, (*key, chunk_size)).fetchall()
+        if not rows:
+            break
+        key = (rows[-1][update_index], rows[-1][id_index])
+        rows = [row for row in rows if row[update_index] != since or row[id_index] not in seen_ids]
+        if rows:
+            yield rows
+
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        # utf-8-sig：Excel 直接打开不乱码
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """按 SQLite 声明类型建 Arrow schema，每块写一个 row group（需要 pyarrow）"""
+
+    def __init__(self, path, columns, compression="zstd"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        fields, self.casts = [], []
+        for name, col_type in columns:
+            if "INT" in col_type:
+                fields.append(pa.field(name, pa.int64()))
+                self.casts.append(_to_int)
+            elif "REAL" in col_type or "FLOA" in col_type or "DOUB" in col_type:
+                fields.append(pa.field(name, pa.float64()))
+                self.casts.append(_to_float)
+            else:
+                fields.append(pa.field(name, pa.string()))
+                self.casts.append(_to_str)
+        self.schema = pa.schema(fields)
+        self.writer = pq.ParquetWriter(path, self.schema, compression=compression)
+
+    def write(self, rows):
+        arrays = [
+            self.pa.array([cast(row[i]) for row in rows], type=field.type)
+            for i, (field, cast) in enumerate(zip(self.schema, self.casts))
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class XlsxWriter:
+    """openpyxl 的 write_only 模式逐行写出，超过 Excel 行数上限时换新 sheet（需要 openpyxl）"""
+
+    def __init__(self, path, columns, title="data"):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.title = title
+        self.header = [name for name, _ in columns]
+        self.workbook = Workbook(write_only=True)
+        self.sheet = None
+        self.sheet_rows = 0
+        self.sheets = 0
+
+    def _new_sheet(self):
+        self.sheets += 1
+        title = self.title if self.sheets == 1 else f"{self.title}_{self.sheets}"
+        self.sheet = self.workbook.create_sheet(title[:31])
+        self.sheet.append(self.header)
+        self.sheet_rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            if self.sheet is None or self.sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.append(list(row))
+            self.sheet_rows += 1
+
+    def close(self):
+        if self.sheet is None:
+            self._new_sheet()
+        self.workbook.save(self.path)
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter, "xlsx": XlsxWriter}
+
+
+def _to_int(value):
+    try:
+        return None if value is None or value == "" else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return None if value is None or value == "" else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_str(value):
+    return None if value is None else str(value)
+
+
+def export_table(conn, table, fmt, out_dir=EXPORT_DIR, incremental=False, chunk_size=CHUNK_SIZE):
+    """
+    把一张表流式导出成一个文件，返回 (路径, 行数)。
+    incremental=True 时只导出上次（同表同格式）导出之后 update_time 变化过的行，文件名带时间戳。
+    水位记成 (最大 update_time, 这一秒里导出过的 id)：同一秒内稍后写入的行下次仍会导出。
+    """
+    columns = table_columns(conn, table)
+    if not columns:
+        print(f"⚠️ 表不存在：{table}")
+        return None, 0
+
+    since, seen_ids = last_export(conn, table, fmt) if incremental else (None, set())
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    name = f"{table}_{stamp}" if since is not None else table
+    path = os.path.join(out_dir, f"{name}.{fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    start = time.monotonic()
+    names = [column for column, _ in columns]
+    update_index = names.index("update_time") if "update_time" in names else None
+    id_index = names.index("id") if "id" in names else None
+    latest, latest_ids = since, set(seen_ids)
+    count = 0
+    writer = XlsxWriter(path, columns, title=table) if fmt == "xlsx" else WRITERS[fmt](path, columns)
+    try:
+        for rows in iter_chunks(conn, table, since, chunk_size, seen_ids):
+            writer.write(rows)
+            count += len(rows)
+            if update_index is not None:
+                for row in rows:
+                    value = row[update_index]
+                    if not value or (latest is not None and value < latest):
+                        continue
+                    if value != latest:
+                        latest, latest_ids = value, set()
+                    if id_index is not None:
+                        latest_ids.add(row[id_index])
+            print(f"📤 {table}: 已导出 {count} 行")
+    finally:
+        writer.close()
+
+    if since is not None and count == 0:
+        os.remove(path)
+        print(f"⏭️ {table}: {since} 之后没有更新")
+        return None, 0
+
+    conn.execute("""
+        INSERT INTO export_state (table_name, format, last_update_time, last_ids, rows, path, exported_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(table_name, format) DO UPDATE SET
+            last_update_time = excluded.last_update_time, last_ids = excluded.last_ids, rows = excluded.rows,
+            path = excluded.path, exported_at = excluded.exported_at
+    """, (table, fmt, latest, ",".join(map(str, sorted(latest_ids))), count, path,
+          time.strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+    print(f"✅ {table} → {path}：{count} 行，用时 {time.monotonic() - start:.1f}s")
+    return path, count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 tabelog.db 流式导出成 Parquet / CSV / XLSX")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=list(TABLES))
+    parser.add_argument("--out", default=EXPORT_DIR, help="输出目录")
+    parser.add_argument("--incremental", action="store_true",
+                        help="只导出上次导出之后 update_time 变化过的行（第一次仍是全量）")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    for table in args.tables:
+        export_table(conn, table, args.format, args.out, args.incremental, args.chunk_size)
+    conn.close()
@@ -0,0 +1,180 @@
+import os
+import logging
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from rate_limiter import RETRY_STATUS, RetryableError, get_controller, parse_retry_after
+from proxy_pool import requests_proxies
+from metrics import get_metrics
+
+logger = logging.getLogger("tabelog.fetcher")
+
+# 采集的站点；压测时用环境变量 TABELOG_BASE_URL（或 getlist.py --base-url）指向 mock_tabelog.py
+BASE_URL = os.environ.get("TABELOG_BASE_URL", "https://tabelog.com").rstrip("/")
+PROXY_RETRIES = 3   # 一次请求最多换几个代理；都失败就放弃这次请求（不经过 RateController 的重试）
+
+
+def set_base_url(url):
+    global BASE_URL
+    BASE_URL = url.rstrip("/")
+
+
+def site_url(path):
+    """站点内路径 → 完整 URL，如 site_url("/cat_lst/")"""
+    return BASE_URL + path
+
+
+def rebase(url):
+    """把 URL 的 scheme / host 换成 BASE_URL（数据库里存的 href 是采集时的站点）"""
+    parts = urlsplit(url)
+    base = urlsplit(BASE_URL)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, parts.fragment))
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "ja,en-US;q=0.7,en;q=0.3",
+}
+
+
+class HttpFetcher:
+    """
+    不经过浏览器，直接用 HTTP 下载页面 HTML。
+    复用一个 requests.Session（keep-alive），请求经过 RateController 限速/重试，失败时返回 None。
+    proxy_pool 指定时经代理请求，代理失败只记在代理池上、换代理重试，不影响目标站点的限速。
+    cache（http_cache.ResponseCache）指定时先查缓存，过期的做条件请求；
+    offline=True 时只从缓存读（离线回放），缓存里没有就返回 None。
+    """
+
+    def __init__(self, timeout=10, headers=None, session=None, rate=None, proxy_pool=None, cache=None, offline=False):
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        self.rate = rate or get_controller()
+        self.proxy_pool = proxy_pool
+        self.cache = cache
+        self.offline = offline
+
+    def _get(self, url, headers=None):
+        for _ in range(PROXY_RETRIES):
+            proxy = self.proxy_pool.acquire() if self.proxy_pool is not None else None
+            if not proxy:
+                break
+            start = time.monotonic()
+            try:
+                r = self.session.get(url, timeout=self.timeout, headers=headers, proxies=requests_proxies(proxy))
+            except requests.RequestException as e:
+                # 代理连不上 / 太慢：只记在代理池上，换一个代理重试，不算目标站点的超时（不降它的速率）
+                self.proxy_pool.report(proxy, False)
+                logger.info("🔁 代理失败，换一个重试：%s %s", proxy, type(e).__name__)
+                error = e
+                continue
+            self.proxy_pool.report(proxy, r.status_code < 500, time.monotonic() - start)
+            return self._check(r)
+        else:
+            raise error
+
+        try:
+            r = self.session.get(url, timeout=self.timeout, headers=headers)
+        except requests.Timeout as e:
+            raise TimeoutError(str(e))
+        return self._check(r)
+
+    @staticmethod
+    def _check(r):
+        if r.status_code in RETRY_STATUS:
+            raise RetryableError(f"HTTP {r.status_code}", r.status_code, parse_retry_after(r.headers.get("Retry-After")))
+        return r
+
+    def fetch(self, url):
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            return entry.body
+        if self.offline:
+            logger.warning("⚠️ 离线模式，缓存里没有：%s", url)
+            return None
+
+        headers = self.cache.conditional_headers(entry) if entry is not None else None
+        try:
+            r = self.rate.call(url, lambda: self._get(url, headers))
+        except (RetryableError, TimeoutError, requests.RequestException) as e:
+            get_metrics().inc("tabelog_errors_total", type=type(e).__name__)
+            if entry is not None:
+                # 条件请求失败：过期的缓存总比回退到 Selenium / 跳过这一页好
+                logger.warning("⚠️ 重新验证失败，使用过期缓存：%s %s - %s", url, type(e).__name__, e)
+                return entry.body
+            logger.error("❌ HTTP 获取失败：%s %s - %s", url, type(e).__name__, e)
+            return None
+
+        if r.status_code == 304 and entry is not None:
+            self.cache.refresh(url)
+            return entry.body
+
+        if r.status_code != 200:
+            logger.warning("⚠️ HTTP %s：%s", r.status_code, url)
+            get_metrics().inc("tabelog_errors_total", type=f"HTTP {r.status_code}")
+            return None
+
+        # tabelog 是 UTF-8，但 header 不一定带 charset
+        if not r.encoding or r.encoding.lower() == "iso-8859-1":
+            r.encoding = "utf-8"
+        if self.cache is not None:
+            self.cache.put(url, r.text, r.headers.get("ETag"), r.headers.get("Last-Modified"))
+        return r.text
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()   # 把命中的访问时间写库
+
+
+def driver_get(driver, url, rate=None):
+    """经过 RateController 用 Selenium 打开页面，页面加载超时按退避重试"""
+    def do_get():
+        try:
+            driver.get(url)
+        except TimeoutException as e:
+            raise TimeoutError(str(e))
+    (rate or get_controller()).call(url, do_get)
+
+
+def wait_for(driver, css_selector, timeout=10):
+    """等待元素出现（代替固定 sleep），超时返回 False 不报错"""
+    try:
+        WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, css_selector)))
+        return True
+    except TimeoutException:
+        return False
+
+
+class LazyDriver:
+    """
+    只在真正需要 JS 渲染时才启动 Chrome。
+    第一次访问任何 webdriver 属性时才调用 factory() 创建 driver。
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._driver = None
+
+    @property
+    def started(self):
+        return self._driver is not None
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            logger.info("🌐 页面需要 JS，启动 Chrome ...")
+            self._driver = self._factory()
+        return getattr(self._driver, name)
+
+    def quit(self):
+        if self._driver is not None:
+            self._driver.quit()
+            self._driver = None
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+import argparse
+
+from db_handler import apply_pragmas
+
+logger = logging.getLogger("tabelog.frontier")
+
+DB_PATH = "tabelog.db"
+LEASE_SECONDS = 600   # 租约有效期；每翻完一页续租一次
+MAX_ATTEMPTS = 3      # 一个一览失败超过这个次数标记为 failed
+
+
+class Frontier:
+    """
+    持久化在 tabelog.db 里的采集队列（crawl_frontier 表）。
+
+    kind='list'   : 一个 area×genre 一览，page/remaining 是断点（下一页、剩余件数）
+    kind='detail' : 某个一览里发现的新店铺详情页（还没写进 shops 的在途任务）
+
+    多个进程可以同时用：每个进程用 lease() 租一个一览，租约过期（进程死掉）后别的进程可以接手，
+    从记录的页码和在途详情继续。
+    """
+
+    def __init__(self, db_path=DB_PATH, owner=None, lease_seconds=LEASE_SECONDS):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        # isolation_level=None：自己用 BEGIN IMMEDIATE 控制事务，保证租约原子性
+        self.conn = sqlite3.connect(db_path, isolation_level=None, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        apply_pragmas(self.conn)
+        self._create_table()
+
+    def _create_table(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                parent_id INTEGER,
+                parent_area_code TEXT,
+                area TEXT,
+                genre TEXT,
+                page INTEGER DEFAULT 1,
+                remaining INTEGER,
+                payload TEXT,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                last_error TEXT,
+                lease_owner TEXT,
+                lease_until REAL,
+                create_time TEXT DEFAULT CURRENT_TIMESTAMP,
+                update_time TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(kind, url)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_crawl_frontier_status ON crawl_frontier(kind, status, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_crawl_frontier_parent ON crawl_frontier(parent_id, status)")
+
+    def seed(self, urls):
+        """把 get_urls() 的结果放进队列，已存在的不动（保留断点）"""
+        before = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany("""
+            INSERT INTO crawl_frontier (kind, url, parent_area_code, area, genre)
+            VALUES ('list', ?, ?, ?, ?)
+            ON CONFLICT(kind, url) DO NOTHING
+        """, [(u["url"], u["parent_area_code"], u["area_code"], u["genre"]) for u in urls])
+        self.conn.execute("COMMIT")
+        return self.conn.total_changes - before
+
+    def reset(self):
+        """清空全部断点，从头开始"""
+        self.conn.execute("DELETE FROM crawl_frontier")
+
+    def lease(self):
+        """租一个待处理（或租约已过期）的一览，没有则返回 None"""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("""
+                SELECT * FROM crawl_frontier
+                WHERE kind = 'list'
+                AND (status = 'pending' OR (status = 'leased' AND lease_until < ?))
+                ORDER BY id
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute("""
+                UPDATE crawl_frontier
+                SET status = 'leased', lease_owner = ?, lease_until = ?, update_time = DATETIME('now', 'localtime')
+                WHERE id = ?
+            """, (self.owner, now + self.lease_seconds, row["id"]))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if row["status"] == "leased":
+            logger.info("♻️ 接手过期租约：%s（原 owner %s，第 %s 页）", row["url"], row["lease_owner"], row["page"])
+        return FrontierLease(self, row)
+
+    def stats(self):
+        rows = self.conn.execute("SELECT kind, status, COUNT(*) FROM crawl_frontier GROUP BY kind, status").fetchall()
+        return {(kind, status): n for kind, status, n in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+class FrontierLease:
+    """一个被本进程租下的一览，get_list 通过它记录断点"""
+
+    def __init__(self, frontier, row):
+        self.frontier = frontier
+        self.conn = frontier.conn
+        self.id = row["id"]
+        self.url = row["url"]
+        self.page = row["page"]
+        self.remaining = row["remaining"]
+        self.attempts = row["attempts"]
+        self.url_info = {
+            "url": row["url"],
+            "parent_area_code": row["parent_area_code"],
+            "area_code": row["area"],
+            "genre": row["genre"],
+        }
+
+    @property
+    def started(self):
+        """remaining 有值说明已经取过件数、开始翻页了"""
+        return self.remaining is not None
+
+    def add_details(self, shops):
+        """记录本页要采集的新店铺（在途任务），崩溃后可以从这里恢复"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany("""
+            INSERT INTO crawl_frontier (kind, url, parent_id, payload)
+            VALUES ('detail', ?, ?, ?)
+            ON CONFLICT(kind, url) DO UPDATE SET
+                parent_id = excluded.parent_id, payload = excluded.payload, status = 'pending'
+            WHERE crawl_frontier.status != 'done'
+        """, [(rst["link"], self.id, json.dumps(rst, ensure_ascii=False)) for rst in shops])
+        self.conn.execute("COMMIT")
+
+    def pending_details(self):
+        """上次中断时还没完成的详情任务"""
+        rows = self.conn.execute("""
+            SELECT payload FROM crawl_frontier
+            WHERE kind = 'detail' AND parent_id = ? AND status = 'pending'
+            ORDER BY id
+        """, (self.id,)).fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    def checkpoint(self, page, remaining, done_links=(), failed_links=()):
+        """
+        记录断点并续租（租约已被别的进程接手时不生效）。调用前必须先把 shops 的写入 commit（TabelogDB.flush），
+        否则崩溃时会出现断点已前进、店铺却没落盘的情况。
+        done_links 是已落盘的详情；failed_links 是这次失败的详情，attempts 加一，
+        不到 MAX_ATTEMPTS 次的留在 pending 等 pending_details() 重试。
+        """
+        self.page = page
+        self.remaining = remaining
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany("""
+            UPDATE crawl_frontier SET status = 'done', update_time = DATETIME('now', 'localtime')
+            WHERE kind = 'detail' AND url = ?
+        """, [(link,) for link in done_links])
+        self.conn.executemany("""
+            UPDATE crawl_frontier
+            SET attempts = attempts + 1, status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END,
+                update_time = DATETIME('now', 'localtime')
+            WHERE kind = 'detail' AND url = ? AND status != 'done'
+        """, [(MAX_ATTEMPTS, link) for link in failed_links])
+        self.conn.execute("""
+            UPDATE crawl_frontier
+            SET page = ?, remaining = ?, lease_until = ?, update_time = DATETIME('now', 'localtime')
+            WHERE id = ? AND lease_owner = ?
+        """, (page, remaining, time.time() + self.frontier.lease_seconds, self.id, self.frontier.owner))
+        self.conn.execute("COMMIT")
+
+    def done(self):
+        """
+        一览完成：已落盘的详情任务删掉（否则 crawl_frontier 只增不减），
+        还没成功的详情不会再有人重试，标记为 failed 留着排查。
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        cursor = self.conn.execute("""
+            UPDATE crawl_frontier
+            SET status = 'done', lease_owner = NULL, lease_until = NULL, update_time = DATETIME('now', 'localtime')
+            WHERE id = ? AND lease_owner = ?
+        """, (self.id, self.frontier.owner))
+        if cursor.rowcount:
+            self.conn.execute("DELETE FROM crawl_frontier WHERE kind = 'detail' AND parent_id = ? AND status = 'done'",
+                              (self.id,))
+            self.conn.execute("""
+                UPDATE crawl_frontier SET status = 'failed', update_time = DATETIME('now', 'localtime')
+                WHERE kind = 'detail' AND parent_id = ? AND status = 'pending'
+            """, (self.id,))
+        self.conn.execute("COMMIT")
+
+    def fail(self, error):
+        """失败：放回队列等重试，超过 MAX_ATTEMPTS 次标记为 failed"""
+        self.attempts += 1
+        status = "failed" if self.attempts >= MAX_ATTEMPTS else "pending"
+        self.conn.execute("""
+            UPDATE crawl_frontier
+            SET status = ?, attempts = ?, last_error = ?, lease_owner = NULL, lease_until = NULL,
+                update_time = DATETIME('now', 'localtime')
+            WHERE id = ? AND lease_owner = ?
+        """, (status, self.attempts, str(error)[:1000], self.id, self.frontier.owner))
+
+
+if __name__ == "__main__":
+    # 查看队列状态
+    parser = argparse.ArgumentParser(description="查看 / 重置采集队列")
+    parser.add_argument("--reset", action="store_true", help="清空全部断点")
+    args = parser.parse_args()
+
+    frontier = Frontier()
+    if args.reset:
+        frontier.reset()
+        print("🗑️ 已清空采集队列")
+    for (kind, status), n in sorted(frontier.stats().items()):
+        print(f"{kind:>6} {status:>8}: {n}")
+    frontier.close()
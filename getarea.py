@@ -1,10 +1,16 @@
 import os
+import logging
 import time
 import sqlite3
+from db_handler import apply_pragmas, migrate_schema
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
+from fetcher import HttpFetcher, driver_get, site_url
+from http_cache import ResponseCache
+import tabelog_parser
+import hierarchy
 
 
 DB_PATH = "tabelog.db"
@@ -34,9 +40,32 @@ def extract_area_code(href: str):
         return codes[-1], codes[-2]
     
 
-def get_areas(driver):
-    url = "https://tabelog.com/matome/area_lst/"
-    driver.get(url)
+AREA_LIST_PATH = "/matome/area_lst/"
+
+
+def get_areas_http(fetcher, url=None):
+    """不开浏览器，用 HTTP（经过缓存）取地区一览；解析不到时返回空 list"""
+    url = url or site_url(AREA_LIST_PATH)
+    html = fetcher.fetch(url)
+    area_list = []
+    seen_hrefs = set()  # 与 get_areas 相同的去重规则（Level 1 的 href 为 ""）
+
+    for level, name, href in tabelog_parser.parse_area_page(html, url):
+        if href in seen_hrefs:
+            continue
+        if level == 1:
+            area_list.append((name, name, 1, None, ""))
+        else:
+            code, parent_code = extract_area_code(href)
+            area_list.append((name, code, level, parent_code, href))
+        seen_hrefs.add(href)
+
+    return area_list
+
+
+def get_areas(driver, url=None):
+    url = url or site_url(AREA_LIST_PATH)
+    driver_get(driver, url)
     driver.implicitly_wait(3)
 
     area_list = []
@@ -101,6 +130,7 @@ def save_areas_to_db(areas):
     first_create = not os.path.exists(DB_PATH)
 
     conn = sqlite3.connect(DB_PATH)
+    apply_pragmas(conn)
     cur = conn.cursor()
 
     # 表结构
@@ -119,27 +149,38 @@ def save_areas_to_db(areas):
         is_deleted INTEGER DEFAULT 0
     );""")
 
-    for name, code, level, parent_code, href in areas:
-        cur.execute("SELECT id FROM area WHERE code = ?", (code,))
-        row = cur.fetchone()
-        if row:
-            cur.execute("""
-                UPDATE area
-                SET name = ?, level = ?, parent_code = ?, href = ?, update_time = ?, is_deleted = 0
-                WHERE code = ?
-            """, (name, level, parent_code, href, now, code))
-        else:
-            cur.execute("""
-                INSERT INTO area (name, code, level, parent_code, href, create_time, update_time, update_user, is_deleted)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 'system', 0)
-            """, (name, code, level, parent_code, href, now, now))
+    # code 已存在则更新（保留 create_time），否则插入；整批一条 executemany
+    cur.executemany("""
+        INSERT INTO area (name, code, level, parent_code, href, create_time, update_time, update_user, is_deleted)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 'system', 0)
+        ON CONFLICT(code) DO UPDATE SET
+            name = excluded.name, level = excluded.level, parent_code = excluded.parent_code,
+            href = excluded.href, update_time = excluded.update_time, is_deleted = 0
+    """, [(name, code, level, parent_code, href, now, now) for name, code, level, parent_code, href in areas])
 
     conn.commit()
+    migrate_schema(conn)
+    closure_rows = hierarchy.rebuild_closure(conn, "area")
     conn.close()
+    print(f"🌳 area_closure 重建：{closure_rows} 行")
     print(f"✅ 共保存 {len(areas)} 个地区（首次创建数据库: {first_create}）")
 
 
 def main():
+    fetcher = HttpFetcher(cache=ResponseCache())
+    try:
+        print("🌐 正在提取地区信息（HTTP）...")
+        areas = get_areas_http(fetcher)
+    finally:
+        fetcher.close()
+
+    if areas:
+        for item in areas:
+            print(f"名称: {item[0]} | Code: {item[1]} | Level: {item[2]} | Parent: {item[3]} | Href: {item[4]}")
+        save_areas_to_db(areas)
+        return
+
+    print("⚠️ HTTP 解析不到地区一览，改用 Selenium")
     options = webdriver.ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("start-maximized")
@@ -158,4 +199,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # fetcher / rate_limiter / http_cache 的日志（tabelog.*）输出到终端
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     main()
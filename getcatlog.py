@@ -1,11 +1,17 @@
 import os
+import logging
 import time
 import sqlite3
+from db_handler import apply_pragmas, migrate_schema
 from urllib.parse import urlparse
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
+from fetcher import HttpFetcher, driver_get, site_url, wait_for
+from http_cache import ResponseCache
+import tabelog_parser
+import hierarchy
 
 
 DB_PATH = "tabelog.db"
@@ -23,11 +29,29 @@ def extract_code_and_level(href: str):
         return code, level
     return "", 0
 
+GENRE_LIST_PATH = "/cat_lst/"
+
+
+# 不开浏览器，用 HTTP（经过缓存）取ジャンル一览；解析不到时返回空 list
+def get_genres_http(fetcher, url=None):
+    url = url or site_url(GENRE_LIST_PATH)
+    html = fetcher.fetch(url)
+    genre_list = []
+    parents = {}  # level → 该层最近一个 code，作为下一层的 parent_code
+
+    for level, name, href in tabelog_parser.parse_genre_page(html, url):
+        code, _ = extract_code_and_level(href)
+        genre_list.append((name, code, level, parents.get(level - 1)))
+        parents[level] = code
+
+    return genre_list
+
+
 # 提取ジャンル信息
-def get_genres(driver):
-    url = "https://tabelog.com/cat_lst/"
-    driver.get(url)
-    time.sleep(2)
+def get_genres(driver, url=None):
+    url = url or site_url(GENRE_LIST_PATH)
+    driver_get(driver, url)
+    wait_for(driver, "div.rst-janrelst__frame")
 
     genre_list = []
 
@@ -74,6 +98,7 @@ def get_genres(driver):
 def save_genres_to_db(genres):
     first_create = not os.path.exists(DB_PATH)
     conn = sqlite3.connect(DB_PATH)
+    apply_pragmas(conn)
     cursor = conn.cursor()
 
     cursor.execute("""
@@ -92,29 +117,35 @@ def save_genres_to_db(genres):
 
     now = time.strftime('%Y-%m-%d %H:%M:%S')
 
-    for name, code, level, parent_code in genres:
-        cursor.execute("SELECT id, is_deleted FROM genre WHERE code = ?", (code,))
-        result = cursor.fetchone()
-
-        if result:
-            genre_id, is_deleted = result
-            cursor.execute("""
-                UPDATE genre
-                SET name = ?, level = ?, parent_code = ?, update_time = ?, update_user = ?, is_deleted = 0
-                WHERE id = ?
-            """, (name, level, parent_code, now, "system", genre_id))
-        else:
-            cursor.execute("""
-                INSERT INTO genre (name, code, level, parent_code, create_time, update_time, update_user, is_deleted)
-                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-            """, (name, code, level, parent_code, now, now, "system"))
+    # code 已存在则更新（保留 create_time），否则插入；整批一条 executemany
+    cursor.executemany("""
+        INSERT INTO genre (name, code, level, parent_code, create_time, update_time, update_user, is_deleted)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+        ON CONFLICT(code) DO UPDATE SET
+            name = excluded.name, level = excluded.level, parent_code = excluded.parent_code,
+            update_time = excluded.update_time, update_user = excluded.update_user, is_deleted = 0
+    """, [(name, code, level, parent_code, now, now, "system") for name, code, level, parent_code in genres])
 
     conn.commit()
+    migrate_schema(conn)
+    closure_rows = hierarchy.rebuild_closure(conn, "genre")
     conn.close()
+    print(f"🌳 genre_closure 重建：{closure_rows} 行")
     print(f"✅ 共保存 {len(genres)} 个ジャンル（首次创建数据库: {first_create}）")
 
 # 主程序
 def run():
+    fetcher = HttpFetcher(cache=ResponseCache())
+    try:
+        genres = get_genres_http(fetcher)
+    finally:
+        fetcher.close()
+
+    if genres:
+        save_genres_to_db(genres)
+        return
+
+    print("⚠️ HTTP 解析不到ジャンル一览，改用 Selenium")
     options = webdriver.ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
     options.add_argument("start-maximized")
@@ -129,4 +160,6 @@ def run():
         driver.quit()
 
 if __name__ == "__main__":
+    # fetcher / rate_limiter / http_cache 的日志（tabelog.*）输出到终端
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     run()
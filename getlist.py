@@ -1,27 +1,101 @@
 #rst-data-head > table:nth-child(2) > tbody > tr:nth-child(3) > td > p > strong
 
 import time
-import random
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 import os
 import logging
 import logging.handlers
 import platform
+import sys
+import json
+import queue
+import sqlite3
 from db_handler import TabelogDB
 import traceback
+import argparse
+import atexit
+import threading
+import tabelog_parser
+from fetcher import HttpFetcher, LazyDriver, driver_get, rebase, set_base_url, wait_for
+from rate_limiter import get_controller
+from metrics import get_metrics
 
 logger = None
 
-def init_logger(app_name="tabelog", log_dir="./logs"):
-    global logger
+# 采集热路径共用一个 session 模式的 TabelogDB：满 DB_BATCH_SIZE 行或 DB_FLUSH_INTERVAL 秒 commit 一次
+DB_BATCH_SIZE = 200
+DB_FLUSH_INTERVAL = 5
+# 已收集店铺的内存索引："set" 精确；内存紧张时可改成 "bloom"（命中时回查数据库）
+DB_URL_INDEX = "set"
+# --refresh 时，update_time 超过这么多天的店铺即使评分 / 口コミ数没变也重新取详情
+REFRESH_MAX_AGE_DAYS = 30
+# Selenium 时一页只用一次 execute_script 取出全部卡片 / 详情表格（不逐个元素 find + 滚动等待）
+SELENIUM_BATCH = True
+_db = None
+_db_lock = threading.Lock()
+
+def get_db():
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = TabelogDB(batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL, url_index=DB_URL_INDEX)
+            atexit.register(_db.close)
+        return _db
+
+# 日志级别：每家店铺的「已保存 / 链接」是 DEBUG，默认 INFO 时不输出
+LOG_LEVEL = "INFO"
+# 「跳过已收集」这类重复行每个 key 只输出第 1 条和之后每 LOG_SAMPLE_EVERY 条
+LOG_SAMPLE_EVERY = 100
+_log_listener = None
+
+class JsonFormatter(logging.Formatter):
+    """一行一个 JSON：time / level / logger / thread / msg，加上 log(..., **fields) 传入的字段"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class LogSampler:
+    """按 key 抽样：第 1 条放行，之后每 every 条放行 1 条，并带上中间省略的条数"""
+
+    def __init__(self, every=LOG_SAMPLE_EVERY):
+        self.every = every
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def allow(self, key):
+        """返回 (是否输出, 上次输出以来省略的条数)"""
+        with self.lock:
+            n = self.counts.get(key, 0)
+            self.counts[key] = n + 1
+        if n % self.every == 0:
+            return True, (self.every - 1 if n else 0)
+        return False, 0
+
+_sampler = LogSampler()
+
+def init_logger(app_name="tabelog", log_dir="./logs", level=None, json_format=True):
+    """
+    采集线程只把 LogRecord 放进无界队列（QueueHandler），
+    终端输出和 syslog / 文件都由 QueueListener 的后台线程完成，写日志不会阻塞取页面和写库。
+    """
+    global logger, _log_listener
     if logger is not None:
         return logger
 
     logger = logging.getLogger(app_name)
-    logger.setLevel(logging.INFO)
-
-    formatter = logging.Formatter('%(asctime)s %(message)s')
+    logger.setLevel(level or LOG_LEVEL)
+    logger.propagate = False
 
     system = platform.system()
     if system in ("Linux", "Darwin"):
@@ -40,15 +114,41 @@ def init_logger(app_name="tabelog", log_dir="./logs"):
             encoding='utf-8',
             utc=False              # 使用本地时间
         )
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter('%(asctime)s %(message)s'))
+
+    console = logging.StreamHandler(sys.stdout)  # 输出到终端
+    console.setFormatter(logging.Formatter('%(message)s'))
 
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    _log_listener = logging.handlers.QueueListener(log_queue, console, handler, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logger)
     return logger
 
+def stop_logger():
+    """把队列里剩下的日志写完（atexit 时调用）"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
 # ✅ 主 log 函数，替代 print()
-def log(message):
-    print(message)  # 输出到终端
-    init_logger().info(message)  # 保存到日志
+def log(message, level=logging.INFO, sample=None, **fields):
+    """
+    message 入队后立即返回；fields 作为结构化字段写进 JSON 日志。
+    sample 指定时按这个 key 抽样（见 LogSampler），省略的条数记在 suppressed 字段里。
+    """
+    if not init_logger().isEnabledFor(level):
+        return
+    if sample is not None:
+        allowed, suppressed = _sampler.allow(sample)
+        if not allowed:
+            return
+        if suppressed:
+            message = f"{message}（省略同类日志 {suppressed} 条）"
+            fields["suppressed"] = suppressed
+    logger.log(level, message, extra={"fields": fields})
 
 def parse_japanese_address(driver, css_selector: str = "p.rstinfo-table__address"):
     try:
@@ -122,7 +222,7 @@ def extract_shop_detail_table(driver):
                         data["category"] = value
                     elif th == "予算（口コミ集計）":
                         ems = td.find_elements(By.TAG_NAME, "em")
-                        values = [em.text.strip() for em in ems if em.text.strip()]
+                        values = [em.text.strip() or "-" for em in ems]  # 空的一段保留为 "-"，夜 / 昼 的位置不错开
                         data["budget"] = " ".join(values)
                     elif "支払い方法" in th:
                         data["payment"] = value
@@ -138,69 +238,139 @@ def extract_shop_detail_table(driver):
 
     return data
 
-def get_detail_info(driver, url):
+# 详情页的地址、电话、『店舗情報（詳細）』表格各行，一次取完；没有详情区域时返回 null
+JS_SHOP_DETAIL = """
+var head = document.querySelector('#rst-data-head');
+if (!head) return null;
+function text(e) { return e ? e.innerText.trim() : ''; }
+var addr = document.querySelector('p.rstinfo-table__address');
+var rows = [];
+head.querySelectorAll('table.rstinfo-table__table tr').forEach(function (tr) {
+    var th = tr.querySelector('th'), td = tr.querySelector('td');
+    if (!th || !td) return;
+    var notice = td.querySelector('p.rstinfo-table__notice');
+    rows.push({
+        th: text(th),
+        td: text(td),
+        notice: notice ? text(notice) : null,
+        ems: Array.from(td.querySelectorAll('em')).map(text)
+    });
+});
+return {
+    address: addr ? {full: text(addr), tags: Array.from(addr.querySelectorAll('a')).slice(0, 3).map(text)} : null,
+    tel: text(document.querySelector('strong.rstinfo-table__tel-num')),
+    rows: rows
+};
+"""
+
+def extract_shop_detail(driver):
+    """已打开的详情页 → 地址 / 电话 / 表格；SELENIUM_BATCH 时一次 execute_script，否则逐个元素取"""
+    if SELENIUM_BATCH:
+        detail = tabelog_parser.detail_from_script(driver.execute_script(JS_SHOP_DETAIL))
+        if detail is not None:
+            return detail
+
+    # 地址
+    addr = parse_japanese_address(driver)
+
+    # 电话
+    tel = ''
+    elems = driver.find_elements(By.CSS_SELECTOR, "strong.rstinfo-table__tel-num")
+    if elems:
+        tel = elems[0].text.strip()
+
+    data = extract_shop_detail_table(driver)
+    return {**addr, "tel": tel, **data}
+
+def get_detail_info_http(fetcher, url):
+    """用 HTTP + lxml 获取店铺详情，页面结构不对（需要 JS）时返回 None"""
+    metrics = get_metrics()
+    with metrics.timer("detail_fetch"):
+        html = fetcher.fetch(url)
+    with metrics.timer("detail_parse"):
+        return tabelog_parser.parse_detail_page(html)
+
+def get_detail_info(driver, url, fetcher=None):
     """打开新标签页访问店铺详情页，提取地址和电话，返回后关闭标签页"""
+    if fetcher is not None:
+        detail = get_detail_info_http(fetcher, url)
+        if detail is not None:
+            return detail
+        log(f"↩️ HTTP 解析失败，回退到 Selenium：{url}")
+
+    # Selenium 的打开和提取混在一起，整体算一个阶段
+    with get_metrics().timer("detail_selenium"):
+        return get_detail_info_selenium(driver, url)
+
+# 取不到详情时的空值（与 tabelog_parser.parse_detail_page 的键相同）
+EMPTY_DETAIL = dict.fromkeys(("prefecture", "city", "town", "detail", "full", "tel",
+                              "category", "budget", "payment", "seats", "open_date"), "")
+
+def get_detail_info_selenium(driver, url):
+    """用 Selenium 在新标签页打开详情页提取（get_detail_info 的回退路径）"""
     main_window = driver.current_window_handle
 
     try:
-        # 打开新标签页
+        # 打开新标签页（window.open 不经过 driver.get，这里单独向限速器申请）
+        get_controller().wait(url)
         driver.execute_script("window.open(arguments[0]);", url)
-        time.sleep(2)
 
-        # 切换到新标签页
+        # 切换到新标签页，等详细信息区域出现
         driver.switch_to.window(driver.window_handles[-1])
-        time.sleep(3)  # 等页面加载
+        wait_for(driver, "#rst-data-head")
 
         try:
-            # 地址
-            addr = parse_japanese_address(driver)
-            
-            # 电话
-            tel = ''
-            elems = driver.find_elements(By.CSS_SELECTOR, "strong.rstinfo-table__tel-num")
-            if elems:
-                tel = elems[0].text.strip()
-
-            #tel = driver.find_element(By.CSS_SELECTOR, "strong.rstinfo-table__tel-num").text.strip()
-            
-            data = extract_shop_detail_table(driver)
- 
+            detail = extract_shop_detail(driver)
         except:
             log("⚠️ 没有找到『店舗情報（詳細）』标签，可能页面结构不同")
-            addr = {}
-            tel = ""
+            detail = dict(EMPTY_DETAIL)
 
         # 关闭新标签页，返回主窗口
         driver.close()
         driver.switch_to.window(main_window)
-        time.sleep(1)
 
-        return {**addr, "tel": tel, **data}
+        return detail
 
     except Exception as e:
         log(f"❌ {url}获取详情失败：{e}")
+        get_metrics().inc("tabelog_errors_total", type=type(e).__name__)
         driver.switch_to.window(main_window)
-        return {
-            "prefecture": "",
-            "city": "",
-            "town": "",
-            "detail": "",
-            "full": "",
-            "tel": "",
-            "category": "",
-            "budget": "",
-            "payment": "",
-            "seats": "",
-            "open_date": ""
-       }
+        return dict(EMPTY_DETAIL)
 
-def get_count(driver,url_info):
+def get_detail_info_in_tab(driver, url):
+    """
+    在当前标签页用 driver.get 打开详情页并提取信息（driver pool 的 worker 用）。
+    driver.get 本身的异常（如 Chrome 崩溃）直接抛出，由调用方决定是否重启 driver。
+    """
+    driver_get(driver, url)
+    wait_for(driver, "#rst-data-head")
+    return extract_shop_detail(driver)
+
+def save_count(url_info, total):
+    log(f'{url_info["url"]} 全件数: {total}'	)
+    get_db().upsert_shop_list_summary(url_info["url"],url_info["parent_area_code"],url_info["area_code"],url_info["genre"],total)
+
+def get_count(driver,url_info,fetcher=None):
+    total = read_count(driver, url_info["url"], fetcher)
+    if total is None:
+        return 0
+    save_count(url_info, total)
+    return total
+
+def read_count(driver,url,fetcher=None):
+    """读一览页的「全 N 件」，不写库；取不到返回 None"""
+
+    if fetcher is not None:
+        total = tabelog_parser.parse_page_count(fetcher.fetch(url))
+        if total is not None:
+            return total
+        log(f'↩️ HTTP 未取得件数，回退到 Selenium：{url}')
 
     try:
         # 访问页面（你已访问则跳过）
 
-        driver.get(url_info["url"])
-        time.sleep(1)  # 等待页面加载
+        driver_get(driver, url)
+        wait_for(driver, "div.list-controll")  # 等待页面加载
 
         # 假设 driver 已启动并打开页面
         element = driver.find_element(By.CSS_SELECTOR, "#container > div.rstlist-contents.clearfix > div.flexible-rstlst > div > div.list-controll.clearfix")
@@ -213,135 +383,333 @@ def get_count(driver,url_info):
 
         # 最后一个 strong 就是「全 件」的数字
         if strongs:
-            total = int(strongs[-1].text.strip())
-            log(f'{url_info["url"]} 全件数: {total}'	)
-            db = TabelogDB()
-            db.upsert_shop_list_summary(url_info["url"],url_info["parent_area_code"],url_info["area_code"],url_info["genre"],total)
-            db.close
-            return total
+            return int(strongs[-1].text.strip())
         else:
-            log(f'{url_info["url"]} strong 标签不存在')
+            log(f'{url} strong 标签不存在')
     except Exception as e:
-        log(f'{url_info["url"]} cannot get')
+        log(f'{url} cannot get')
         log(f'Exception: {type(e).__name__} - {e}')
         log(traceback.format_exc())
 
-    return 0
-
-def is_exit_shop(link,url):
-    result = False
-    db = TabelogDB()
-    if db.is_exit_shop(link):
-        db.countskip_to_shop_list_summary(url)
-        result = True
-    db.close()
-    return result
-    
-def insert_or_update_shop(shop_data,url):
-    db = TabelogDB()
-    db.insert_or_update_shop(shop_data)
+    return None
+
+def insert_or_update_shop(shop_data,url,refresh=False):
+    db = get_db()
+    with get_metrics().timer("db_write"):
+        db.insert_or_update_shop(shop_data, refresh)
+    get_metrics().inc("tabelog_shops_total", result="updated" if refresh else "inserted")
+    if refresh:
+        # 已在 record_page_links 里算作 skip，不再计入 get_count
+        log(f"🔄 已更新：{shop_data['name']}, link is {shop_data['url']}", logging.DEBUG, url=shop_data['url'])
+        return
     db.count_to_shop_list_summary(url)
-    db.close()
-    log(f"✅ 已保存：{shop_data['name']}, link is {shop_data['url']}")
+    log(f"✅ 已保存：{shop_data['name']}, link is {shop_data['url']}", logging.DEBUG, url=shop_data['url'])
     
-def insert_shop_catlog(link,area,genre):
-    db = TabelogDB()
-    result = db.insert_shop_catlog(link,area,genre)
-    db.close()
-    if result:
-        log(f"✅ shop_catlog插入成功。 link: {link}, area: {area}, genre: {genre}")
-    else:
-        log(f"⚠️ shop_catlog数据已存在，未插入。 link: {link}, area: {area}, genre: {genre}")
+def record_page_links(links, url, area, genre):
+    """
+    一页的链接一次性处理：批量写 shop_catlog、批量判断是否已收集并累计 skip 件数。
+    返回还没收集过的链接（保持页面顺序）。
+    """
+    links = [link for link in links if link]
+    db = get_db()
+    db.insert_shop_catlogs([(link, area, genre) for link in links])
+    known = db.known_shop_urls(links)
+    if known:
+        db.countskip_to_shop_list_summary(url, len(known))
+        get_metrics().inc("tabelog_shops_total", len(known), result="skipped")
+        log(f"⚠️ 跳过已收集：{len(known)} 件", sample="skip", skipped=len(known), list_url=url)
+    return [link for link in links if link not in known]
+
+def build_shop_data(rst, detail, area, genre):
+    """把一览页卡片信息和详情页信息合成 shops 表的一行"""
+    return {
+        "name": rst["name"],
+        "url": rst["link"],
+        "score": rst["score"],
+        "reviews": rst["reviews"],
+        "prefecture": detail["prefecture"],
+        "city": detail["city"],
+        "town": detail["town"],
+        "detail": detail["detail"],
+        "full": detail["full"],
+        "phone": detail["tel"],
+        "category": detail["category"],
+        "budget": detail["budget"],
+        "payment": detail["payment"],
+        "seats": detail["seats"],
+        "open_date": detail["open_date"],
+        "area": area,
+        "genre": genre,
+    }
+
+# 一次 execute_script 取出本页所有卡片的链接（按卡片顺序，没有链接的是空字符串）
+JS_CASSETTE_LINKS = """
+return Array.from(document.querySelectorAll('div.list-rst.js-rst-cassette-wrap')).map(function (rst) {
+    var a = rst.querySelector('a.list-rst__rst-name-target');
+    return a ? a.href : '';
+});
+"""
+
+# 新着顺（ニューオープン順）：完整采集过的一览按这个顺序翻页，新店在前面
+NEWEST_SORT = "SrtT=nod"
+
+def list_page_url(url, page, newest_first=False):
+    exurl = url if page == 1 else f"{url}/{page}"
+    if newest_first:
+        exurl += "?" + NEWEST_SORT
+    return exurl
+
+# 一览页全部卡片的 name/link/score/reviews，一次取完（顺序与 JS_CASSETTE_LINKS 一致）
+JS_CASSETTES = """
+return Array.from(document.querySelectorAll('div.list-rst.js-rst-cassette-wrap')).map(function (rst) {
+    function text(sel) { var e = rst.querySelector(sel); return e ? e.innerText.trim() : '0'; }
+    var a = rst.querySelector('a.list-rst__rst-name-target');
+    return {
+        name: a ? a.innerText.trim() : '',
+        link: a ? a.href : '',
+        score: text('span.c-rating__val'),
+        reviews: text('em.list-rst__rvw-count-num')
+    };
+});
+"""
+
+def extract_cassettes_batch(driver, wanted=None):
+    """一次 execute_script 取出本页全部卡片（没有链接的卡片 link 为空）；wanted 指定时只返回这些链接的卡片"""
+    shops = driver.execute_script(JS_CASSETTES) or []
+    return [rst for rst in shops if wanted is None or rst["link"] in wanted]
+
+def extract_cassettes_selenium(driver, links, wanted=None):
+    """按卡片顺序提取 name/link/score/reviews；wanted 指定时只处理这些链接的卡片"""
+    if SELENIUM_BATCH:
+        return [rst for rst in extract_cassettes_batch(driver, wanted) if rst["link"]]
+    return extract_cassettes_each(driver, links, wanted)
+
+def extract_cassettes_each(driver, links, wanted=None):
+    """逐个卡片滚动到可见处再取（SELENIUM_BATCH = False 时）"""
+    shops = []
+    cassettes = driver.find_elements(By.CSS_SELECTOR, "div.list-rst.js-rst-cassette-wrap")
+    for rst, link in zip(cassettes, links):
+        if not link or (wanted is not None and link not in wanted):
+            continue
+        try:
+            driver.execute_script("arguments[0].scrollIntoView();", rst)
+            time.sleep(0.3)
 
-def get_list(driver,url,total,area,genre):
+            name_elem = rst.find_element(By.CSS_SELECTOR, "a.list-rst__rst-name-target")
+
+            #score = rst.find_element(By.CSS_SELECTOR, "span.c-rating__val").text.strip()
+            #reviews = rst.find_element(By.CSS_SELECTOR, "em.list-rst__rvw-count-num").text.strip()
+            score = '0'
+            elems = rst.find_elements(By.CSS_SELECTOR, "span.c-rating__val")
+            if elems:
+                score = elems[0].text.strip()
+
+            reviews = '0'
+            elems = rst.find_elements(By.CSS_SELECTOR, "em.list-rst__rvw-count-num")
+            if elems:
+                reviews = elems[0].text.strip()
+
+            shops.append({
+                "name": name_elem.text.strip(),
+                "link": link,
+                "score": score,
+                "reviews": reviews,
+            })
+        except Exception as e:
+            log(f"❌ {link} 店铺卡片解析异常：{e}")
+    return shops
+
+def load_list_page_selenium(driver, exurl, batch=False):
+    """
+    用 Selenium 打开一览页，返回本页所有卡片的链接；
+    batch=True 时返回全部卡片（extract_cassettes_batch，同样一次 execute_script）。
+    """
+    driver_get(driver, exurl)
+    wait_for(driver, "div.list-controll")  # 等待页面加载
+    #scroll_to_bottom(driver, pause=1.5, max_scrolls=10)
+    if batch:
+        return extract_cassettes_batch(driver)
+    return driver.execute_script(JS_CASSETTE_LINKS) or []
+
+def load_list_page(driver, exurl, fetcher=None):
+    """
+    打开一览页，返回 (links, shops)。
+    HTTP + lxml 解析成功或 SELENIUM_BATCH 时 shops 是全部卡片；
+    否则 Selenium 时 shops 为 None，由调用方只对新链接调用 extract_cassettes_selenium。
+    """
+    metrics = get_metrics()
+    metrics.inc("tabelog_pages_total")
+    if fetcher is not None:
+        with metrics.timer("page_fetch"):
+            html = fetcher.fetch(exurl)
+        with metrics.timer("cassette_parse"):
+            shops = tabelog_parser.parse_list_page(html, exurl)
+        if shops is not None:
+            return [rst["link"] for rst in shops], shops
+        log(f"↩️ HTTP 解析一览失败，回退到 Selenium：{exurl}")
+    with metrics.timer("page_fetch_selenium"):
+        if SELENIUM_BATCH:
+            shops = load_list_page_selenium(driver, exurl, batch=True)
+            return [rst["link"] for rst in shops], [rst for rst in shops if rst["link"]]
+        return load_list_page_selenium(driver, exurl), None
+
+def collect_shop(driver, rst, url, area, genre, fetcher=None, refresh=False):
+    """取详情页并保存一家店铺，成功返回 True；refresh=True 表示更新已收集的店铺"""
+    link = rst["link"]
+    try:
+        log(f"{link}", logging.DEBUG)
+        detail = get_detail_info(driver,link + "#title-rstdata",fetcher)
+        shop_data = build_shop_data(rst, detail, area, genre)
+        insert_or_update_shop(shop_data,url,refresh)
+        return True
+    except Exception as e:
+        log(f"❌ {link} 跳过异常：{e}")
+        get_metrics().inc("tabelog_errors_total", type=type(e).__name__)
+        return False
+
+def resume_details(driver, url, area, genre, fetcher, tracker):
+    """断点恢复：先把上次中断时在途的详情任务做完"""
+    pending = tracker.pending_details()
+    if not pending:
+        return 0
+    known = get_db().known_shop_urls(rst["link"] for rst in pending)
+    log(f"♻️ 恢复在途详情 {len(pending)} 件（其中 {len(known)} 件已落盘）")
+    saved, failed = list(known), []
+    for rst in pending:
+        if rst["link"] in known:
+            continue
+        if collect_shop(driver, rst, url, area, genre, fetcher):
+            saved.append(rst["link"])
+        else:
+            failed.append(rst["link"])
+    get_db().flush()
+    tracker.checkpoint(tracker.page, tracker.remaining, saved, failed)
+    return len(saved) - len(known)
+
+def get_list(driver,url,total,area,genre,fetcher=None,start_page=1,tracker=None,refresh_days=None):
+    """
+    翻页采集一个一览。tracker（frontier.FrontierLease）指定时，
+    每页开始前记录在途详情、每页结束后记录断点，崩溃后可以从 start_page 继续。
+    refresh_days 指定时是增量更新模式：已收集的店铺如果一览上的评分 / 口コミ数变了，
+    或 update_time 超过 refresh_days 天，也重新取详情。
+    正常翻完（或新着顺提前停止）返回 True，中途异常返回 False。
+    """
+    refresh = refresh_days is not None
+
+    # 之前完整翻完过的一览：按新着顺翻页，遇到整页都已收集就不用再往后翻（增量更新时要翻完全部）
+    newest_first = not refresh and get_db().is_list_complete(url)
 
     # 翻页采集逻辑
-    page = 1
-    exurl = url
+    page = start_page
     count = 0
-    #link =''
+    finished = False
+    if tracker is not None:
+        count += resume_details(driver, url, area, genre, fetcher, tracker)
     while True:
         try:
+            exurl = list_page_url(url, page, newest_first)
 
-            # 初始化浏览器
-            driver.get(exurl)
             log(f"🔍 正在处理第 {page} 页...")
-            time.sleep(3)  # 等待页面加载
-            #scroll_to_bottom(driver, pause=1.5, max_scrolls=10)
-            
-            shops = driver.find_elements(By.CSS_SELECTOR, "div.list-rst.js-rst-cassette-wrap")
-            log(f"本页共找到 {len(shops)} 个店铺")
+            links, shops = load_list_page(driver, exurl, fetcher)
+            log(f"本页共找到 {len(links)} 个店铺")
+
+            new_links = set(record_page_links(links, url, area, genre))
+            if newest_first and links and not new_links:
+                log("⏹️ 本页店铺全部已收集（新着顺），停止翻页")
+                finished = True
+                break
+
+            if shops is None and (new_links or refresh):
+                with get_metrics().timer("cassette_selenium"):
+                    shops = extract_cassettes_selenium(driver, links, None if refresh else new_links)
+            shops = shops or []
+
+            stale_links = set()
+            if refresh:
+                stale_links = get_db().shops_to_refresh([rst for rst in shops if rst["link"] not in new_links],
+                                                        refresh_days)
+                if stale_links:
+                    log(f"🔄 评分 / 口コミ数有变化或已过期：{len(stale_links)} 件，重新取详情")
+            shops = [rst for rst in shops if rst["link"] in new_links or rst["link"] in stale_links]
 
+            if tracker is not None:
+                get_db().flush()
+                tracker.add_details(shops)
+
+            saved, failed = [], []
             for rst in shops:
-                try:
-                    driver.execute_script("arguments[0].scrollIntoView();", rst)
-                    time.sleep(0.3)
-
-                    name_elem = rst.find_element(By.CSS_SELECTOR, "a.list-rst__rst-name-target")
-                    name = name_elem.text.strip()
-                    link = name_elem.get_attribute("href")
-                    log(f"{link}")
-                    if not link:
-                        continue # skip .
-                    insert_shop_catlog(link,area,genre)
-                    if is_exit_shop(link,url):
-                        log(f"⚠️ 跳过已收集：{link}")
-                        continue # skip to reget.
-
-                    #score = rst.find_element(By.CSS_SELECTOR, "span.c-rating__val").text.strip()
-                    #reviews = rst.find_element(By.CSS_SELECTOR, "em.list-rst__rvw-count-num").text.strip()
-                    score = '0'
-                    elems = rst.find_elements(By.CSS_SELECTOR, "span.c-rating__val")
-                    if elems:
-                        score = elems[0].text.strip()
-                    
-                    reviews = '0'
-                    elems = rst.find_elements(By.CSS_SELECTOR, "em.list-rst__rvw-count-num")
-                    if elems:
-                        reviews = elems[0].text.strip()
-
-                    detail = get_detail_info(driver,link + "#title-rstdata")
-                    shop_data = {
-                                "name": name,
-                                "url": link,
-                                "score": score,
-                                "reviews": reviews,
-                                "prefecture": detail["prefecture"],
-                                "city": detail["city"],
-                                "town": detail["town"],
-                                "detail": detail["detail"],
-                                "full": detail["full"],
-                                "phone": detail["tel"],
-                                "category": detail["category"],
-                                "budget": detail["budget"],
-                                "payment": detail["payment"],
-                                "seats": detail["seats"],
-                                "open_date": detail["open_date"],
-                                "area": area,
-                                "genre": genre,
-                                }
-                    insert_or_update_shop(shop_data,url)
-                    count += 1
-                    time.sleep(random.uniform(1,2))
-                except Exception as e:
-                    log(f"❌ {link} 跳过异常：{e}")
-
-            total -=len(shops)
+                if collect_shop(driver, rst, url, area, genre, fetcher, rst["link"] in stale_links):
+                    saved.append(rst["link"])
+                else:
+                    failed.append(rst["link"])
+            count += len(saved)
+
+            total -=len(links)
+            if tracker is not None:
+                # 先让店铺落盘，再前移断点；失败的详情留在队列里重试
+                get_db().flush()
+                tracker.checkpoint(page + 1, total, saved, failed)
             if total<=0 or page>=60:
+                finished = True
                 break
             page += 1
-            exurl = f"{url}/{page}"
-
-            time.sleep(random.uniform(2,3))
         except:
             log("▶️ 无下一页，结束采集")
             break
 
+    if finished and tracker is not None:
+        # 翻页时失败的详情在结束租约前再试一次
+        count += resume_details(driver, url, area, genre, fetcher, tracker)
+    if finished:
+        get_db().mark_list_complete(url)
     log(f"🎉 完成，共采集 {count} 家店铺，保存到 tabelog.db")
+    return finished
+
+def crawl_frontier(driver, fetcher, frontier, refresh_days=None):
+    """
+    从持久化队列里逐个租一览来采集，直到队列为空。
+    Frontier 用自己的连接写 tabelog.db，租 / 结束租约前先把 get_db() 未提交的写入 flush，
+    否则要等会话的批量提交才能拿到写锁。
+    """
+    while True:
+        get_db().flush()
+        lease = frontier.lease()
+        if lease is None:
+            break
+        url_info = lease.url_info
+        try:
+            total = lease.remaining
+            if not lease.started:
+                total = get_count(driver,url_info,fetcher)
+                need,result0,result1,result2 = get_db().is_need_get_shop(url_info["url"])
+                if not ((need or refresh_days is not None) and total>0):
+                    log(f'⚠️ 跳过收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+                    get_db().flush()
+                    lease.done()
+                    continue
+                log(f'⬇️ 开始收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+            else:
+                log(f'⏯️ 从第 {lease.page} 页继续：{url_info["url"]}，剩余 {total} 件')
+
+            finished = get_list(driver,url_info["url"],total,url_info["area_code"],url_info["genre"],fetcher,
+                                start_page=lease.page,tracker=lease,refresh_days=refresh_days)
+            get_db().flush()
+            if finished:
+                lease.done()
+            else:
+                lease.fail("get_list 中途结束")
+        except Exception as e:
+            log(f'❌ {url_info["url"]} 采集异常：{type(e).__name__} - {e}')
+            try:
+                get_db().flush()
+                lease.fail(f"{type(e).__name__} - {e}")
+            except sqlite3.Error as db_error:
+                # 记不上失败也不要中断整个队列：租约过期后会被重新租出去
+                log(f'❌ {url_info["url"]} 记录失败出错：{db_error}', logging.ERROR)
 
 def convert_matome_url_to_rstLst(url: str) -> str:
     """
-    将 URL 从 matome 格式转换为 rstLst 格式
+    将 URL 从 matome 格式转换为 rstLst 格式（host 换成 fetcher.BASE_URL）
     例：
     https://tabelog.com/matome/fukushima/A0701/list/ →
     https://tabelog.com/fukushima/A0701/rstLst/
@@ -352,7 +720,7 @@ def convert_matome_url_to_rstLst(url: str) -> str:
         url = url[:-6] + "/rstLst/"
     elif url.endswith("/list"):
         url = url[:-5] + "/rstLst/"
-    return url
+    return rebase(url)
 
 def get_urls():
     db = TabelogDB()
@@ -375,9 +743,41 @@ def get_urls():
     
     return urls
 
-if __name__ == "__main__":
-    urls = get_urls()
-    i = 1
+def plan_urls(urls, refresh=False):
+    """用 planner.CrawlPlanner 剪枝、排序 urls，并输出请求预算（探测件数走 HTTP，需要 JS 时才开 Chrome）"""
+    from planner import CrawlPlanner, format_budget
+
+    fetcher = HttpFetcher()
+    driver = LazyDriver(create_driver)
+    planner = CrawlPlanner(lambda url: read_count(driver, url, fetcher), convert_matome_url_to_rstLst)
+    try:
+        urls, budget = planner.plan(urls, refresh=refresh)
+    finally:
+        planner.close()
+        driver.quit()
+        fetcher.close()
+    log("🗺️ 采集计划\n" + format_budget(budget))
+    return urls
+
+def start_metrics(args):
+    """按参数启动指标输出；进程结束时输出各阶段耗时表并写入 crawl_run"""
+    metrics = get_metrics()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.metrics_file:
+        metrics.start_snapshots(args.metrics_file)
+
+    def finish():
+        from metrics import format_summary, record_run
+        if args.metrics_file:
+            metrics.write_json(args.metrics_file)
+        run_id = record_run(metrics, args.engine)
+        log(f"📊 本次运行汇总（crawl_run #{run_id}）\n"
+            + format_summary(metrics, concurrent=args.engine in ("async", "pool")))
+
+    atexit.register(finish)
+
+def create_driver():
     options = webdriver.ChromeOptions()
     #options.add_argument("--disable-blink-features=AutomationControlled")
     #options.add_argument("start-maximized")
@@ -391,18 +791,98 @@ if __name__ == "__main__":
     options.add_argument("--log-level=3")  # 只输出致命错误
     options.add_experimental_option("excludeSwitches", ["enable-logging"])    
 
-    driver = webdriver.Chrome(options=options)
-
-    for url_info in urls:
-        total = get_count(driver,url_info)
-        db = TabelogDB()
-        need,result0,result1,result2 = db.is_need_get_shop(url_info["url"])
-        db.close()
-        
-        if need and total>0:
-            log(f'⬇️ 开始收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
-            get_list(driver,url_info["url"],total,url_info["area_code"],url_info["genre"])
-        else:
-            log(f'⚠️ 跳过收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+    return webdriver.Chrome(options=options)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="tabelog shops 采集")
+    parser.add_argument("--engine", choices=["http", "selenium", "async", "pool"], default="http",
+                        help="http: 直接下载 HTML 用 lxml 解析，需要 JS 时才启动 Chrome；selenium: 全部用 Chrome；"
+                             "async: asyncio 并发采集；pool: 多个 Chrome worker 并行")
+    parser.add_argument("--concurrency", type=int, default=16, help="async 模式的全局并发请求数上限")
+    parser.add_argument("--workers", type=int, default=4, help="pool 模式的 Chrome worker 数")
+    parser.add_argument("--proxy", action="store_true", help="http 模式下通过 proxy 表里的代理池请求（先执行 getproxy.py）")
+    parser.add_argument("--resume", action="store_true",
+                        help="用 tabelog.db 里的 crawl_frontier 队列采集：崩溃或重启后从断点继续，可多进程同时跑")
+    parser.add_argument("--refresh", nargs="?", type=float, const=REFRESH_MAX_AGE_DAYS, metavar="DAYS",
+                        help="增量更新：已收集的店铺评分 / 口コミ数变化或 update_time 超过 DAYS 天"
+                             f"（默认 {REFRESH_MAX_AGE_DAYS}）时重新取详情")
+    parser.add_argument("--plan", action="store_true",
+                        help="先读上级组合（都道府県 / 上级ジャンル）的件数，剪掉 0 件的组合，按预计新增件数和陈旧程度排序")
+    parser.add_argument("--plan-only", action="store_true", help="只输出采集计划和请求预算，不采集（隐含 --plan）")
+    parser.add_argument("--metrics-port", type=int, help="在 http://127.0.0.1:PORT/metrics 提供 Prometheus 格式的指标")
+    parser.add_argument("--metrics-file", help="每 30 秒把指标快照写到这个 JSON 文件")
+    parser.add_argument("--cache", action="store_true",
+                        help="http 模式下把页面缓存到 http_cache.db，过期后用 ETag/Last-Modified 做条件请求")
+    parser.add_argument("--offline", action="store_true", help="只从 http_cache.db 读页面（离线回放，隐含 --cache）")
+    parser.add_argument("--base-url", help="采集的站点，默认 https://tabelog.com（或环境变量 TABELOG_BASE_URL），"
+                                           "压测时指向 mock_tabelog.py")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default=LOG_LEVEL,
+                        help="DEBUG 时输出每家店铺的链接和保存结果")
+    parser.add_argument("--log-text", action="store_true", help="syslog / 日志文件用纯文本而不是一行一个 JSON")
+    args = parser.parse_args()
+    if args.refresh is not None and args.engine in ("async", "pool"):
+        parser.error(f"--refresh 只支持 --engine http / selenium，{args.engine} 模式不支持")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.base_url:
+        set_base_url(args.base_url)
+    init_logger(level=args.log_level, json_format=not args.log_text)
+    start_metrics(args)
+    urls = get_urls()
+
+    if args.plan or args.plan_only:
+        urls = plan_urls(urls, refresh=args.refresh is not None)
+        if args.plan_only:
+            raise SystemExit(0)
+
+    if args.engine == "async":
+        import async_crawler
+        async_crawler.run(urls, concurrency=args.concurrency)
+        raise SystemExit(0)
+
+    if args.engine == "pool":
+        import driver_pool
+        driver_pool.run(urls, size=args.workers)
+        raise SystemExit(0)
+
+    if args.engine == "http":
+        proxy_pool = None
+        if args.proxy:
+            from proxy_pool import ProxyPool
+            proxy_pool = ProxyPool()
+            proxy_pool.start_revalidation()
+        cache = None
+        if args.cache or args.offline:
+            from http_cache import ResponseCache
+            cache = ResponseCache()
+        fetcher = HttpFetcher(proxy_pool=proxy_pool, cache=cache, offline=args.offline)
+        driver = LazyDriver(create_driver)
+    else:
+        fetcher = None
+        driver = create_driver()
+
+    if args.resume:
+        from frontier import Frontier
+        frontier = Frontier()
+        log(f"📋 采集队列新增 {frontier.seed(urls)} 个一览")
+        crawl_frontier(driver, fetcher, frontier, args.refresh)
+        frontier.close()
+    else:
+        for url_info in urls:
+            total = get_count(driver,url_info,fetcher)
+            need,result0,result1,result2 = get_db().is_need_get_shop(url_info["url"])
+            
+            if (need or args.refresh is not None) and total>0:
+                log(f'⬇️ 开始收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
+                get_list(driver,url_info["url"],total,url_info["area_code"],url_info["genre"],fetcher,
+                         refresh_days=args.refresh)
+            else:
+                log(f'⚠️ 跳过收集：{url_info["url"]}， 需要收集：{result2}件，已收集{result0+result1}件')
 
     driver.quit()
+    if fetcher is not None:
+        fetcher.close()
+        if fetcher.proxy_pool is not None:
+            fetcher.proxy_pool.close()   # 把内存里的代理分数写库
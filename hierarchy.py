@@ -0,0 +1,190 @@
+import sqlite3
+import argparse
+import threading
+
+DB_PATH = "tabelog.db"
+TABLES = ("area", "genre")
+MAX_DEPTH = 10   # 防止 parent_code 成环时递归不停
+
+
+def closure_ddl(table):
+    """
+    {table}_closure：(ancestor, descendant, depth) 的闭包表，自己到自己 depth = 0。
+    level / is_leaf 是 descendant 的属性，冗余存一份，「某节点下的叶子 / 某层」都是主键前缀扫描。
+    """
+    return (
+        f"""
+        CREATE TABLE IF NOT EXISTS {table}_closure (
+            ancestor TEXT NOT NULL,
+            descendant TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            level INTEGER,
+            is_leaf INTEGER DEFAULT 0,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_{table}_closure_descendant ON {table}_closure(descendant, depth)",
+    )
+
+
+def rebuild_closure(conn, table):
+    """从 {table}.parent_code 重建闭包表（getarea / getcatlog 保存后调用），返回行数"""
+    for ddl in closure_ddl(table):
+        conn.execute(ddl)
+    conn.execute(f"DELETE FROM {table}_closure")
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {table}_closure (ancestor, descendant, depth, level, is_leaf)
+        WITH RECURSIVE nodes AS (
+            SELECT code, parent_code, level FROM {table} WHERE is_deleted = 0 AND code IS NOT NULL
+        ),
+        closure(ancestor, descendant, depth) AS (
+            SELECT code, code, 0 FROM nodes
+            UNION ALL
+            SELECT c.ancestor, n.code, c.depth + 1
+            FROM closure c JOIN nodes n ON n.parent_code = c.descendant
+            WHERE c.depth < {MAX_DEPTH}
+        )
+        SELECT c.ancestor, c.descendant, c.depth, n.level,
+               NOT EXISTS (SELECT 1 FROM nodes child WHERE child.parent_code = c.descendant)
+        FROM closure c JOIN nodes n ON n.code = c.descendant
+    """)
+    conn.commit()
+    invalidate()
+    return conn.execute(f"SELECT COUNT(*) FROM {table}_closure").fetchone()[0]
+
+
+def has_closure(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?",
+                        (f"{table}_closure",)).fetchone() is not None
+
+
+def descendants(conn, table, code, level=None, leaves_only=False, include_self=False):
+    """code 下面的节点 code（按 level、code 排序），一条走主键前缀的查询"""
+    sql = f"SELECT descendant FROM {table}_closure WHERE ancestor = ?"
+    params = [code]
+    if not include_self:
+        sql += " AND depth > 0"
+    if level is not None:
+        sql += " AND level = ?"
+        params.append(level)
+    if leaves_only:
+        sql += " AND is_leaf = 1"
+    sql += " ORDER BY level, descendant"
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def ancestors(conn, table, code):
+    """code 的所有上级，从根到直接父节点"""
+    rows = conn.execute(f"""
+        SELECT ancestor FROM {table}_closure WHERE descendant = ? AND depth > 0 ORDER BY depth DESC
+    """, (code,))
+    return [row[0] for row in rows]
+
+
+class Hierarchy:
+    """
+    一张层级表（area / genre）的内存副本：节点信息 + 闭包。
+    进程内用 get_hierarchy() 共享，rebuild_closure() 后自动失效。
+    """
+
+    def __init__(self, conn, table):
+        self.table = table
+        self.nodes = {}        # code → {"name", "level", "parent_code"}
+        self.by_name = {}      # name → [code, ...]（按 level 排序）
+        for code, name, level, parent_code in conn.execute(f"""
+            SELECT code, name, level, parent_code FROM {table}
+            WHERE is_deleted = 0 AND code IS NOT NULL ORDER BY level, id
+        """):
+            self.nodes[code] = {"name": name, "level": level, "parent_code": parent_code}
+            self.by_name.setdefault(name, []).append(code)
+
+        self._down = {}        # ancestor → [(descendant, depth, level, is_leaf), ...]
+        self._up = {}          # descendant → [(ancestor, depth), ...]
+        if not has_closure(conn, table):
+            rebuild_closure(conn, table)
+        for ancestor, descendant, depth, level, is_leaf in conn.execute(f"""
+            SELECT ancestor, descendant, depth, level, is_leaf FROM {table}_closure ORDER BY level, descendant
+        """):
+            self._down.setdefault(ancestor, []).append((descendant, depth, level, bool(is_leaf)))
+            self._up.setdefault(descendant, []).append((ancestor, depth))
+
+    def resolve(self, code_or_name):
+        """code 或名称（如「東京」「ラーメン」）→ code；找不到返回 None"""
+        if code_or_name in self.nodes:
+            return code_or_name
+        codes = self.by_name.get(code_or_name)
+        return codes[0] if codes else None
+
+    def name(self, code):
+        node = self.nodes.get(code)
+        return node["name"] if node else None
+
+    def descendants(self, code_or_name, level=None, leaves_only=False, include_self=False):
+        code = self.resolve(code_or_name)
+        return [
+            descendant for descendant, depth, node_level, is_leaf in self._down.get(code, [])
+            if (include_self or depth > 0)
+            and (level is None or node_level == level)
+            and (not leaves_only or is_leaf)
+        ]
+
+    def ancestors(self, code_or_name):
+        code = self.resolve(code_or_name)
+        return [ancestor for ancestor, _ in sorted(self._up.get(code, []), key=lambda x: -x[1]) if ancestor != code]
+
+    def leaves(self):
+        return [code for code, rows in self._down.items()
+                if any(depth == 0 and is_leaf for _, depth, _, is_leaf in rows)]
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_hierarchy(table, db_path=DB_PATH):
+    """
+    进程内缓存的 Hierarchy；同一个库只载入一次。
+    在锁外载入：没有闭包表时 Hierarchy 会调 rebuild_closure → invalidate()，它也要拿 _cache_lock。
+    """
+    key = (db_path, table)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    conn = sqlite3.connect(db_path)
+    try:
+        tree = Hierarchy(conn, table)
+    finally:
+        conn.close()
+    with _cache_lock:
+        # 并发载入时保留先放进去的那份
+        return _cache.setdefault(key, tree)
+
+
+def invalidate():
+    with _cache_lock:
+        _cache.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="地区 / ジャンル的层级查询")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("node", nargs="?", help="code 或名称，如 東京、ラーメン")
+    parser.add_argument("--level", type=int, help="只列出这一层")
+    parser.add_argument("--leaves", action="store_true", help="只列出叶子节点")
+    parser.add_argument("--rebuild", action="store_true", help="重建闭包表")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        conn = sqlite3.connect(args.db)
+        print(f"✅ {args.table}_closure：{rebuild_closure(conn, args.table)} 行")
+        conn.close()
+    if args.node:
+        tree = get_hierarchy(args.table, args.db)
+        code = tree.resolve(args.node)
+        if code is None:
+            print(f"⚠️ 找不到：{args.node}")
+        else:
+            print(" > ".join(tree.name(c) or c for c in tree.ancestors(code) + [code]))
+            for descendant in tree.descendants(code, args.level, args.leaves):
+                print(f"{descendant}\t{tree.name(descendant)}")
@@ -0,0 +1,185 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+import argparse
+from urllib.parse import urldefrag
+
+logger = logging.getLogger("tabelog.cache")
+
+CACHE_PATH = "http_cache.db"
+MAX_BYTES = 2 * 1024 ** 3   # 压缩后总大小上限 2GB，超过按 LRU 淘汰
+ACCESS_BATCH = 500          # 命中时的访问时间先记在内存里，攒够这么多（或 put / close 时）一起写库
+
+DAY = 24 * 3600
+# 每种页面的有效期（秒）：过期后带 ETag/Last-Modified 做条件请求
+TTL = {
+    "index": 7 * DAY,    # 地区 / ジャンル一览（matome/area_lst, cat_lst）
+    "list": 1 * DAY,     # rstLst 店铺一览
+    "detail": 30 * DAY,  # 店铺详情
+}
+
+
+def cache_key(url):
+    """#title-rstdata 之类的锚点不影响内容，去掉后作为 key"""
+    return urldefrag(url)[0]
+
+
+def page_type(url):
+    if "/matome/area_lst" in url or "/cat_lst" in url:
+        return "index"
+    if "/rstLst/" in url:
+        return "list"
+    return "detail"
+
+
+class CacheEntry:
+    def __init__(self, row):
+        self.url = row[0]
+        self.page_type = row[1]
+        self.etag = row[2]
+        self.last_modified = row[3]
+        self.body = zlib.decompress(row[4]).decode("utf-8")
+        self.fetched_at = row[5]
+
+    def age(self, now=None):
+        return (now or time.time()) - self.fetched_at
+
+
+class ResponseCache:
+    """
+    URL → 页面 HTML 的磁盘缓存（SQLite，正文 zlib 压缩）。
+    - TTL 按页面类型配置，过期后用 ETag / Last-Modified 做条件请求，304 时直接续期
+    - 总大小超过 max_bytes 时按最后访问时间淘汰（LRU）；命中只更新内存，访问时间批量写库
+    - 也可以当离线回放库用：HttpFetcher(offline=True) 只从缓存读
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=None, max_bytes=MAX_BYTES):
+        self.ttl = {**TTL, **(ttl or {})}
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.accessed = {}   # url -> 还没写库的最后访问时间
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                url TEXT PRIMARY KEY,
+                page_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB,
+                size INTEGER,
+                fetched_at REAL,
+                accessed_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_accessed ON response_cache(accessed_at)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+
+    def get(self, url):
+        key = cache_key(url)
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT url, page_type, etag, last_modified, body, fetched_at
+                FROM response_cache WHERE url = ?
+            """, (key,)).fetchone()
+            if row is None:
+                return None
+            self.accessed[key] = time.time()
+            if len(self.accessed) >= ACCESS_BATCH:
+                self._write_accessed()
+                self.conn.commit()
+        return CacheEntry(row)
+
+    def _write_accessed(self):
+        if self.accessed:
+            self.conn.executemany("UPDATE response_cache SET accessed_at = ? WHERE url = ?",
+                                  [(at, url) for url, at in self.accessed.items()])
+            self.accessed.clear()
+
+    def flush(self):
+        """把内存里的访问时间写库"""
+        with self.lock:
+            self._write_accessed()
+            self.conn.commit()
+
+    def is_fresh(self, entry):
+        return entry.age() < self.ttl.get(entry.page_type, 0)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def put(self, url, body, etag=None, last_modified=None):
+        key = cache_key(url)
+        blob = zlib.compress(body.encode("utf-8"), 6)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM response_cache WHERE url = ?", (key,)).fetchone()
+            self.conn.execute("""
+                INSERT INTO response_cache (url, page_type, etag, last_modified, body, size, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag, last_modified = excluded.last_modified, body = excluded.body,
+                    size = excluded.size, fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at
+            """, (key, page_type(key), etag, last_modified, blob, len(blob), now, now))
+            self.total_bytes += len(blob) - (old[0] if old else 0)
+            if self.total_bytes > self.max_bytes:
+                self._write_accessed()   # 淘汰按 accessed_at 排序，先把命中记录写进去
+                self._evict()
+            self.conn.commit()
+
+    def refresh(self, url):
+        """304 Not Modified：内容没变，只更新取得时间"""
+        now = time.time()
+        with self.lock:
+            self.accessed.pop(cache_key(url), None)
+            self.conn.execute("UPDATE response_cache SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                              (now, now, cache_key(url)))
+            self.conn.commit()
+
+    def _evict(self):
+        # 淘汰到上限的 90%，避免每次写入都触发
+        target = self.max_bytes * 0.9
+        rows = self.conn.execute("SELECT url, size FROM response_cache ORDER BY accessed_at").fetchall()
+        evicted = []
+        for url, size in rows:
+            if self.total_bytes <= target:
+                break
+            evicted.append((url,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM response_cache WHERE url = ?", evicted)
+        logger.info("🧹 缓存淘汰 %d 个页面，当前 %.1f MB", len(evicted), self.total_bytes / 1024 / 1024)
+
+    def stats(self):
+        rows = self.conn.execute("""
+            SELECT page_type, COUNT(*), COALESCE(SUM(size), 0) FROM response_cache GROUP BY page_type
+        """).fetchall()
+        return {page: (n, size) for page, n, size in rows}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看 / 清理 HTTP 缓存")
+    parser.add_argument("--clear", action="store_true", help="清空缓存")
+    args = parser.parse_args()
+
+    cache = ResponseCache()
+    if args.clear:
+        cache.conn.execute("DELETE FROM response_cache")
+        cache.conn.commit()
+        cache.conn.execute("VACUUM")
+        print("🗑️ 已清空缓存")
+    for page, (n, size) in sorted(cache.stats().items()):
+        print(f"{page:>6}: {n} 个页面，{size / 1024 / 1024:.1f} MB")
+    cache.close()
@@ -0,0 +1,257 @@
+import json
+import logging
+import time
+import sqlite3
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("tabelog.metrics")
+
+DB_PATH = "tabelog.db"
+# 耗时直方图的桶（秒）：从 HTTP 请求到 Chrome 打开详情页都覆盖得到
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_METRIC = "tabelog_stage_seconds"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶估算分位数（取所在桶的上界）"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for upper, n in zip(self.buckets + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return upper
+        return float("inf")
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _label_text(key):
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}" if key else ""
+
+
+class Metrics:
+    """
+    进程内的计数器 / 直方图，线程安全。
+    timer(stage) 统计各阶段耗时（page_fetch、cassette_parse、detail_fetch、detail_parse、db_write 等），
+    可以用 serve() 提供 Prometheus 文本格式，或 start_snapshots() 定期写 JSON 文件。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.started = time.time()
+        self._stop = threading.Event()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(STAGE_METRIC, time.perf_counter() - start, stage=stage)
+
+    def counter(self, name, **labels):
+        with self.lock:
+            return self.counters.get((name, _label_key(labels)), 0)
+
+    def counter_total(self, name):
+        with self.lock:
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def stages(self):
+        """[(stage, 次数, 合计秒, 平均秒, P50, P95), ...]，按合计耗时降序"""
+        with self.lock:
+            rows = [
+                (dict(labels).get("stage"), h.count, h.sum, h.sum / h.count if h.count else 0,
+                 h.quantile(0.5), h.quantile(0.95))
+                for (name, labels), h in self.histograms.items() if name == STAGE_METRIC
+            ]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "uptime": round(time.time() - self.started, 1),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": h.count, "sum": round(h.sum, 6),
+                     "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], h.counts))}
+                    for (name, labels), h in sorted(self.histograms.items())
+                ],
+            }
+
+    def prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{_label_text(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), h in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    cumulative = 0
+                    for upper, count in zip([str(b) for b in h.buckets] + ["+Inf"], h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', upper),))} {cumulative}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {h.sum}")
+                    lines.append(f"{name}_count{_label_text(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def start_snapshots(self, path, interval=30):
+        """后台线程每 interval 秒把快照写到 path"""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.write_json(path)
+                except OSError as e:
+                    logger.error("❌ 写 metrics 快照失败：%s", e)
+
+        threading.Thread(target=loop, name="metrics-snapshot", daemon=True).start()
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """在 http://host:port/metrics 提供 Prometheus 文本"""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("📈 metrics: http://%s:%s/metrics", host, port)
+        return server
+
+    def stop(self):
+        self._stop.set()
+
+
+def record_run(metrics, engine, db_path=DB_PATH):
+    """把本次运行的汇总写进 crawl_run 表，返回行 id"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_run (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            engine TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            seconds REAL,
+            pages INTEGER,
+            shops_inserted INTEGER,
+            shops_updated INTEGER,
+            shops_skipped INTEGER,
+            errors INTEGER,
+            stages TEXT
+        )
+    """)
+    stages = [
+        {"stage": stage, "count": count, "total": round(total, 3), "mean": round(mean, 4), "p50": p50, "p95": p95}
+        for stage, count, total, mean, p50, p95 in metrics.stages()
+    ]
+    cur = conn.execute("""
+        INSERT INTO crawl_run (engine, started_at, finished_at, seconds, pages,
+                               shops_inserted, shops_updated, shops_skipped, errors, stages)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        engine,
+        time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(metrics.started)),
+        time.strftime('%Y-%m-%d %H:%M:%S'),
+        round(time.time() - metrics.started, 1),
+        metrics.counter_total("tabelog_pages_total"),
+        metrics.counter("tabelog_shops_total", result="inserted"),
+        metrics.counter("tabelog_shops_total", result="updated"),
+        metrics.counter("tabelog_shops_total", result="skipped"),
+        metrics.counter_total("tabelog_errors_total"),
+        json.dumps(stages, ensure_ascii=False),
+    ))
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def format_summary(metrics, concurrent=False):
+    """
+    本次运行的各阶段耗时表。
+    concurrent=True（async / pool）时各阶段在多个请求 / worker 上同时计时，合计是各次耗时之和，可以超过用时。
+    """
+    elapsed = time.time() - metrics.started
+    total_label = "并发合计(s)" if concurrent else "合计(s)"
+    lines = [f"{'阶段':<16}{'次数':>8}{total_label:>10}{'占比':>8}{'平均(s)':>10}{'P95(s)':>8}"]
+    for stage, count, total, mean, _, p95 in metrics.stages():
+        share = total / elapsed * 100 if elapsed else 0
+        lines.append(f"{stage:<16}{count:>8}{total:>10.1f}{share:>7.1f}%{mean:>10.3f}{p95:>8}")
+    lines.append(
+        f"页面 {metrics.counter_total('tabelog_pages_total')}，"
+        f"新增 {metrics.counter('tabelog_shops_total', result='inserted')}，"
+        f"更新 {metrics.counter('tabelog_shops_total', result='updated')}，"
+        f"跳过 {metrics.counter('tabelog_shops_total', result='skipped')}，"
+        f"错误 {metrics.counter_total('tabelog_errors_total')}，用时 {elapsed:.0f}s"
+    )
+    if concurrent:
+        lines.append("（并发执行：各阶段合计是所有请求 / worker 的耗时之和，占比可以超过 100%）")
+    return "\n".join(lines)
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """进程内共用的 Metrics"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
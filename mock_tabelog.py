@@ -0,0 +1,312 @@
+import time
+import zlib
+import random
+import argparse
+import threading
+from html import escape
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE_SIZE = 20
+MAX_PAGES = 60          # 与 tabelog 一样，一览最多翻 60 页
+
+
+def _rng(*key):
+    """同一个 key 每次生成同样的数据（crc32，不受 PYTHONHASHSEED 影响）"""
+    return random.Random(zlib.crc32("/".join(map(str, key)).encode("utf-8")))
+
+
+class MockSite:
+    """
+    合成的站点数据：地区 4 层（地方 → 都道府県 → 地区 → 细分地区），ジャンル 3 层。
+    店铺只挂在 细分地区 × 叶子ジャンル 上，上级组合的件数 = 下级之和，与真实站点一样可以剪枝。
+    """
+
+    def __init__(self, prefectures=3, areas=3, subareas=2, genres=2, subgenres=2, leaves=3,
+                 max_shops=1500, empty_rate=0.6, seed=0):
+        self.seed = seed
+        self.regions = [("地方1", [f"pref{p}" for p in range(1, prefectures + 1)])]
+        self.areas = {}         # 细分地区 code → (pref, 地区 code)
+        self.area_tree = {}     # pref → {地区 code: [细分地区 code, ...]}
+        for p in range(1, prefectures + 1):
+            pref = f"pref{p}"
+            self.area_tree[pref] = {}
+            for a in range(1, areas + 1):
+                a3 = f"A{p:02d}{a:02d}"
+                self.area_tree[pref][a3] = [f"{a3}{b:02d}" for b in range(1, subareas + 1)]
+                for a4 in self.area_tree[pref][a3]:
+                    self.areas[a4] = (pref, a3)
+
+        self.genre_tree = {}    # 大类 code → {中类 code: [叶子 code, ...]}
+        for g in range(1, genres + 1):
+            top = f"genre{g}"
+            self.genre_tree[top] = {
+                f"RC{g:02d}{m:02d}": [f"g{g}{m}{k}" for k in range(1, leaves + 1)]
+                for m in range(1, subgenres + 1)
+            }
+        self.leaf_genres = [leaf for mids in self.genre_tree.values() for leaves_ in mids.values() for leaf in leaves_]
+
+        # 细分地区 × 叶子ジャンル 的店铺数：大部分为 0，少数很多（超过 60 页上限）
+        self.counts = {}
+        for a4 in self.areas:
+            for genre in self.leaf_genres:
+                rng = _rng(seed, a4, genre)
+                self.counts[(a4, genre)] = 0 if rng.random() < empty_rate else int(max_shops * rng.random() ** 3) + 1
+
+    def leaf_areas(self, parts):
+        """URL 里的地区部分（pref / pref+地区 / pref+地区+细分地区）→ 细分地区 code list"""
+        tree = self.area_tree.get(parts[0]) if parts else None
+        if tree is None:
+            return []
+        if len(parts) == 1:
+            return [a4 for subs in tree.values() for a4 in subs]
+        subs = tree.get(parts[1], [])
+        return subs if len(parts) == 2 else [a4 for a4 in subs if a4 == parts[2]]
+
+    def leaf_genres_of(self, code):
+        if code in self.genre_tree:
+            return [leaf for leaves in self.genre_tree[code].values() for leaf in leaves]
+        for mids in self.genre_tree.values():
+            if code in mids:
+                return mids[code]
+        return [code] if code in self.leaf_genres else []
+
+    def shops(self, area_parts, genre):
+        """组合下的店铺 [(细分地区, 叶子ジャンル, 序号), ...]，顺序固定"""
+        return [
+            (a4, leaf, i)
+            for a4 in self.leaf_areas(area_parts)
+            for leaf in self.leaf_genres_of(genre)
+            for i in range(self.counts.get((a4, leaf), 0))
+        ]
+
+    def shop_id(self, a4, genre, i):
+        return f"{a4[1:]}{self.leaf_genres.index(genre):03d}{i:04d}"
+
+    def shop_path(self, a4, genre, i):
+        pref, a3 = self.areas[a4]
+        return f"/{pref}/{a3}/{a4}/{self.shop_id(a4, genre, i)}/"
+
+    def shop(self, shop_id):
+        """shop_id → (细分地区, 叶子ジャンル, 序号)；不存在返回 None"""
+        if len(shop_id) != 13 or not shop_id.isdigit():
+            return None
+        a4 = f"A{shop_id[:6]}"
+        index = int(shop_id[6:9])
+        i = int(shop_id[9:])
+        if a4 not in self.areas or index >= len(self.leaf_genres):
+            return None
+        genre = self.leaf_genres[index]
+        return (a4, genre, i) if i < self.counts[(a4, genre)] else None
+
+    # ---- 页面 ----
+
+    def area_page(self):
+        sections = []
+        for region, prefs in self.regions:
+            items = []
+            for pref in prefs:
+                subs = []
+                for a3, a4s in self.area_tree[pref].items():
+                    links = "".join(f'<li><a href="/matome/{pref}/{a3}/{a4}/list/">細分{a4}</a></li>' for a4 in a4s)
+                    subs.append(f'<li><a href="/matome/{pref}/{a3}/list/">地区{a3}</a>'
+                                f'<ul class="sub-area-navi__list">{links}</ul></li>')
+                items.append(f'<li><a class="area-cat-navi__list-target" href="/matome/{pref}/list/">県{pref[4:]}</a>'
+                             f'<ul class="area-cat-list">{"".join(subs)}</ul></li>')
+            sections.append(f'<section class="area-cat-navi"><h2 class="area-cat-navi__title">{region}</h2>'
+                            f'<ul class="area-cat-navi__list">{"".join(items)}</ul></section>')
+        return _page("エリア一覧", "".join(sections))
+
+    def genre_page(self):
+        frames = []
+        for g, (top, mids) in enumerate(self.genre_tree.items(), 1):
+            items = []
+            for mid, leaves in mids.items():
+                links = "".join(f'<li><a href="/rstLst/{leaf}/">ジャンル{leaf[1:]}</a></li>' for leaf in leaves)
+                items.append(f'<div class="rst-janrelst__item"><h4 class="rst-janrelst__item2">'
+                             f'<a href="/rstLst/{mid}/">中類{mid[2:]}</a></h4><ul class="rst-janrelst__item3">{links}</ul></div>')
+            frames.append(f'<div class="rst-janrelst__frame"><h3 class="rst-janrelst__title">'
+                          f'<a href="/rstLst/{top}/">大類{g}</a></h3>{"".join(items)}</div>')
+        return _page("ジャンル一覧", "".join(frames))
+
+    def list_page(self, area_parts, genre, page, newest_first=False):
+        shops = self.shops(area_parts, genre)
+        if newest_first:
+            shops.reverse()
+        total = len(shops)
+        start = (page - 1) * PAGE_SIZE
+        if page > MAX_PAGES or (page > 1 and start >= total):
+            return None
+        cassettes = []
+        for a4, leaf, i in shops[start:start + PAGE_SIZE]:
+            rng = _rng(self.seed, a4, leaf, i)
+            shop_id = self.shop_id(a4, leaf, i)
+            cassettes.append(
+                f'<div class="list-rst js-rst-cassette-wrap">'
+                f'<a class="list-rst__rst-name-target" href="{self.shop_path(a4, leaf, i)}">店舗{shop_id}</a>'
+                f'<span class="c-rating__val">{rng.uniform(3.0, 4.2):.2f}</span>'
+                f'<em class="list-rst__rvw-count-num">{rng.randint(0, 800)}</em></div>'
+            )
+        shown = min(start + PAGE_SIZE, total)
+        controll = (f'<div class="list-controll clearfix"><p class="c-page-count">'
+                    f'<strong>{start + 1 if total else 0}</strong> ～ <strong>{shown}</strong> 件を表示 / '
+                    f'全 <strong>{total}</strong> 件</p></div>')
+        body = (f'<div id="container"><div class="rstlist-contents clearfix"><div class="flexible-rstlst"><div>'
+                f'{controll}{"".join(cassettes)}</div></div></div></div>')
+        return _page("一覧", body)
+
+    def detail_page(self, shop_id):
+        shop = self.shop(shop_id)
+        if shop is None:
+            return None
+        a4, genre, i = shop
+        pref, a3 = self.areas[a4]
+        rng = _rng(self.seed, a4, genre, i, "detail")
+        rows = [
+            ("店名", f"店舗{shop_id}"),
+            ("ジャンル", f"ジャンル{genre[1:]}"),
+            ("予算（口コミ集計）", "".join(f"<em>￥{low:,}～￥{low + step - 1:,}</em>" for low, step in (
+                (rng.choice([2000, 3000, 5000, 8000]), rng.choice([1000, 2000, 3000])),
+                (rng.choice([800, 1000, 1500]), 1000),
+            ))),
+            ("支払い方法", "カード可<p class=\"rstinfo-table__notice\">（VISA、Master）</p>"),
+            ("席数", f"{rng.randint(6, 120)}席"),
+            ("住所", f'<p class="rstinfo-table__address"><span><a href="/{pref}/">県{pref[4:]}</a></span>'
+                   f'<span><a href="/{pref}/{a3}/">市{a3}</a></span><span><a href="/{pref}/{a3}/{a4}/">町{a4}</a></span>'
+                   f'{rng.randint(1, 9)}-{rng.randint(1, 30)}-{rng.randint(1, 20)}</p>'),
+            ("電話番号", f'<strong class="rstinfo-table__tel-num">03-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}</strong>'),
+            ("オープン日", f"20{rng.randint(0, 24):02d}年{rng.randint(1, 12)}月{rng.randint(1, 28)}日"),
+        ]
+        table = "".join(f"<tr><th>{escape(th)}</th><td>{td}</td></tr>" for th, td in rows)
+        return _page(f"店舗{shop_id}", f'<div id="rst-data-head"><h3>店舗情報（詳細）</h3>'
+                                       f'<table class="rstinfo-table__table"><tbody>{table}</tbody></table></div>')
+
+
+def _page(title, body):
+    return f'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>{title}</title></head><body>{body}</body></html>'
+
+
+class Faults:
+    """延迟、随机 5xx、超过 max_rps 时 429（带 Retry-After）"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, max_rps=None, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window = int(time.monotonic())
+        self.in_window = 0
+
+    def decide(self):
+        """返回 (延迟秒数, 状态码)；状态码为 None 表示正常返回页面"""
+        with self.lock:
+            delay = self.rng.uniform(0.5, 1.5) * self.latency if self.latency else 0.0
+            if self.max_rps:
+                now = int(time.monotonic())
+                if now != self.window:
+                    self.window, self.in_window = now, 0
+                self.in_window += 1
+                if self.in_window > self.max_rps:
+                    return 0.0, 429
+            if self.error_rate and self.rng.random() < self.error_rate:
+                return delay, self.rng.choice((500, 502, 503))
+        return delay, None
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, kind, status):
+        with self.lock:
+            self.counts[(kind, status)] = self.counts.get((kind, status), 0) + 1
+
+    def report(self):
+        with self.lock:
+            return "，".join(f"{kind} {status}: {n}" for (kind, status), n in sorted(self.counts.items()))
+
+
+def make_handler(site, faults, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def route(self, path, query):
+            """返回 (页面类型, html)；html 为 None 表示 404"""
+            parts = [p for p in path.split("/") if p]
+            if path.startswith("/matome/area_lst"):
+                return "index", site.area_page()
+            if path.startswith("/cat_lst"):
+                return "index", site.genre_page()
+            if "rstLst" in parts:
+                i = parts.index("rstLst")
+                rest = parts[i + 1:]
+                if not rest:
+                    return "list", None
+                page = int(rest[1]) if len(rest) > 1 and rest[1].isdigit() else 1
+                newest_first = query.get("SrtT") == ["nod"]
+                return "list", site.list_page(parts[:i], rest[0], page, newest_first)
+            if len(parts) == 4:
+                return "detail", site.detail_page(parts[3])
+            return "other", None
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            kind, body = self.route(url.path, parse_qs(url.query))
+            delay, status = faults.decide()
+            if delay:
+                time.sleep(delay)
+            if status is None:
+                status = 200 if body is not None else 404
+            if status != 200:
+                body = _page(str(status), f"<h1>{status}</h1>")
+            data = body.encode("utf-8")
+            stats.add(kind, status)
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8765, host="127.0.0.1", site=None, faults=None):
+    """启动 mock 服务器（后台线程），返回 (server, stats)"""
+    stats = MockStats()
+    server = ThreadingHTTPServer((host, port), make_handler(site or MockSite(), faults or Faults(), stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-tabelog", daemon=True).start()
+    return server, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地的 tabelog 替身：合成的地区 / ジャンル一览、店铺一览和详情页，用于压测")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--prefectures", type=int, default=3, help="都道府県数（每个下面 3 个地区 × 2 个细分地区）")
+    parser.add_argument("--max-shops", type=int, default=1500, help="一个 细分地区 × ジャンル 最多的店铺数")
+    parser.add_argument("--empty-rate", type=float, default=0.6, help="0 件组合的比例")
+    parser.add_argument("--latency", type=float, default=0.05, help="平均响应延迟（秒），实际在 0.5～1.5 倍之间")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500/502/503 的比例")
+    parser.add_argument("--max-rps", type=int, help="每秒超过这么多请求时返回 429（Retry-After: 1）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    site = MockSite(prefectures=args.prefectures, max_shops=args.max_shops, empty_rate=args.empty_rate, seed=args.seed)
+    faults = Faults(args.latency, args.error_rate, args.max_rps, args.seed)
+    server, stats = serve(args.port, args.host, site, faults)
+    print(f"🧪 mock tabelog: http://{args.host}:{args.port}/  （{sum(site.counts.values())} 家店铺）")
+    print(f"   TABELOG_BASE_URL=http://{args.host}:{args.port} python getarea.py / getcatlog.py / getlist.py")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {stats.report()}")
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,186 @@
+import re
+import argparse
+import time
+
+DB_PATH = "tabelog.db"
+
+# 支払い方法的位标志
+PAY_CARD = 1
+PAY_EMONEY = 2
+PAY_QR = 4
+PAYMENT_PATTERNS = (
+    (PAY_CARD, re.compile(r"カード\s*(不可|可)")),
+    (PAY_EMONEY, re.compile(r"電子マネー\s*(不可|可)")),
+    (PAY_QR, re.compile(r"QRコード決済\s*(不可|可)")),
+)
+
+# 规范化后的列：(列名, 类型)，由 db_handler.COLUMNS 迁移到 shops 表
+NORMALIZED_COLUMNS = (
+    ("score_value", "REAL"),
+    ("review_count", "INTEGER"),
+    ("seat_count", "INTEGER"),
+    ("dinner_budget_min", "INTEGER"),
+    ("dinner_budget_max", "INTEGER"),
+    ("lunch_budget_min", "INTEGER"),
+    ("lunch_budget_max", "INTEGER"),
+    ("opened_on", "DATE"),
+    ("payment_flags", "INTEGER"),
+)
+
+# "カード可 （VISA、Master） QRコード決済可 （PayPay）" → 种类 + 括号里的具体品牌
+_PAYMENT_ITEM = re.compile(r"(カード|電子マネー|QRコード決済)\s*(不可|可)\s*(?:[（(]([^）)]*)[）)])?")
+_LIST_SEP = re.compile(r"[、,，/／]")
+
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+_SEATS = re.compile(r"(\d[\d,]*)\s*席")
+# 予算的每一段：夜 / 昼 标签、金额区间、没有数据时的 "-"
+_BUDGET_PART = re.compile(
+    r"(?P<label>[夜昼]|ディナー|ランチ)"
+    r"|(?:[￥¥](?P<lo>[\d,]+))?\s*[～〜~]\s*(?:[￥¥](?P<hi>[\d,]+))?"
+    r"|(?<!\S)[-－―ー](?!\S)"
+)
+_BUDGET_LABELS = {"夜": 0, "ディナー": 0, "昼": 1, "ランチ": 1}
+_OPEN_DATE = re.compile(r"(\d{4})年\s*(\d{1,2})月(?:\s*(\d{1,2})日)?")
+
+
+def _int(text):
+    return int(text.replace(",", "")) if text else None
+
+
+def parse_score(text):
+    """"3.58" → 3.58；"-" 等没有评分时返回 None"""
+    m = _NUMBER.search(text or "")
+    return float(m.group().replace(",", "")) if m else None
+
+
+def parse_reviews(text):
+    """"1,234" → 1234"""
+    m = _NUMBER.search(text or "")
+    return int(float(m.group().replace(",", ""))) if m else None
+
+
+def parse_seats(text):
+    """"42席（カウンター8席）" → 42（取第一个 N席）"""
+    m = _SEATS.search(text or "")
+    return _int(m.group(1)) if m else None
+
+
+def parse_budget(text):
+    """
+    "￥3,000～￥3,999 ￥1,000～￥1,999" → ((3000, 3999), (1000, 1999))
+    详情页的予算（口コミ集計）是 夜、昼 两段，按位置（或「夜」「昼」标签）分开解析，
+    没有数据的一段是 "-"：例 "- ￥1,000～￥1,999" 只有昼。"～￥999"、"￥10,000～" 缺的一端为 None。
+    """
+    slots = [(None, None), (None, None)]
+    position = 0
+    label = None
+    for m in _BUDGET_PART.finditer(text or ""):
+        if m.group("label"):
+            label = _BUDGET_LABELS[m.group("label")]
+            continue
+        slot = label if label is not None else position
+        if slot < len(slots):
+            slots[slot] = (_int(m.group("lo")), _int(m.group("hi")))
+        position = slot + 1
+        label = None
+    return slots[0], slots[1]
+
+
+def parse_open_date(text):
+    """"2015年3月10日" → "2015-03-10"；只有年月时取 1 日"""
+    m = _OPEN_DATE.search(text or "")
+    if not m:
+        return None
+    year, month, day = m.group(1), m.group(2), m.group(3) or "1"
+    return f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+
+
+def parse_payment(text):
+    """"カード可 電子マネー不可 QRコード決済可" → PAY_CARD | PAY_QR；完全没有信息时返回 None"""
+    if not text:
+        return None
+    flags = 0
+    for flag, pattern in PAYMENT_PATTERNS:
+        m = pattern.search(text)
+        if m and m.group(1) == "可":
+            flags |= flag
+    return flags
+
+
+def parse_payment_methods(text):
+    """"カード可 （VISA、Master） 電子マネー不可" → ["カード", "VISA", "Master"]（只取可用的）"""
+    methods = []
+    for kind, ok, brands in _PAYMENT_ITEM.findall(text or ""):
+        if ok != "可":
+            continue
+        methods.append(kind)
+        methods.extend(name.strip() for name in _LIST_SEP.split(brands) if name.strip())
+    return list(dict.fromkeys(methods))
+
+
+def split_genres(text):
+    """"ラーメン、つけ麺" → ["ラーメン", "つけ麺"]"""
+    return list(dict.fromkeys(name.strip() for name in _LIST_SEP.split(text or "") if name.strip()))
+
+
+def normalize_shop(shop_data: dict):
+    """由 shop_data 的原始文本算出规范化列，返回 {列名: 值}"""
+    (dinner_min, dinner_max), (lunch_min, lunch_max) = parse_budget(shop_data.get("budget"))
+    return {
+        "score_value": parse_score(shop_data.get("score")),
+        "review_count": parse_reviews(shop_data.get("reviews")),
+        "seat_count": parse_seats(shop_data.get("seats")),
+        "dinner_budget_min": dinner_min,
+        "dinner_budget_max": dinner_max,
+        "lunch_budget_min": lunch_min,
+        "lunch_budget_max": lunch_max,
+        "opened_on": parse_open_date(shop_data.get("open_date")),
+        "payment_flags": parse_payment(shop_data.get("payment")),
+    }
+
+
+def backfill(db_path=DB_PATH, chunk=1000):
+    """按 id 分块重新计算已有店铺的规范化列和 shop_genre / shop_payment，并回填 shop_catlog 的外键"""
+    from db_handler import TabelogDB  # db_handler 也 import 本模块，这里延迟导入
+
+    db = TabelogDB(db_path)
+    columns = [name for name, _ in NORMALIZED_COLUMNS]
+    sql = f"UPDATE shops SET {', '.join(f'{name} = ?' for name in columns)} WHERE id = ?"
+
+    start = time.monotonic()
+    last_id = 0
+    done = 0
+    while True:
+        rows = db.conn.execute("""
+            SELECT id, score, reviews, seats, budget, open_date, payment, category, genre FROM shops
+            WHERE id > ? ORDER BY id LIMIT ?
+        """, (last_id, chunk)).fetchall()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            values = normalize_shop(dict(row))
+            params.append(tuple(values[name] for name in columns) + (row["id"],))
+        db.conn.executemany(sql, params)
+        db.sync_shop_relations([(row["id"], dict(row)) for row in rows])
+        db.conn.commit()
+        last_id = rows[-1]["id"]
+        done += len(rows)
+        print(f"🔧 已规范化 {done} 家店铺")
+
+    print(f"🔗 shop_catlog 外键回填 {db.backfill_catlog_ids()} 行")
+    db.close()
+    print(f"✅ 回填完成：{done} 家，用时 {time.monotonic() - start:.1f}s")
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="把 shops 的原始文本解析成数值列 / 关联表")
+    parser.add_argument("--backfill", action="store_true", help="重新计算已有店铺的规范化列和关联表")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill(args.db)
+    else:
+        parser.print_help()
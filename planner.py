@@ -0,0 +1,168 @@
+import math
+import time
+import sqlite3
+from datetime import datetime, timedelta
+
+from db_handler import apply_pragmas
+from hierarchy import get_hierarchy
+
+DB_PATH = "tabelog.db"
+PROBE_TTL_DAYS = 7     # 上级组合的件数在这么多天内有效，不重复请求
+PAGE_SIZE = 20         # 一览每页店铺数
+MAX_PAGES = 60         # get_list 最多翻 60 页
+
+
+class CrawlPlanner:
+    """
+    采集计划：get_urls() 给出的是 level≥3 地区 × 叶子ジャンル 的全部组合，大部分是 0 件。
+    先从上级组合（都道府県 × 上级ジャンル → 都道府県 × 叶子ジャンル → 上级地区 × 叶子ジャンル）
+    读「全 N 件」，上级为 0 的组合下面的子组合全部剪掉；再按预计新增件数和 shop_list_summary
+    的陈旧程度排序，并在采集前输出请求预算。
+
+    count(url) 返回件数（取不到返回 None）；area_url(href) 把 area.href 转成 rstLst 的 URL。
+    dry_run=True 时只用已有的件数，不发请求。
+    """
+
+    def __init__(self, count, area_url, db_path=DB_PATH, ttl_days=PROBE_TTL_DAYS, dry_run=False):
+        self.count = count
+        self.area_url = area_url
+        self.ttl_days = ttl_days
+        self.dry_run = dry_run
+        self.areas = get_hierarchy("area", db_path)
+        self.genres = get_hierarchy("genre", db_path)
+        self.conn = sqlite3.connect(db_path)
+        apply_pragmas(self.conn)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crawl_plan_count (
+                url TEXT PRIMARY KEY,
+                total INTEGER,
+                counted_at TEXT
+            )
+        """)
+        self.conn.commit()
+        self.hrefs = {code: href for code, href in self.conn.execute(
+            "SELECT code, href FROM area WHERE is_deleted = 0 AND href IS NOT NULL AND href != ''")}
+        self.cutoff = (datetime.now() - timedelta(days=ttl_days)).strftime("%Y-%m-%d %H:%M:%S")
+        self.totals = {}
+        self.probes = 0
+        self.cache_hits = 0
+
+    def _combo_url(self, area, genre):
+        href = self.hrefs.get(area)
+        return self.area_url(href) + genre if href else None
+
+    def total(self, url):
+        """上级组合的件数：内存 → crawl_plan_count / shop_list_summary（未过期）→ 请求"""
+        if url in self.totals:
+            return self.totals[url]
+        row = self.conn.execute("""
+            SELECT total, counted_at FROM crawl_plan_count WHERE url = ? AND counted_at >= ?
+            UNION ALL
+            SELECT total_count, update_time FROM shop_list_summary
+            WHERE url = ? AND is_deleted = 0 AND update_time >= ? AND total_count IS NOT NULL
+            ORDER BY 2 DESC LIMIT 1
+        """, (url, self.cutoff, url, self.cutoff)).fetchone()
+        if row is not None:
+            self.cache_hits += 1
+            total = row[0]
+        elif self.dry_run:
+            total = None
+        else:
+            self.probes += 1
+            total = self.count(url)
+            if total is not None:
+                self.conn.execute("""
+                    INSERT INTO crawl_plan_count (url, total, counted_at) VALUES (?, ?, ?)
+                    ON CONFLICT(url) DO UPDATE SET total = excluded.total, counted_at = excluded.counted_at
+                """, (url, total, time.strftime('%Y-%m-%d %H:%M:%S')))
+                self.conn.commit()
+        self.totals[url] = total
+        return total
+
+    def probe_path(self, area, genre):
+        """
+        从上往下的探测路径（不含叶子组合本身）：
+        最上级地区 × ジャンル各层 → 地区各层 × 叶子ジャンル。
+        """
+        area_chain = [code for code in self.areas.ancestors(area) if code in self.hrefs] + [area]
+        genre_chain = self.genres.ancestors(genre) + [genre]
+        path = [(area_chain[0], g) for g in genre_chain]
+        path += [(a, genre) for a in area_chain[1:]]
+        return path[:-1]
+
+    def bound(self, url_info):
+        """沿探测路径取件数；任何一层为 0 返回 0，否则返回最近一层的件数（未知为 None）"""
+        bound = None
+        for area, genre in self.probe_path(url_info["area_code"], url_info["genre"]):
+            url = self._combo_url(area, genre)
+            if url is None:
+                continue
+            total = self.total(url)
+            if total == 0:
+                return 0
+            if total is not None:
+                bound = total
+        return bound
+
+    def summary(self, url):
+        row = self.conn.execute("""
+            SELECT total_count, get_count + skip_count, update_time FROM shop_list_summary
+            WHERE url = ? AND is_deleted = 0
+        """, (url,)).fetchone()
+        return row if row is not None else (None, 0, None)
+
+    def plan(self, urls, refresh=False):
+        """
+        返回 (排好序的 url_info list, 预算 dict)。
+        refresh=True（增量更新）时已收集完的组合也保留，只剪掉确定为 0 件的。
+        """
+        kept = []
+        pruned = 0
+        done = 0
+        for url_info in urls:
+            total, collected, updated = self.summary(url_info["url"])
+            fresh = updated is not None and updated >= self.cutoff
+            if fresh and total == 0:
+                pruned += 1
+                continue
+            if fresh and total is not None and collected >= total and not refresh:
+                done += 1
+                continue
+
+            bound = self.bound(url_info)
+            if bound == 0:
+                pruned += 1
+                continue
+
+            if total is not None and fresh:
+                expected = max(total - collected, 0) if not refresh else total
+            else:
+                expected = bound if bound is not None else PAGE_SIZE
+            kept.append((url_info, expected, updated or ""))
+
+        # 预计新增多的优先；一样多时最久没更新的优先
+        kept.sort(key=lambda item: (-item[1], item[2]))
+
+        budget = {
+            "combos": len(urls),
+            "kept": len(kept),
+            "pruned": pruned,
+            "done": done,
+            "probe_requests": self.probes,
+            "probe_cache_hits": self.cache_hits,
+            "count_requests": len(kept),
+            "list_requests": sum(min(MAX_PAGES, math.ceil(expected / PAGE_SIZE)) for _, expected, _ in kept),
+            "detail_requests": sum(min(expected, MAX_PAGES * PAGE_SIZE) for _, expected, _ in kept),
+        }
+        return [url_info for url_info, _, _ in kept], budget
+
+    def close(self):
+        self.conn.close()
+
+
+def format_budget(budget):
+    return (
+        f"组合 {budget['combos']} 个：保留 {budget['kept']}，剪枝 {budget['pruned']}，已完成 {budget['done']}\n"
+        f"计划请求：探测 {budget['probe_requests']}（缓存命中 {budget['probe_cache_hits']}），"
+        f"件数 {budget['count_requests']}，一览页约 {budget['list_requests']}，详情约 {budget['detail_requests']}"
+    )
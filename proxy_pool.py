@@ -0,0 +1,222 @@
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from db_handler import apply_pragmas
+from rate_limiter import RateController
+
+logger = logging.getLogger("tabelog.proxy")
+
+DB_PATH = "tabelog.db"
+PROXY_LIST_URL = "https://free-proxy-list.net/"
+TEST_URL = "https://httpbin.org/ip"
+
+DECAY = 0.8          # 分数衰减：新结果占 20%
+NEW_SCORE = 0.5      # 新代理的初始分数
+MIN_SCORE = 0.45     # 低于这个分数的代理不再分配（新代理第一次验证失败即低于此值）
+PROXY_RATE = 0.5     # 每个代理每秒最多请求数
+SAVE_INTERVAL = 30   # report() 只更新内存，后台每隔这么多秒把有变化的代理写进 tabelog.db
+
+
+def scrape_candidates(url=PROXY_LIST_URL):
+    """从 free-proxy-list.net 抓取高匿名 + HTTPS 的代理，返回 ["ip:port", ...]"""
+    import pandas as pd
+
+    dfs = pd.read_html(requests.get(url, timeout=10).text)
+    proxy_table = dfs[0]  # 取第一个表格（代理表）
+
+    # 筛选高匿名 + HTTPS 支持的代理
+    filtered = proxy_table[
+        (proxy_table["Anonymity"] == "elite proxy") &
+        (proxy_table["Https"] == "yes")
+    ]
+
+    # 拼接为 IP:Port
+    return filtered.apply(lambda row: f"{row['IP Address']}:{row['Port']}", axis=1).tolist()
+
+
+def requests_proxies(proxy):
+    return {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+
+
+def check_proxy(proxy, test_url=TEST_URL, timeout=5):
+    """通过代理请求 test_url，返回 (是否可用, 延迟秒数)"""
+    start = time.monotonic()
+    try:
+        r = requests.get(test_url, proxies=requests_proxies(proxy), timeout=timeout)
+        return r.status_code == 200, time.monotonic() - start
+    except requests.RequestException:
+        return False, None
+
+
+class ProxyPool:
+    """
+    代理池：并发验证、按成功率/延迟打分（指数衰减）、后台定期复验、保存在 tabelog.db 的 proxy 表。
+    爬虫用 acquire() 取代理（每个代理单独限速），请求结束后用 report() 反馈结果。
+    分数保存在内存里，有变化的代理由后台线程每 save_interval 秒（以及 close 时）批量写库，
+    请求线程不碰 tabelog.db，不会被别的连接未提交的写入卡住。
+    """
+
+    def __init__(self, db_path=DB_PATH, test_url=TEST_URL, timeout=5, workers=64,
+                 min_score=MIN_SCORE, proxy_rate=PROXY_RATE, rng=None, save_interval=SAVE_INTERVAL):
+        self.test_url = test_url
+        self.timeout = timeout
+        self.workers = workers
+        self.min_score = min_score
+        self.rng = rng or random.Random()
+        self.lock = threading.Lock()
+        self.proxies = {}
+        self.dirty = {}      # address -> 上次写库后是否有成功的请求（决定 last_success 是否更新）
+        self._save_lock = threading.Lock()
+        # 每个代理一个令牌桶（固定速率，不做 AIMD 加速）
+        self.rate = RateController(rate=proxy_rate, max_rate=proxy_rate, burst=1)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        apply_pragmas(self.conn)
+        self._create_table()
+        self._load()
+        self._saver = threading.Thread(target=self._save_loop, args=(save_interval,), name="proxy-save", daemon=True)
+        self._saver.start()
+
+    def _create_table(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS proxy (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                address TEXT UNIQUE,
+                score REAL DEFAULT 0,
+                latency REAL,
+                success_count INTEGER DEFAULT 0,
+                failure_count INTEGER DEFAULT 0,
+                last_check TEXT,
+                last_success TEXT,
+                is_deleted INTEGER DEFAULT 0,
+                create_time TEXT DEFAULT CURRENT_TIMESTAMP,
+                update_time TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.conn.commit()
+
+    def _load(self):
+        rows = self.conn.execute("""
+            SELECT address, score, latency, success_count, failure_count
+            FROM proxy WHERE is_deleted = 0
+        """).fetchall()
+        for address, score, latency, success, failure in rows:
+            self.proxies[address] = {"score": score, "latency": latency, "success": success, "failure": failure}
+
+    def _record(self, proxy, ok, latency):
+        """更新一个代理的分数（内存），记为待写库"""
+        state = self.proxies.setdefault(proxy, {"score": NEW_SCORE, "latency": None, "success": 0, "failure": 0})
+        state["score"] = DECAY * state["score"] + (1 - DECAY) * (1.0 if ok else 0.0)
+        if ok:
+            state["success"] += 1
+            if latency is not None:
+                state["latency"] = latency if state["latency"] is None else DECAY * state["latency"] + (1 - DECAY) * latency
+        else:
+            state["failure"] += 1
+        self.dirty[proxy] = self.dirty.get(proxy, False) or ok
+
+    def _save(self, rows):
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.conn.executemany("""
+            INSERT INTO proxy (address, score, latency, success_count, failure_count, last_check, last_success,
+                               create_time, update_time)
+            VALUES (?, ?, ?, ?, ?, ?, CASE WHEN ? THEN ? END, ?, ?)
+            ON CONFLICT(address) DO UPDATE SET
+                score = excluded.score, latency = excluded.latency,
+                success_count = excluded.success_count, failure_count = excluded.failure_count,
+                last_check = excluded.last_check,
+                last_success = COALESCE(excluded.last_success, proxy.last_success),
+                update_time = excluded.update_time
+        """, [(proxy, score, latency, success, failure, now, ok, now, now, now)
+              for proxy, score, latency, success, failure, ok in rows])
+        self.conn.commit()
+
+    def flush(self):
+        """把有变化的代理写库；写失败（database is locked 等）时留在内存里下次再写"""
+        with self._save_lock:
+            with self.lock:
+                dirty, self.dirty = self.dirty, {}
+                rows = [(proxy, self.proxies[proxy]["score"], self.proxies[proxy]["latency"],
+                         self.proxies[proxy]["success"], self.proxies[proxy]["failure"], ok)
+                        for proxy, ok in dirty.items()]
+            if not rows:
+                return
+            try:
+                self._save(rows)
+            except sqlite3.Error as e:
+                if self.conn.in_transaction:
+                    self.conn.rollback()
+                with self.lock:
+                    for proxy, ok in dirty.items():
+                        self.dirty[proxy] = self.dirty.get(proxy, False) or ok
+                logger.warning("⚠️ 代理分数写库失败，稍后重试：%s", e)
+
+    def _save_loop(self, interval):
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def validate_all(self, proxies=None):
+        """并发验证代理（默认验证池里全部代理），返回可用的代理 list"""
+        proxies = list(self.proxies) if proxies is None else list(dict.fromkeys(proxies))
+        if not proxies:
+            return []
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(proxies))) as executor:
+            results = list(executor.map(lambda p: check_proxy(p, self.test_url, self.timeout), proxies))
+
+        with self.lock:
+            for proxy, (ok, latency) in zip(proxies, results):
+                self._record(proxy, ok, latency)
+        self.flush()
+
+        valid = [proxy for proxy, (ok, _) in zip(proxies, results) if ok]
+        logger.info("🧪 验证 %d 个代理，可用 %d 个，用时 %.1fs", len(proxies), len(valid), time.monotonic() - start)
+        return valid
+
+    def start_revalidation(self, interval=600):
+        """后台线程每 interval 秒复验一次全部代理"""
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.validate_all()
+                except Exception as e:
+                    logger.error("❌ 代理复验失败：%s - %s", type(e).__name__, e)
+
+        self._thread = threading.Thread(target=loop, name="proxy-revalidate", daemon=True)
+        self._thread.start()
+
+    def healthy(self):
+        with self.lock:
+            return sorted((p for p, s in self.proxies.items() if s["score"] >= self.min_score),
+                          key=lambda p: self.proxies[p]["score"], reverse=True)
+
+    def acquire(self):
+        """按分数加权随机选一个健康代理并等待它的令牌；没有可用代理返回 None"""
+        with self.lock:
+            candidates = [(p, s["score"]) for p, s in self.proxies.items() if s["score"] >= self.min_score]
+        if not candidates:
+            return None
+        proxy = self.rng.choices([p for p, _ in candidates], weights=[w for _, w in candidates])[0]
+        self.rate.wait(f"http://{proxy}")
+        return proxy
+
+    def report(self, proxy, ok, latency=None):
+        """爬虫反馈一次代理请求的结果（只更新内存）"""
+        with self.lock:
+            self._record(proxy, ok, latency)
+
+    def close(self):
+        self._stop.set()
+        self._saver.join()
+        self.flush()
+        self.conn.close()
+
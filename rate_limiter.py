@@ -0,0 +1,205 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# 这些状态码表示“请慢一点”，触发降速和重试
+THROTTLE_STATUS = (429, 503)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+logger = logging.getLogger("tabelog.rate")
+
+
+class Clock:
+    """真实时钟；单元测试时换成 FakeClock"""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+class FakeClock(Clock):
+    """假时钟：sleep 只推进时间，不真的等待"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.slept.append(seconds)
+            self.now += seconds
+
+
+class TokenBucket:
+    """
+    单个 host 的令牌桶，rate 按 AIMD 调整：
+    - 成功且响应快：rate 加 increase（加法增大）
+    - 429/503/超时：rate 乘 decrease（乘法减小）
+    - 响应变慢（超过 slow_latency）：rate 乘 slow_decrease
+    """
+
+    def __init__(self, clock, rate=1.0, burst=2, min_rate=0.1, max_rate=10.0,
+                 increase=0.1, decrease=0.5, slow_latency=5.0, slow_decrease=0.9):
+        self.clock = clock
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.slow_latency = slow_latency
+        self.slow_decrease = slow_decrease
+        self.tokens = burst
+        self.last = clock.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = self.clock.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        return now
+
+    def reserve(self):
+        """预约一个令牌，返回需要等待的秒数（可以为 0）"""
+        now = self._refill()
+        self.tokens -= 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        # Retry-After 指定的封锁期内一律等到期
+        return max(wait, self.blocked_until - now)
+
+    def on_success(self, latency):
+        if latency is not None and latency > self.slow_latency:
+            self.rate = max(self.min_rate, self.rate * self.slow_decrease)
+        else:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # 已攒的令牌作废，防止降速后马上又连发
+        self.tokens = min(self.tokens, 0)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, self.clock.monotonic() + retry_after)
+
+
+class Backoff:
+    """指数退避 + full jitter：第 n 次重试等待 uniform(0, min(cap, base * 2^n))"""
+
+    def __init__(self, base=1.0, cap=60.0, rng=None):
+        self.base = base
+        self.cap = cap
+        self.rng = rng or random.Random()
+
+    def delay(self, attempt):
+        return self.rng.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class RetryableError(Exception):
+    """fetch 函数抛出它表示这次请求可以重试（如 429/503）"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class RateController:
+    """
+    所有抓取的统一限速入口：每个 host 一个 AIMD 令牌桶，失败按指数退避重试。
+    同步代码用 wait()/call()，asyncio 代码用 reserve() 拿到等待秒数后自己 await sleep。
+    """
+
+    def __init__(self, clock=None, backoff=None, max_retries=3, **bucket_kwargs):
+        self.clock = clock or Clock()
+        self.backoff = backoff or Backoff()
+        self.max_retries = max_retries
+        self.bucket_kwargs = bucket_kwargs
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlparse(url).netloc or url
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.clock, **self.bucket_kwargs)
+            return self.buckets[host]
+
+    def reserve(self, url):
+        bucket = self.bucket(url)
+        with self.lock:
+            return bucket.reserve()
+
+    def wait(self, url):
+        self.clock.sleep(self.reserve(url))
+
+    def record(self, url, latency=None, status=None, timeout=False, retry_after=None):
+        """记录一次请求结果，调整该 host 的速率"""
+        bucket = self.bucket(url)
+        with self.lock:
+            if timeout or status in THROTTLE_STATUS:
+                bucket.on_throttle(retry_after)
+            elif status is None or status < 500:
+                bucket.on_success(latency)
+
+    def retry_delay(self, attempt):
+        return self.backoff.delay(attempt)
+
+    def call(self, url, func):
+        """
+        限速执行 func()（通常是一次 HTTP/driver.get），
+        func 抛 RetryableError 或 TimeoutError 时退避重试，最多 max_retries 次。
+        """
+        attempt = 0
+        while True:
+            self.wait(url)
+            start = self.clock.monotonic()
+            try:
+                result = func()
+            except RetryableError as e:
+                self.record(url, status=e.status, retry_after=e.retry_after)
+                error = e
+            except TimeoutError as e:
+                self.record(url, timeout=True)
+                error = e
+            else:
+                self.record(url, latency=self.clock.monotonic() - start)
+                return result
+
+            if attempt >= self.max_retries:
+                raise error
+            delay = self.retry_delay(attempt)
+            logger.info("⏳ %s 第 %d 次重试，%.1fs 后（%s）", url, attempt + 1, delay, error)
+            self.clock.sleep(delay)
+            attempt += 1
+
+    def rates(self):
+        with self.lock:
+            return {host: round(bucket.rate, 3) for host, bucket in self.buckets.items()}
+
+
+def parse_retry_after(value):
+    """Retry-After 头（秒数形式），解析不了返回 None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    """进程内共用的 RateController"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = RateController()
+        return _controller
@@ -0,0 +1,236 @@
+import sqlite3
+import argparse
+
+import hierarchy
+
+DB_PATH = "tabelog.db"
+
+# 予算（夜，dinner_budget_min）的分桶下限；-1 桶表示没有予算信息
+BUDGET_BUCKETS = (0, 1000, 2000, 3000, 5000, 8000, 10000, 15000, 20000, 30000)
+SCORE_BUCKET_SIZE = 0.01   # 评分直方图的精度（tabelog 的评分是两位小数）
+
+# area × genre 的聚合表：shop_count / score_sum / review_sum 等可以直接相加，
+# 分位数和予算分布放在直方图表里，上卷到上级地区 / ジャンル时按桶相加即可。
+ROLLUP_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS shop_rollup (
+        area TEXT NOT NULL,
+        genre TEXT NOT NULL,
+        shop_count INTEGER DEFAULT 0,
+        score_count INTEGER DEFAULT 0,
+        score_sum REAL DEFAULT 0,
+        review_sum INTEGER DEFAULT 0,
+        PRIMARY KEY (area, genre)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS shop_rollup_hist (
+        area TEXT NOT NULL,
+        genre TEXT NOT NULL,
+        kind TEXT NOT NULL,          -- 'score'：bucket = 评分 * 100；'budget'：bucket = BUDGET_BUCKETS 的下标
+        bucket INTEGER NOT NULL,
+        n INTEGER DEFAULT 0,
+        PRIMARY KEY (area, genre, kind, bucket)
+    ) WITHOUT ROWID
+    """,
+)
+
+_SCORE_BUCKET_SQL = f"CAST(ROUND({{0}}.score_value / {SCORE_BUCKET_SIZE}) AS INTEGER)"
+_BUDGET_BUCKET_SQL = "CASE WHEN {0}.dinner_budget_min IS NULL THEN -1 " + " ".join(
+    f"WHEN {{0}}.dinner_budget_min < {upper} THEN {i}" for i, upper in enumerate(BUDGET_BUCKETS[1:])
+) + f" ELSE {len(BUDGET_BUCKETS) - 1} END"
+
+
+def _apply_sql(row, sign):
+    """把 row（NEW / OLD）的贡献以 sign（+1 / -1）计入聚合表的语句"""
+    cond = f"{row}.is_deleted = 0 AND {row}.area IS NOT NULL AND {row}.genre IS NOT NULL"
+    return f"""
+        INSERT INTO shop_rollup (area, genre, shop_count, score_count, score_sum, review_sum)
+        SELECT {row}.area, {row}.genre, {sign}, {sign} * ({row}.score_value IS NOT NULL),
+               {sign} * COALESCE({row}.score_value, 0), {sign} * COALESCE({row}.review_count, 0)
+        WHERE {cond}
+        ON CONFLICT(area, genre) DO UPDATE SET
+            shop_count = shop_count + excluded.shop_count, score_count = score_count + excluded.score_count,
+            score_sum = score_sum + excluded.score_sum, review_sum = review_sum + excluded.review_sum;
+        INSERT INTO shop_rollup_hist (area, genre, kind, bucket, n)
+        SELECT {row}.area, {row}.genre, 'score', {_SCORE_BUCKET_SQL.format(row)}, {sign}
+        WHERE {cond} AND {row}.score_value IS NOT NULL
+        ON CONFLICT(area, genre, kind, bucket) DO UPDATE SET n = n + excluded.n;
+        INSERT INTO shop_rollup_hist (area, genre, kind, bucket, n)
+        SELECT {row}.area, {row}.genre, 'budget', {_BUDGET_BUCKET_SQL.format(row)}, {sign}
+        WHERE {cond}
+        ON CONFLICT(area, genre, kind, bucket) DO UPDATE SET n = n + excluded.n;
+    """
+
+
+# shops 每写一行，触发器就把旧值减掉、新值加上（与 insert_or_update_shop 在同一个事务里）
+ROLLUP_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_shops_rollup_insert AFTER INSERT ON shops
+    BEGIN {_apply_sql("NEW", 1)} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_shops_rollup_update
+    AFTER UPDATE OF area, genre, score_value, review_count, dinner_budget_min, is_deleted ON shops
+    WHEN OLD.area IS NOT NEW.area OR OLD.genre IS NOT NEW.genre
+      OR OLD.score_value IS NOT NEW.score_value OR OLD.review_count IS NOT NEW.review_count
+      OR OLD.dinner_budget_min IS NOT NEW.dinner_budget_min OR OLD.is_deleted IS NOT NEW.is_deleted
+    BEGIN {_apply_sql("OLD", -1)} {_apply_sql("NEW", 1)} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_shops_rollup_delete AFTER DELETE ON shops
+    BEGIN {_apply_sql("OLD", -1)} END
+    """,
+)
+
+
+def install(conn):
+    """建聚合表和触发器；聚合表第一次创建时用现有 shops 全量计算一次（由 db_handler.migrate_schema 调用）"""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='shop_rollup'").fetchone()
+    for ddl in ROLLUP_TABLES + ROLLUP_TRIGGERS:
+        conn.execute(ddl)
+    if not exists:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """从 shops 全量重算聚合表（数据修复用）"""
+    conn.execute("DELETE FROM shop_rollup")
+    conn.execute("DELETE FROM shop_rollup_hist")
+    where = "WHERE s.is_deleted = 0 AND s.area IS NOT NULL AND s.genre IS NOT NULL"
+    conn.execute(f"""
+        INSERT INTO shop_rollup (area, genre, shop_count, score_count, score_sum, review_sum)
+        SELECT s.area, s.genre, COUNT(*), COUNT(s.score_value), COALESCE(SUM(s.score_value), 0),
+               COALESCE(SUM(s.review_count), 0)
+        FROM shops s {where}
+        GROUP BY s.area, s.genre
+    """)
+    conn.execute(f"""
+        INSERT INTO shop_rollup_hist (area, genre, kind, bucket, n)
+        SELECT s.area, s.genre, 'score', {_SCORE_BUCKET_SQL.format("s")} AS bucket, COUNT(*)
+        FROM shops s {where} AND s.score_value IS NOT NULL
+        GROUP BY s.area, s.genre, bucket
+    """)
+    conn.execute(f"""
+        INSERT INTO shop_rollup_hist (area, genre, kind, bucket, n)
+        SELECT s.area, s.genre, 'budget', {_BUDGET_BUCKET_SQL.format("s")} AS bucket, COUNT(*)
+        FROM shops s {where}
+        GROUP BY s.area, s.genre, bucket
+    """)
+    conn.commit()
+
+
+# 分组键：shops.area / shops.genre 是采集时的最底层 code（层级不一定相同），
+# 上级通过 {table}_closure 找到指定 level 的祖先（默认 1：都道府県 / 大ジャンル），多跳也一次 join 到位
+GROUP_KEYS = {
+    "area": "r.area",
+    "parent_area": "pa.ancestor",
+    "genre": "r.genre",
+    "parent_genre": "pg.ancestor",
+}
+PARENT_JOINS = (("parent_area", "area", "pa", "r.area"), ("parent_genre", "genre", "pg", "r.genre"))
+
+
+def _ancestor_join(table, alias, column):
+    # p 是祖先自己那一行（depth = 0），它的 level 就是祖先的层级；树结构下每个节点在一层最多一个祖先
+    return f"""
+        LEFT JOIN (
+            SELECT c.descendant, c.ancestor FROM {table}_closure c
+            JOIN {table}_closure p ON p.ancestor = c.ancestor AND p.descendant = c.ancestor
+            WHERE p.level = ?
+        ) {alias} ON {alias}.descendant = {column}"""
+
+
+def _from_where(conn, by, filters, level):
+    used = {by, *filters}
+    sql, params = "", []
+    for key, table, alias, column in PARENT_JOINS:
+        if key in used:
+            if not hierarchy.has_closure(conn, table):
+                hierarchy.rebuild_closure(conn, table)
+            sql += _ancestor_join(table, alias, column)
+            params.append(level)
+    where = [f"{GROUP_KEYS[key]} = ?" for key in filters]
+    return sql + (" WHERE " + " AND ".join(where) if where else ""), params + list(filters.values())
+
+
+def _percentile(hist, q):
+    """hist: [(bucket, n)]（bucket 升序），返回第 q 分位所在桶对应的评分"""
+    total = sum(n for _, n in hist)
+    if total <= 0:
+        return None
+    target = q * total
+    seen = 0
+    for bucket, n in hist:
+        seen += n
+        if seen >= target:
+            return round(bucket * SCORE_BUCKET_SIZE, 2)
+    return round(hist[-1][0] * SCORE_BUCKET_SIZE, 2)
+
+
+def summary(conn, by="area", level=1, **filters):
+    """
+    按 by（area / parent_area / genre / parent_genre）分组返回聚合结果，
+    filters 同样用这四个键筛选，例：summary(conn, "genre", parent_area="tokyo")。
+    parent_area / parent_genre 指第 level 层的祖先，例：summary(conn, "parent_area", level=2) 按市区町村汇总。
+    每行：key, shop_count, avg_score, p50_score, p90_score, review_sum, budget（{桶下限: 件数}，None 为未知）。
+    只读聚合表，行数是 O(地区 × ジャンル)，与店铺数无关。
+    """
+    if by not in GROUP_KEYS or any(key not in GROUP_KEYS for key in filters):
+        raise ValueError(f"分组 / 筛选键只能是 {tuple(GROUP_KEYS)}")
+    key = GROUP_KEYS[by]
+    from_where, params = _from_where(conn, by, filters, level)
+
+    rows = conn.execute(f"""
+        SELECT {key}, SUM(r.shop_count), SUM(r.score_count), SUM(r.score_sum), SUM(r.review_sum)
+        FROM shop_rollup r {from_where}
+        GROUP BY {key}
+        HAVING SUM(r.shop_count) > 0
+        ORDER BY SUM(r.shop_count) DESC
+    """, params).fetchall()
+
+    hist = {}
+    for group, kind, bucket, n in conn.execute(f"""
+        SELECT {key}, r.kind, r.bucket, SUM(r.n)
+        FROM shop_rollup_hist r {from_where}
+        GROUP BY {key}, r.kind, r.bucket
+        HAVING SUM(r.n) > 0
+        ORDER BY r.bucket
+    """, params):
+        hist.setdefault((group, kind), []).append((bucket, n))
+
+    result = []
+    for group, shop_count, score_count, score_sum, review_sum in rows:
+        scores = hist.get((group, "score"), [])
+        budget = {(BUDGET_BUCKETS[b] if b >= 0 else None): n for b, n in hist.get((group, "budget"), [])}
+        result.append({
+            "key": group,
+            "shop_count": shop_count,
+            "avg_score": round(score_sum / score_count, 3) if score_count else None,
+            "p50_score": _percentile(scores, 0.5),
+            "p90_score": _percentile(scores, 0.9),
+            "review_sum": review_sum,
+            "budget": budget,
+        })
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="area × genre 聚合查询")
+    parser.add_argument("--by", choices=tuple(GROUP_KEYS), default="parent_area")
+    for name in GROUP_KEYS:
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, help=f"按 {name} 筛选")
+    parser.add_argument("--level", type=int, default=1, help="parent_area / parent_genre 上卷到的层级")
+    parser.add_argument("--rebuild", action="store_true", help="从 shops 全量重算聚合表")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        rebuild(conn)
+        print("✅ 聚合表已重算")
+    filters = {name: getattr(args, name) for name in GROUP_KEYS if getattr(args, name)}
+    for row in summary(conn, args.by, args.level, **filters):
+        print(f"{row['key']}\t{row['shop_count']} 家\t平均 {row['avg_score']}\tP50 {row['p50_score']}"
+              f"\tP90 {row['p90_score']}\t口コミ {row['review_sum']}")
+    conn.close()
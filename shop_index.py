@@ -0,0 +1,111 @@
+import hashlib
+import math
+import sys
+
+
+class ShopUrlIndex:
+    """
+    shops.url 的内存成员索引，代替每个链接一次的 SELECT id FROM shops WHERE url = ?。
+
+    mode="set"   : 精确的 set，命中/未命中都不用再查库
+    mode="bloom" : Bloom filter，内存小很多；未命中一定不存在，命中需要回查数据库
+    """
+
+    def __init__(self, mode="set", capacity=1_000_000, error_rate=0.001):
+        if mode not in ("set", "bloom"):
+            raise ValueError(f"unknown index mode: {mode}")
+        self.mode = mode
+        self.count = 0
+        if mode == "set":
+            self.urls = set()
+        else:
+            capacity = max(capacity, 1)
+            # 标准 Bloom filter 参数：m = -n ln p / (ln2)^2, k = m/n ln2
+            self.bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+            self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+            self.bitmap = bytearray((self.bits + 7) // 8)
+            self.capacity = capacity
+            self.error_rate = error_rate
+
+    @property
+    def exact(self):
+        return self.mode == "set"
+
+    def _positions(self, url):
+        # double hashing：两个 64bit hash 组合出 k 个位置
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def add(self, url):
+        if not url:
+            return
+        if self.mode == "set":
+            if url not in self.urls:
+                self.urls.add(url)
+                self.count += 1
+            return
+        for pos in self._positions(url):
+            self.bitmap[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def __contains__(self, url):
+        """set 模式下是确定结果；bloom 模式下 True 只表示“可能存在”"""
+        if self.mode == "set":
+            return url in self.urls
+        return all(self.bitmap[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(url))
+
+    def memory_bytes(self):
+        if self.mode == "set":
+            return sys.getsizeof(self.urls) + sum(sys.getsizeof(url) for url in self.urls)
+        return sys.getsizeof(self.bitmap)
+
+    def memory_report(self):
+        size = self.memory_bytes()
+        report = {
+            "mode": self.mode,
+            "urls": self.count,
+            "bytes": size,
+            "bytes_per_url": round(size / self.count, 1) if self.count else 0,
+        }
+        if self.mode == "bloom":
+            report["bits"] = self.bits
+            report["hashes"] = self.hashes
+            # 当前装载量下的实际误判率估计
+            report["est_false_positive"] = (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+        return report
+
+    @classmethod
+    def load(cls, conn, mode="set", error_rate=0.001):
+        """从 shops 表加载全部 url（游标逐行读取，不一次性 fetchall）"""
+        capacity = 1_000_000
+        if mode == "bloom":
+            total = conn.execute("SELECT COUNT(*) FROM shops").fetchone()[0]
+            # 预留一倍余量给本次采集新增的店铺
+            capacity = max(capacity, total * 2)
+        index = cls(mode, capacity=capacity, error_rate=error_rate)
+        for (url,) in conn.execute("SELECT url FROM shops WHERE url IS NOT NULL"):
+            index.add(url)
+        return index
+
+
+def format_report(report):
+    mb = report["bytes"] / 1024 / 1024
+    line = f"{report['mode']:>5}: {report['urls']} 个 url，{mb:.1f} MB（{report['bytes_per_url']} bytes/url）"
+    if report["mode"] == "bloom":
+        line += f"，k={report['hashes']}，误判率≈{report['est_false_positive']:.5f}"
+    return line
+
+
+if __name__ == "__main__":
+    # 对现有 tabelog.db 输出两种索引的内存占用
+    import sqlite3
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "tabelog.db")
+    for mode in ("set", "bloom"):
+        print("📊", format_report(ShopUrlIndex.load(conn, mode).memory_report()))
+    conn.close()
@@ -0,0 +1,303 @@
+from lxml import html as lxml_html
+from lxml.cssselect import CSSSelector
+
+# 预编译的选择器（与 getlist.py 中 Selenium 使用的 CSS 一致）
+SEL_CASSETTE = CSSSelector("div.list-rst.js-rst-cassette-wrap")
+SEL_RST_NAME = CSSSelector("a.list-rst__rst-name-target")
+SEL_SCORE = CSSSelector("span.c-rating__val")
+SEL_REVIEWS = CSSSelector("em.list-rst__rvw-count-num")
+SEL_LIST_CONTROLL = CSSSelector("div.list-controll")
+SEL_PAGE_COUNT_STRONG = CSSSelector(".c-page-count strong")
+SEL_ADDRESS = CSSSelector("p.rstinfo-table__address")
+SEL_TEL = CSSSelector("strong.rstinfo-table__tel-num")
+SEL_DETAIL_HEAD = CSSSelector("#rst-data-head")
+SEL_DETAIL_TABLE = CSSSelector("#rst-data-head table.rstinfo-table__table")
+SEL_NOTICE = CSSSelector("p.rstinfo-table__notice")
+
+
+def _text(elem):
+    """取元素文本，并把连续空白压缩成一个空格（近似 Selenium 的 .text）"""
+    if elem is None:
+        return ""
+    return " ".join(elem.text_content().split())
+
+
+def load_html(html: str, base_url: str = None):
+    """解析 HTML，返回 lxml 文档；内容为空或无法解析时返回 None"""
+    if not html:
+        return None
+    try:
+        doc = lxml_html.fromstring(html)
+    except Exception:
+        return None
+    if base_url:
+        doc.make_links_absolute(base_url)
+    return doc
+
+
+def parse_page_count(html: str):
+    """
+    从一览页解析「全 N 件」。
+    找不到计数区域（可能需要 JS 渲染）时返回 None。
+    """
+    doc = load_html(html)
+    if doc is None:
+        return None
+
+    controlls = SEL_LIST_CONTROLL(doc)
+    if not controlls:
+        return None
+
+    strongs = SEL_PAGE_COUNT_STRONG(controlls[0])
+    if not strongs:
+        return None
+
+    try:
+        return int(_text(strongs[-1]).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_cassette(rst):
+    """解析单个店铺卡片，返回 name/link/score/reviews"""
+    names = SEL_RST_NAME(rst)
+    if not names:
+        return None
+
+    score = "0"
+    elems = SEL_SCORE(rst)
+    if elems:
+        score = _text(elems[0])
+
+    reviews = "0"
+    elems = SEL_REVIEWS(rst)
+    if elems:
+        reviews = _text(elems[0])
+
+    return {
+        "name": _text(names[0]),
+        "link": names[0].get("href", "").strip(),
+        "score": score,
+        "reviews": reviews,
+    }
+
+
+def parse_list_page(html: str, base_url: str = None):
+    """
+    解析一览页的所有店铺卡片。
+    页面里没有一览结构（需要 JS 或被拦截）时返回 None，调用方应回退到 Selenium。
+    """
+    doc = load_html(html, base_url)
+    if doc is None:
+        return None
+
+    cassettes = SEL_CASSETTE(doc)
+    if not cassettes and not SEL_LIST_CONTROLL(doc):
+        return None
+
+    shops = []
+    for rst in cassettes:
+        shop = parse_cassette(rst)
+        if shop:
+            shops.append(shop)
+    return shops
+
+
+def split_address(full_text, tag_texts):
+    """地址全文 + 前几个链接（都道府県 / 市区町村 / 町名）→ 地址 dict，剩下的就是番地"""
+    prefecture = tag_texts[0] if len(tag_texts) > 0 else ""
+    city       = tag_texts[1] if len(tag_texts) > 1 else ""
+    town       = tag_texts[2] if len(tag_texts) > 2 else ""
+
+    # 剩下的就是番地（原始地址去掉已知部分）
+    detail = full_text
+    for tag in [prefecture, city, town]:
+        detail = detail.replace(tag, "")
+    detail = detail.strip()
+
+    return {
+        "prefecture": prefecture,
+        "city": city,
+        "town": town,
+        "detail": detail,
+        "full": full_text
+    }
+
+
+def parse_address(doc):
+    elems = SEL_ADDRESS(doc)
+    if not elems:
+        return split_address("", [])
+
+    addr_elem = elems[0]
+    return split_address(_text(addr_elem), [_text(a) for a in addr_elem.findall(".//a")[:3]])
+
+
+def parse_detail_table(doc):
+    data = {
+        "category": "",
+        "budget": "",
+        "payment": "",
+        "seats": "",
+        "open_date": "",
+    }
+
+    for table in SEL_DETAIL_TABLE(doc):
+        for row in table.iter("tr"):
+            th_elem = row.find(".//th")
+            td = row.find(".//td")
+            if th_elem is None or td is None:
+                continue
+
+            th = _text(th_elem)
+            value = _text(td)
+            notices = SEL_NOTICE(td)
+            if notices:
+                value = f"{value}（{_text(notices[0])}）"
+
+            if "ジャンル" in th:
+                data["category"] = value
+            elif th == "予算（口コミ集計）":
+                values = [_text(em) or "-" for em in td.iter("em")]  # 空的一段保留为 "-"，夜 / 昼 的位置不错开
+                data["budget"] = " ".join(values)
+            elif "支払い方法" in th:
+                data["payment"] = value
+            elif "席数" in th:
+                data["seats"] = value
+            elif "オープン日" in th:
+                data["open_date"] = value
+
+    return data
+
+
+def parse_detail_page(html: str):
+    """
+    解析店铺详情页，返回与 getlist.get_detail_info 相同结构的 dict。
+    没有『店舗情報（詳細）』区域时返回 None，调用方应回退到 Selenium。
+    """
+    doc = load_html(html)
+    if doc is None or not SEL_DETAIL_HEAD(doc):
+        return None
+
+    addr = parse_address(doc)
+
+    tel = ""
+    elems = SEL_TEL(doc)
+    if elems:
+        tel = _text(elems[0])
+
+    data = parse_detail_table(doc)
+    return {**addr, "tel": tel, **data}
+
+
+def detail_from_script(result):
+    """
+    getlist.JS_SHOP_DETAIL（Selenium 一次 execute_script 取出的地址、电话、表格各行）
+    → 与 parse_detail_page 相同结构的 dict；页面里没有详情区域（result 为 None）时返回 None。
+    """
+    if not result:
+        return None
+
+    address = result.get("address") or {}
+    addr = split_address(address.get("full") or "", address.get("tags") or [])
+
+    data = {
+        "category": "",
+        "budget": "",
+        "payment": "",
+        "seats": "",
+        "open_date": "",
+    }
+    for row in result.get("rows") or []:
+        th = row["th"]
+        value = row["td"]
+        if row.get("notice") is not None:
+            value = f"{value}（{row['notice']}）"
+
+        if "ジャンル" in th:
+            data["category"] = value
+        elif th == "予算（口コミ集計）":
+            data["budget"] = " ".join(em or "-" for em in row.get("ems") or [])
+        elif "支払い方法" in th:
+            data["payment"] = value
+        elif "席数" in th:
+            data["seats"] = value
+        elif "オープン日" in th:
+            data["open_date"] = value
+
+    return {**addr, "tel": result.get("tel") or "", **data}
+
+
+SEL_AREA_SECTION = CSSSelector("section.area-cat-navi")
+SEL_AREA_TITLE = CSSSelector("h2.area-cat-navi__title")
+SEL_AREA_LEVEL2 = CSSSelector("ul.area-cat-navi__list > li")
+SEL_AREA_LEVEL2_LINK = CSSSelector("a.area-cat-navi__list-target")
+SEL_AREA_LEVEL3 = CSSSelector("ul.area-cat-list li")
+SEL_AREA_LEVEL4_LINK = CSSSelector("ul.sub-area-navi__list li a")
+
+
+def parse_area_page(html: str, base_url: str = None):
+    """
+    解析 matome/area_lst 页面，按文档顺序返回 [(level, name, href), ...]。
+    level 1 的 href 为空字符串。层级结构与 getarea.get_areas 的 Selenium 逻辑一致。
+    """
+    doc = load_html(html, base_url)
+    if doc is None:
+        return []
+
+    entries = []
+    for sec in SEL_AREA_SECTION(doc):
+        titles = SEL_AREA_TITLE(sec)
+        if not titles:
+            continue
+        entries.append((1, _text(titles[0]), ""))
+
+        for level2_item in SEL_AREA_LEVEL2(sec):
+            a2 = SEL_AREA_LEVEL2_LINK(level2_item)
+            if not a2:
+                continue
+            entries.append((2, _text(a2[0]), a2[0].get("href", "").strip()))
+
+            for sub_item in SEL_AREA_LEVEL3(level2_item):
+                a3 = sub_item.find(".//a")
+                if a3 is None:
+                    continue
+                entries.append((3, _text(a3), a3.get("href", "").strip()))
+
+                for a4 in SEL_AREA_LEVEL4_LINK(sub_item):
+                    entries.append((4, _text(a4), a4.get("href", "").strip()))
+    return entries
+
+
+SEL_GENRE_FRAME = CSSSelector("div.rst-janrelst__frame")
+SEL_GENRE_LEVEL1 = CSSSelector("h3.rst-janrelst__title > a")
+SEL_GENRE_ITEM = CSSSelector("div.rst-janrelst__item")
+SEL_GENRE_LEVEL2 = CSSSelector("h4.rst-janrelst__item2 > a")
+SEL_GENRE_LEVEL3 = CSSSelector("ul.rst-janrelst__item3 li > a")
+
+
+def parse_genre_page(html: str, base_url: str = None):
+    """
+    解析 cat_lst 页面，按文档顺序返回 [(level, name, href), ...]。
+    层级结构与 getcatlog.get_genres 的 Selenium 逻辑一致。
+    """
+    doc = load_html(html, base_url)
+    if doc is None:
+        return []
+
+    entries = []
+    for frame in SEL_GENRE_FRAME(doc):
+        h3 = SEL_GENRE_LEVEL1(frame)
+        if not h3:
+            continue
+        entries.append((1, _text(h3[0]), h3[0].get("href", "").strip()))
+
+        for item in SEL_GENRE_ITEM(frame):
+            h4 = SEL_GENRE_LEVEL2(item)
+            if not h4:
+                continue
+            entries.append((2, _text(h4[0]), h4[0].get("href", "").strip()))
+
+            for a in SEL_GENRE_LEVEL3(item):
+                entries.append((3, _text(a), a.get("href", "").strip()))
+    return entries
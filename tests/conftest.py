@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# 各模块都是仓库根目录下的脚本，测试直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tabelog.db")
+
+
+@pytest.fixture
+def db(db_path):
+    """临时目录里新建的 TabelogDB（每次 upsert 都 commit）"""
+    from db_handler import TabelogDB
+
+    db = TabelogDB(db_path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def make_shop():
+    """make_shop(no, **字段)：一家 A130101 × sushi 的店铺，no 决定 name / url，其余字段可以覆盖"""
+    def make(no=1, **fields):
+        return {"name": f"テスト店{no}", "url": f"https://tabelog.com/tokyo/A1301/A130101/{13000000 + no}/",
+                "score": "3.50", "reviews": "10", "area": "A130101", "genre": "sushi", **fields}
+    return make
@@ -0,0 +1,29 @@
+import json
+import os
+
+import pytest
+
+import bench_parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_committed_corpus_matches_baseline():
+    """仓库里的语料每种页面都有，基准覆盖全部 lxml 解析函数：新 checkout 就能跑回归检查"""
+    pytest.importorskip("lxml")
+    fixtures = bench_parser.load_fixtures(os.path.join(ROOT, bench_parser.FIXTURE_DIR))
+    assert set(fixtures) == set(bench_parser.KINDS)
+    with open(os.path.join(ROOT, bench_parser.BASELINE_PATH), encoding="utf-8") as f:
+        baseline = json.load(f)
+    assert {name for name, _, _, _ in bench_parser.lxml_cases(fixtures)} == set(baseline)
+
+
+def test_synthesized_corpus_parses(tmp_path):
+    tabelog_parser = pytest.importorskip("tabelog_parser")
+    counts = bench_parser.synthesize_fixtures(2, str(tmp_path))
+    assert counts == {"list": 2, "detail": 2, "area": 1, "genre": 1}
+    fixtures = bench_parser.load_fixtures(str(tmp_path))
+    for _, html in fixtures["list"]:
+        assert tabelog_parser.parse_list_page(html, bench_parser.BASE_URL)
+    for _, html in fixtures["detail"]:
+        assert tabelog_parser.parse_detail_page(html) is not None
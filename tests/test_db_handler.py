@@ -0,0 +1,31 @@
+def test_metrics_history_same_second_upserts(db, make_shop):
+    """同一家店一秒内变化多次：不报 UNIQUE 错误，history 里这一秒保留最后的值"""
+    db.upsert_shops([make_shop(score="3.50", reviews="100")])
+    db.upsert_shops([make_shop(score="3.51", reviews="101")])
+    db.upsert_shops([make_shop(score="3.52", reviews="102")])
+
+    rows = db.conn.execute("SELECT ts, score, reviews FROM shop_metrics_history ORDER BY ts").fetchall()
+    assert rows[-1][1:] == (3.52, 102)
+    assert len({ts for ts, _, _ in rows}) == len(rows)
+
+
+def test_refresh_keeps_area_and_genre(db, make_shop):
+    """--refresh 重新取详情：同一家店在别的一览里出现时，area / genre 不被改写，评分照常更新"""
+    db.upsert_shops([make_shop(score="3.50", reviews="100")])
+    db.upsert_shops([make_shop(score="3.60", reviews="120", area="A130102", genre="izakaya")], refresh=True)
+
+    row = db.conn.execute("SELECT area, genre, score, reviews FROM shops").fetchone()
+    assert tuple(row) == ("A130101", "sushi", "3.60", "120")
+
+
+def test_refresh_keeps_shop_genre(db, make_shop):
+    """--refresh 时 shop_genre 按库里的 genre 重建，不换成这次刷新走的一览的 genre"""
+    db.conn.execute("""
+        CREATE TABLE genre (id INTEGER PRIMARY KEY, name TEXT, code TEXT UNIQUE, is_deleted INTEGER DEFAULT 0)
+    """)
+    db.conn.executemany("INSERT INTO genre (id, name, code) VALUES (?, ?, ?)", [(1, "寿司", "sushi"),
+                                                                                (2, "居酒屋", "izakaya")])
+    db.upsert_shops([make_shop()])
+    db.upsert_shops([make_shop(score="3.60", genre="izakaya")], refresh=True)
+
+    assert [row[0] for row in db.conn.execute("SELECT genre_id FROM shop_genre")] == [1]
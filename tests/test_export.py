@@ -0,0 +1,65 @@
+import csv
+import sqlite3
+
+import export
+
+
+def exported_names(path):
+    with open(path, encoding="utf-8-sig") as f:
+        return [row["name"] for row in csv.DictReader(f)]
+
+
+def test_incremental_export_same_second(tmp_path, db, db_path, make_shop):
+    """水位那一秒里后写入的行下次仍会导出，已导出的不重复"""
+    db.upsert_shops([make_shop(1), make_shop(2)])
+    db.conn.execute("UPDATE shops SET update_time = '2026-01-01 10:00:00'")
+    db.conn.commit()
+
+    conn = export.connect(db_path)
+    try:
+        path, count = export.export_table(conn, "shops", "csv", str(tmp_path / "out"), incremental=True,
+                                          chunk_size=1)
+        assert count == 2
+
+        # 同一秒又写进来一家店
+        db.upsert_shops([make_shop(3)])
+        db.conn.execute("UPDATE shops SET update_time = '2026-01-01 10:00:00' WHERE name = 'テスト店3'")
+        db.conn.commit()
+        path, count = export.export_table(conn, "shops", "csv", str(tmp_path / "out2"), incremental=True,
+                                          chunk_size=1)
+        assert count == 1
+        assert exported_names(path) == ["テスト店3"]
+
+        path, count = export.export_table(conn, "shops", "csv", str(tmp_path / "out3"), incremental=True)
+        assert (path, count) == (None, 0)
+    finally:
+        conn.close()
+
+
+def test_incremental_query_uses_index(db):
+    """增量查询走 (update_time, id) 索引，不建临时 B-tree 排序"""
+    plan = " ".join(row[-1] for row in db.conn.execute("""
+        EXPLAIN QUERY PLAN
+        SELECT * FROM shops WHERE (update_time, id) > (?, ?) ORDER BY update_time, id LIMIT ?
+    """, ("2026-01-01 00:00:00", -1, 100)))
+    assert "idx_shops_update_time_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_connect_only_adds_export_indexes(tmp_path):
+    """export.connect 不跑 migrate_schema：只建 (update_time, id) 索引和 export_state"""
+    db_path = str(tmp_path / "plain.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE shops (id INTEGER PRIMARY KEY, name TEXT, url TEXT, update_time TEXT)")
+    conn.execute("CREATE TABLE genre (id INTEGER PRIMARY KEY, name TEXT, code TEXT, level INTEGER, "
+                 "parent_code TEXT, is_deleted INTEGER DEFAULT 0)")
+    conn.commit()
+    conn.close()
+
+    conn = export.connect(db_path)
+    try:
+        objects = {(row[0], row[1]) for row in conn.execute("SELECT type, name FROM sqlite_master")}
+    finally:
+        conn.close()
+    assert objects == {("table", "shops"), ("table", "genre"), ("table", "export_state"),
+                       ("index", "idx_shops_update_time_id"), ("index", "sqlite_autoindex_export_state_1")}
@@ -0,0 +1,113 @@
+import socket
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("selenium")
+
+from fetcher import HttpFetcher
+from http_cache import ResponseCache
+from proxy_pool import ProxyPool
+from rate_limiter import RateController
+
+
+class FirstChoice:
+    """代替 ProxyPool 的 rng：总是选第一个健康的代理（按加入顺序）"""
+
+    def choices(self, population, weights=None):
+        return [population[0]]
+
+
+def start(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = "<html>ok</html>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ProxyHandler(PageHandler):
+    """最简单的 HTTP 正向代理：self.path 是完整 URL，直连取回后原样返回"""
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def do_GET(self):
+        with self.opener.open(self.path, timeout=5) as r:
+            body = r.read()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UnavailableHandler(PageHandler):
+    def do_GET(self):
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def dead_address():
+    """绑定后马上关掉的端口：连过去会被拒绝"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"127.0.0.1:{s.getsockname()[1]}"
+
+
+@pytest.fixture
+def servers():
+    site, proxy = start(PageHandler), start(ProxyHandler)
+    yield f"http://127.0.0.1:{site.server_address[1]}", f"127.0.0.1:{proxy.server_address[1]}"
+    site.shutdown()
+    proxy.shutdown()
+
+
+def test_dead_proxy_fails_over_without_throttling_site(db_path, servers):
+    """代理连不上：记在代理池上换一个代理重试，目标站点的速率不降"""
+    site_url, good = servers
+    dead = dead_address()
+    pool = ProxyPool(db_path, min_score=0.5, proxy_rate=100, rng=FirstChoice())
+    pool.report(dead, True)
+    pool.report(good, True)
+    rate = RateController(rate=5.0, max_rate=5.0, increase=0.0)
+    fetcher = HttpFetcher(timeout=2, rate=rate, proxy_pool=pool)
+    try:
+        assert fetcher.fetch(site_url + "/tokyo/") == "<html>ok</html>"
+        assert pool.proxies[dead]["failure"] == 1
+        assert pool.proxies[good]["success"] == 2
+        assert pool.healthy() == [good]
+        assert rate.rates() == {site_url.split("//")[1]: 5.0}
+    finally:
+        fetcher.close()
+        pool.close()
+
+
+def test_failed_revalidation_serves_stale_cache(tmp_path):
+    """过期缓存的条件请求失败（503）时返回缓存的页面，不回退到 Selenium"""
+    server = start(UnavailableHandler)
+    url = f"http://127.0.0.1:{server.server_address[1]}/tokyo/A1301/A130101/13000001/"
+    cache = ResponseCache(str(tmp_path / "http_cache.db"))
+    cache.put(url, "<html>cached</html>", etag='"v1"')
+    cache.conn.execute("UPDATE response_cache SET fetched_at = 0")
+    cache.conn.commit()
+    fetcher = HttpFetcher(timeout=2, rate=RateController(max_retries=0, rate=100.0), cache=cache)
+    try:
+        assert fetcher.fetch(url) == "<html>cached</html>"
+        assert fetcher.fetch(url.replace("13000001", "13000002")) is None
+    finally:
+        fetcher.close()
+        server.shutdown()
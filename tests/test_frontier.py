@@ -0,0 +1,42 @@
+import pytest
+
+from frontier import MAX_ATTEMPTS, Frontier
+
+
+@pytest.fixture
+def frontier(db_path):
+    frontier = Frontier(db_path, owner="test")
+    frontier.seed([{"url": "https://tabelog.com/tokyo/A1301/A130101/rstLst/sushi/",
+                    "parent_area_code": "A1301", "area_code": "A130101", "genre": "sushi"}])
+    yield frontier
+    frontier.close()
+
+
+def details(frontier):
+    rows = frontier.conn.execute("SELECT url, status, attempts FROM crawl_frontier WHERE kind = 'detail' ORDER BY url")
+    return [tuple(row) for row in rows]
+
+
+def test_failed_details_are_retried_until_max_attempts(frontier):
+    lease = frontier.lease()
+    lease.add_details([{"link": "https://tabelog.com/a/"}, {"link": "https://tabelog.com/b/"}])
+
+    lease.checkpoint(2, 10, done_links=["https://tabelog.com/a/"], failed_links=["https://tabelog.com/b/"])
+    assert [rst["link"] for rst in lease.pending_details()] == ["https://tabelog.com/b/"]
+
+    for _ in range(MAX_ATTEMPTS - 1):
+        lease.checkpoint(2, 10, failed_links=["https://tabelog.com/b/"])
+    assert details(frontier) == [("https://tabelog.com/a/", "done", 0),
+                                 ("https://tabelog.com/b/", "failed", MAX_ATTEMPTS)]
+    assert lease.pending_details() == []
+
+
+def test_done_prunes_saved_details(frontier):
+    lease = frontier.lease()
+    lease.add_details([{"link": "https://tabelog.com/a/"}, {"link": "https://tabelog.com/b/"}])
+    lease.checkpoint(2, 0, done_links=["https://tabelog.com/a/"], failed_links=["https://tabelog.com/b/"])
+
+    lease.done()
+    # 已落盘的删掉，没成功的不会再重试，标记为 failed
+    assert details(frontier) == [("https://tabelog.com/b/", "failed", 1)]
+    assert frontier.stats() == {("list", "done"): 1, ("detail", "failed"): 1}
@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+pytest.importorskip("lxml")
+pytest.importorskip("requests")
+pytest.importorskip("selenium")
+
+import fetcher
+import getlist
+import mock_tabelog
+from fetcher import HttpFetcher
+from rate_limiter import RateController
+
+AREA = ("pref1", "A0101", "A010101")
+GENRE = "g111"
+SHOPS = 25   # 两页
+
+
+@pytest.fixture
+def site_url(monkeypatch):
+    """本地 mock_tabelog：只有 A010101 × g111 有店铺"""
+    site = mock_tabelog.MockSite(prefectures=1)
+    site.counts = dict.fromkeys(site.counts, 0)
+    site.counts[(AREA[2], GENRE)] = SHOPS
+    server, _ = mock_tabelog.serve(port=0, site=site)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(fetcher, "BASE_URL", base)
+    yield base
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def crawl_db(monkeypatch, db):
+    monkeypatch.setattr(getlist, "_db", db)
+    monkeypatch.setattr(getlist, "logger", logging.getLogger("tabelog.getlist"))
+    return db
+
+
+def test_http_engine_crawls_one_combo(site_url, crawl_db):
+    """HttpFetcher → tabelog_parser → DB：不启动 Chrome（driver=None）采集一个 地区 × ジャンル"""
+    url = getlist.convert_matome_url_to_rstLst(f"https://tabelog.com/matome/{'/'.join(AREA)}/list/") + GENRE
+    url_info = {"url": url, "parent_area_code": AREA[1], "area_code": AREA[2], "genre": GENRE}
+    http = HttpFetcher(timeout=5, rate=RateController(rate=100.0, max_rate=100.0, burst=100))
+    try:
+        total = getlist.get_count(None, url_info, http)
+        assert total == SHOPS
+        assert getlist.get_list(None, url, total, AREA[2], GENRE, http) is True
+    finally:
+        http.close()
+
+    shops = crawl_db.conn.execute("SELECT url, area, genre, phone, prefecture, seats FROM shops ORDER BY url").fetchall()
+    assert len(shops) == SHOPS
+    assert all(row["url"].startswith(site_url + "/pref1/A0101/A010101/") for row in shops)
+    assert {(row["area"], row["genre"]) for row in shops} == {(AREA[2], GENRE)}
+    assert all(row["phone"].startswith("03-") and row["prefecture"] and row["seats"] for row in shops)
+
+    summary = crawl_db.conn.execute("SELECT get_count, total_count, complete_total FROM shop_list_summary").fetchone()
+    assert tuple(summary) == (SHOPS, SHOPS, SHOPS)
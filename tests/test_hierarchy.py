@@ -0,0 +1,45 @@
+import sqlite3
+import threading
+
+import hierarchy
+
+GENRES = (
+    # (code, name, level, parent_code)
+    ("washoku", "和食", 1, None),
+    ("sushi", "寿司", 2, "washoku"),
+    ("kaitensushi", "回転寿司", 3, "sushi"),
+    ("ramen", "ラーメン", 1, None),
+)
+
+
+def make_genre_db(path):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE genre (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, code TEXT UNIQUE,
+            level INTEGER, parent_code TEXT, is_deleted INTEGER DEFAULT 0
+        )
+    """)
+    conn.executemany("INSERT INTO genre (code, name, level, parent_code) VALUES (?, ?, ?, ?)", GENRES)
+    conn.commit()
+    conn.close()
+
+
+def test_get_hierarchy_builds_missing_closure(tmp_path):
+    """没有闭包表时 get_hierarchy 先重建闭包（会 invalidate 缓存），不能在缓存锁里等自己"""
+    db_path = str(tmp_path / "tabelog.db")
+    make_genre_db(db_path)
+    hierarchy.invalidate()
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(tree=hierarchy.get_hierarchy("genre", db_path)),
+                              daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive(), "get_hierarchy 死锁"
+
+    tree = result["tree"]
+    assert tree.descendants("和食") == ["sushi", "kaitensushi"]
+    assert tree.ancestors("kaitensushi") == ["washoku", "sushi"]
+    assert hierarchy.get_hierarchy("genre", db_path) is tree
+    hierarchy.invalidate()
@@ -0,0 +1,43 @@
+import sqlite3
+
+from http_cache import ResponseCache
+
+
+def accessed_at(path, url):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT accessed_at FROM response_cache WHERE url = ?", (url,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_hits_are_written_on_flush(tmp_path):
+    """命中不在读路径上写库，flush / close 时把访问时间一起写进去"""
+    path = str(tmp_path / "http_cache.db")
+    url = "https://tabelog.com/tokyo/A1301/A130101/13000001/"
+    cache = ResponseCache(path)
+    cache.put(url, "<html></html>")
+    before = accessed_at(path, url)
+
+    assert cache.get(url + "#title-rstdata").body == "<html></html>"
+    assert not cache.conn.in_transaction
+    assert accessed_at(path, url) == before
+
+    cache.close()
+    assert accessed_at(path, url) > before
+
+
+def test_eviction_sees_pending_hits(tmp_path):
+    """淘汰前先写入命中记录：刚读过的页面不会被当成最久未访问的淘汰"""
+    cache = ResponseCache(str(tmp_path / "http_cache.db"), max_bytes=10 ** 9)
+    try:
+        cache.put("https://tabelog.com/a/", "a" * 100)
+        cache.put("https://tabelog.com/b/", "b" * 100)
+        cache.get("https://tabelog.com/a/")
+
+        cache.max_bytes = int(cache.total_bytes * 1.4)   # 再放一个页面就超出，淘汰一个即可
+        cache.put("https://tabelog.com/c/", "c" * 100)
+        assert cache.get("https://tabelog.com/a/") is not None
+        assert cache.get("https://tabelog.com/b/") is None
+    finally:
+        cache.close()
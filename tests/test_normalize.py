@@ -0,0 +1,24 @@
+from normalize import parse_budget
+
+
+def test_parse_budget_dinner_and_lunch():
+    assert parse_budget("￥3,000～￥3,999 ￥1,000～￥1,999") == ((3000, 3999), (1000, 1999))
+
+
+def test_parse_budget_lunch_only():
+    assert parse_budget("- ￥1,000～￥1,999") == ((None, None), (1000, 1999))
+
+
+def test_parse_budget_dinner_only():
+    assert parse_budget("￥3,000～￥3,999 -") == ((3000, 3999), (None, None))
+    assert parse_budget("￥3,000～￥3,999") == ((3000, 3999), (None, None))
+
+
+def test_parse_budget_labels_and_open_ends():
+    assert parse_budget("昼 ￥1,000～￥1,999") == ((None, None), (1000, 1999))
+    assert parse_budget("～￥999 ￥10,000～") == ((None, 999), (10000, None))
+
+
+def test_parse_budget_empty():
+    assert parse_budget("") == ((None, None), (None, None))
+    assert parse_budget("- -") == ((None, None), (None, None))
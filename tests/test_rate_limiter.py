@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from rate_limiter import Backoff, FakeClock, RateController, RetryableError, TokenBucket
+
+URL = "https://tabelog.com/tokyo/"
+
+
+def make_controller(**bucket_kwargs):
+    clock = FakeClock()
+    backoff = Backoff(base=1.0, cap=8.0, rng=random.Random(0))
+    kwargs = {"rate": 2.0, "burst": 1, "min_rate": 0.25, "max_rate": 3.0, "increase": 0.5, "decrease": 0.5}
+    return clock, RateController(clock, backoff, max_retries=3, **{**kwargs, **bucket_kwargs})
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_throttle_halves_rate_then_recovers_additively_up_to_max(status):
+    """429/503 乘法减速；之后每次成功加 increase，直到 max_rate 为止"""
+    clock, controller = make_controller()
+    bucket = controller.bucket(URL)
+
+    controller.record(URL, status=status)
+    assert bucket.rate == 1.0
+    controller.record(URL, status=status)
+    assert bucket.rate == 0.5
+
+    rates = []
+    for _ in range(6):
+        controller.record(URL, latency=0.1)
+        rates.append(bucket.rate)
+    assert rates == [1.0, 1.5, 2.0, 2.5, 3.0, 3.0]
+
+
+def test_throttle_is_floored_at_min_rate_and_slow_responses_decrease():
+    clock, controller = make_controller(slow_latency=5.0, slow_decrease=0.9)
+    bucket = controller.bucket(URL)
+    for _ in range(10):
+        controller.record(URL, status=429)
+    assert bucket.rate == 0.25
+
+    bucket.rate = 2.0
+    controller.record(URL, latency=6.0)
+    assert bucket.rate == pytest.approx(1.8)
+    controller.record(URL, status=500)   # 5xx 不是限速信号，速率不变
+    assert bucket.rate == pytest.approx(1.8)
+
+
+def test_token_bucket_paces_requests_on_fake_clock():
+    """令牌用完后按 1 / rate 的间隔放行；throttle 会作废已攒的令牌，Retry-After 期间一律等到期"""
+    clock = FakeClock()
+    bucket = TokenBucket(clock, rate=2.0, burst=1)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.5
+    clock.sleep(0.5)
+    assert bucket.reserve() == 0.5
+
+    clock.sleep(10)
+    bucket.on_throttle(retry_after=3)
+    assert bucket.rate == 1.0
+    assert bucket.reserve() == 3.0
+
+
+def test_call_retries_throttled_requests_with_backoff():
+    clock, controller = make_controller()
+    responses = iter([RetryableError("HTTP 429", 429), RetryableError("HTTP 503", 503), "ok"])
+
+    def fetch():
+        item = next(responses)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    assert controller.call(URL, fetch) == "ok"
+    # 两次降速（2.0 → 1.0 → 0.5）后一次成功加回 0.5
+    assert controller.rates() == {"tabelog.com": 1.0}
+    # 同样 seed 的退避时间都在假时钟上睡过（其余是令牌桶的等待）
+    backoff = Backoff(base=1.0, cap=8.0, rng=random.Random(0))
+    assert all(delay in clock.slept for delay in (backoff.delay(0), backoff.delay(1)))
+
+
+def test_call_gives_up_after_max_retries():
+    clock, controller = make_controller()
+
+    def fetch():
+        raise RetryableError("HTTP 429", 429)
+
+    with pytest.raises(RetryableError):
+        controller.call(URL, fetch)
+    assert controller.bucket(URL).rate == 0.25   # 4 次 429：2.0 → 1.0 → 0.5 → 0.25（下限）
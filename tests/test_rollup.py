@@ -0,0 +1,41 @@
+def test_budget_buckets_use_dinner_position(db, make_shop):
+    """予算分布按夜的金额分桶：只有昼的店算进未知（None），只有夜的店算进对应的桶"""
+    db.upsert_shops([
+        make_shop(1, budget="￥5,000～￥5,999 ￥1,000～￥1,999"),
+        make_shop(2, budget="- ￥1,000～￥1,999"),
+        make_shop(3, budget="￥8,000～￥9,999 -"),
+    ])
+    (row,) = db.rollup_summary("genre")
+    assert row["shop_count"] == 3
+    assert row["budget"] == {None: 1, 5000: 1, 8000: 1}
+
+    # 改成只有昼：从 5000 的桶移到未知
+    db.upsert_shops([make_shop(1, budget="- ～￥999")])
+    (row,) = db.rollup_summary("genre")
+    assert row["budget"] == {None: 2, 8000: 1}
+
+
+def test_parent_area_rolls_up_to_prefecture(db, make_shop):
+    """不同层级采集的店铺都能上卷到都道府県（多跳 parent_code），也可以指定中间的层级"""
+    db.conn.execute("""
+        CREATE TABLE area (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, code TEXT UNIQUE,
+            level INTEGER, parent_code TEXT, is_deleted INTEGER DEFAULT 0
+        )
+    """)
+    db.conn.executemany("INSERT INTO area (code, name, level, parent_code) VALUES (?, ?, ?, ?)", [
+        ("tokyo", "東京", 1, None),
+        ("A1301", "銀座・新橋・有楽町", 2, "tokyo"),
+        ("A130101", "銀座", 3, "A1301"),
+        ("A13010101", "銀座一丁目", 4, "A130101"),
+        ("osaka", "大阪", 1, None),
+    ])
+    db.conn.commit()
+    db.upsert_shops([make_shop(1, area="A130101"), make_shop(2, area="A13010101"), make_shop(3, area="osaka")])
+
+    rows = {row["key"]: row["shop_count"] for row in db.rollup_summary("parent_area")}
+    assert rows == {"tokyo": 2, "osaka": 1}
+    rows = {row["key"]: row["shop_count"] for row in db.rollup_summary("parent_area", level=2)}
+    assert rows == {"A1301": 2, None: 1}
+    (row,) = db.rollup_summary("genre", parent_area="tokyo")
+    assert row["shop_count"] == 2